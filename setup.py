@@ -2,11 +2,15 @@ from setuptools import find_packages, setup  # type: ignore
 
 # Library dependencies
 INSTALL_REQUIRES = [
-    "boto3>=1.16.42",
+    "boto3>=1.26.62",
     "melitk.metrics",
     "melitk.logging",
 ]
 
+# Optional dependencies
+ARROW_REQUIRES = ["pyarrow>=3.0.0"]
+PANDAS_REQUIRES = ["pandas>=1.2.0"]
+
 # Development dependencies
 DEV_REQUIRES = []
 
@@ -19,7 +23,7 @@ TEST_REQUIRES = [
     "pytest-mock==1.10.4",
     "requests-mock==1.8.0",
     "moto",
-]
+] + ARROW_REQUIRES + PANDAS_REQUIRES
 
 # To identify versions follow the scheme defined in PEP-440:
 # https://www.python.org/dev/peps/pep-0440/
@@ -35,7 +39,12 @@ setup(
     python_requires=">=3.6",
     setup_requires=["wheel"],
     install_requires=INSTALL_REQUIRES,
-    extras_require={"dev": DEV_REQUIRES, "test": TEST_REQUIRES},
+    extras_require={
+        "dev": DEV_REQUIRES,
+        "test": TEST_REQUIRES,
+        "arrow": ARROW_REQUIRES,
+        "pandas": PANDAS_REQUIRES,
+    },
     classifiers=[
         "Environment :: Web Environment",
         "Intended Audience :: Developers",
@@ -0,0 +1,230 @@
+import asyncio
+from functools import partial
+
+from sibila.project import Project
+from sibila.predictor import Predictor, _advance
+from sibila.errors import ResourceError, ResourcesError, ResourceTimeoutError
+from sibila.utils import _Waiter, PollingStrategy, logger, DOWNLOAD_WORKERS
+
+
+async def _run(executor, function, *args, **kwargs):
+    """Runs a blocking function in the executor (the loop's default one if None)."""
+    loop = asyncio.get_event_loop()
+    return await loop.run_in_executor(executor, partial(function, *args, **kwargs))
+
+
+async def wait_for_resource(
+    resource_name: str,
+    resource_arn: str,
+    aws_handler: "AWSHandler",
+    polling: PollingStrategy = None,
+    timeout: float = None,
+    executor=None,
+):
+    """Same as utils.wait_for_resource, cancelled by cancelling the awaiting task."""
+    waiter = _Waiter(resource_name, resource_arn, aws_handler, polling, timeout)
+
+    while True:
+        response = await _run(executor, waiter.describe)
+        delay = waiter.next_delay(response)
+        if delay is None:
+            return
+
+        await asyncio.sleep(delay)
+
+
+async def wait_for_resources(
+    resources,
+    aws_handler: "AWSHandler",
+    polling: PollingStrategy = None,
+    timeout: float = None,
+    executor=None,
+):
+    """Same as utils.wait_for_resources, polling every resource in the event loop."""
+    tasks = {
+        asyncio.ensure_future(
+            wait_for_resource(
+                resource_name, resource_arn, aws_handler, polling, timeout, executor
+            )
+        ): (resource_name, resource_arn)
+        for resource_name, resource_arn in resources
+    }
+    outcomes = {resource_arn: "CANCELLED" for _, resource_arn in tasks.values()}
+
+    failure = None
+    pending = set(tasks)
+    try:
+        while pending and not failure:
+            done, pending = await asyncio.wait(
+                pending, return_when=asyncio.FIRST_COMPLETED
+            )
+            for task in done:
+                resource_name, resource_arn = tasks[task]
+                error = task.exception()
+                if error is None:
+                    outcomes[resource_arn] = "ACTIVE"
+                elif isinstance(error, ResourceError):
+                    if isinstance(error, ResourceTimeoutError):
+                        outcomes[resource_arn] = "TIMED_OUT"
+                    else:
+                        outcomes[resource_arn] = "CREATE_FAILED"
+                    logger.debug(
+                        f"{resource_name.upper()} {resource_arn} failed: {error}"
+                    )
+                    failure = failure or (resource_arn, error)
+                else:
+                    raise error
+    finally:
+        for task in pending:
+            task.cancel()
+
+    if failure:
+        failed_arn, error = failure
+        raise ResourcesError(str(error), failed_arn=failed_arn, outcomes=outcomes)
+
+    return outcomes
+
+
+class AsyncProject:
+    """asyncio version of Project.
+
+    Calls to AWS run in executor (the loop's default one if None) and waiting for
+    resources sleeps in the event loop instead of holding a thread, so a single loop
+    can drive many projects at once. Use AsyncProject.create() with the same arguments
+    as Project, or wrap an existing Project.
+    """
+
+    def __init__(self, project: Project, executor=None):
+        self.project = project
+        self.aws_handler = project.aws_handler
+        self.executor = executor
+
+    @classmethod
+    async def create(cls, *args, executor=None, **kwargs):
+        project = await _run(executor, Project, *args, **kwargs)
+        return cls(project, executor=executor)
+
+    async def upload_dataset(self, *args, **kwargs):
+        """Same as Project.upload_dataset. The upload runs in a worker thread."""
+        return await _run(self.executor, self.project.upload_dataset, *args, **kwargs)
+
+    async def get_dataset(self, ds_type: str):
+        return await _run(self.executor, self.project.get_dataset, ds_type)
+
+    async def train_new_predictor(self, name: str, **kwargs):
+        """Same as Project.train_new_predictor, returns an AsyncPredictor."""
+        predictor = await _run(
+            self.executor, self.project._new_predictor, name=name, **kwargs
+        )
+
+        logger.info("Waiting for all datasets and imports to be ready.")
+        resources = await _run(self.executor, self.project._data_resources)
+        try:
+            await wait_for_resources(
+                resources, self.aws_handler, executor=self.executor
+            )
+        except ResourcesError as e:  # pragma: no cover
+            await _run(self.executor, self.project._discard_failed_imports, e)
+            return
+
+        predictor = await _run(self.executor, self.project._create_predictor, predictor)
+        return AsyncPredictor(predictor, executor=self.executor)
+
+    async def get_predictor(self, name: str):
+        """Same as Project.get_predictor, returns an AsyncPredictor."""
+        _, _, predictor_arn = await _run(
+            self.executor, self.project._find_predictor, name
+        )
+
+        # Wait for the predictor to be active so that its information is accurate.
+        await wait_for_resource(
+            "predictor", predictor_arn, self.aws_handler, executor=self.executor
+        )
+
+        predictor = await _run(self.executor, self.project.get_predictor, name)
+        return AsyncPredictor(predictor, executor=self.executor)
+
+
+class AsyncPredictor:
+    """asyncio version of Predictor, returned by AsyncProject."""
+
+    def __init__(self, predictor: Predictor, executor=None):
+        self.predictor = predictor
+        self.aws_handler = predictor.aws_handler
+        self.executor = executor
+
+    @property
+    def name(self):
+        return self.predictor.name
+
+    @property
+    def arn(self):
+        return self.predictor.arn
+
+    async def info(self):
+        return await _run(self.executor, lambda: self.predictor.info)
+
+    async def _wait(self, resource_name: str, resource_arn: str, timeout=None):
+        await wait_for_resource(
+            resource_name,
+            resource_arn,
+            self.aws_handler,
+            timeout=timeout,
+            executor=self.executor,
+        )
+
+    async def wait_for_training(self, timeout: float = None):
+        try:
+            await self._wait("predictor", self.arn, timeout=timeout)
+        except ResourceError as e:  # pragma: no cover
+            logger.error(f"There was an error {e} when creating the predictor")
+            return
+
+    async def metrics(
+        self, destination_dir: str, download_workers: int = DOWNLOAD_WORKERS
+    ):
+        """Same as Predictor.metrics."""
+        return await self._run_steps(
+            self.predictor._metrics_steps(destination_dir, download_workers)
+        )
+
+    async def forecast(
+        self,
+        destination_path: str,
+        quantiles: list = None,
+        download_workers: int = DOWNLOAD_WORKERS,
+        file_format: str = Predictor.CSV,
+        keep_forecasts: int = 0,
+        pipelined: bool = False,
+    ):
+        """Same as Predictor.forecast."""
+        return await self._run_steps(
+            self.predictor._forecast_steps(
+                destination_path,
+                quantiles,
+                download_workers,
+                file_format,
+                keep_forecasts,
+                pipelined,
+            )
+        )
+
+    async def _run_steps(self, steps):
+        """Same as predictor._run_steps, but the steps run in the executor and waits
+        poll in the event loop."""
+        error = None
+        while True:
+            done, resources = await _run(self.executor, _advance, steps, error)
+            if done:
+                return resources
+
+            error = None
+            try:
+                if isinstance(resources, list):
+                    await wait_for_resources(
+                        resources, self.aws_handler, executor=self.executor
+                    )
+                else:
+                    await self._wait(*resources)
+            except ResourceError as e:
+                error = e
@@ -0,0 +1,72 @@
+import json
+import sqlite3
+from time import time
+from threading import Lock
+from os import environ, makedirs
+from os.path import dirname, expanduser, join
+
+from sibila.utils import logger
+
+
+DEFAULT_CACHE_PATH = environ.get(
+    "SIBILA_CACHE_PATH", join(expanduser("~"), ".sibila", "cache.sqlite")
+)
+
+
+class EntityCache:
+    """Local store for the responses of Forecast describe and list calls.
+
+    Entries are scoped by dataset group arn and expire after the ttl of their kind.
+    """
+
+    # Seconds each kind of entry is considered fresh.
+    DEFAULT_TTLS = {
+        # Dataset groups are never renamed, only their arn is stored.
+        "dataset_group": 30 * 24 * 3600,
+        # Datasets, imports and predictors of a project. Other processes may add them.
+        "entities": 3600,
+        # Describe responses are only stored once the resource is ACTIVE.
+        "predictor": 30 * 24 * 3600,
+    }
+
+    def __init__(self, path: str = DEFAULT_CACHE_PATH, ttls: dict = None):
+        self.path = path
+        self.ttls = dict(EntityCache.DEFAULT_TTLS, **(ttls or {}))
+
+        if dirname(path):
+            makedirs(dirname(path), exist_ok=True)
+        self._lock = Lock()
+        self._connection = sqlite3.connect(
+            path, check_same_thread=False, isolation_level=None
+        )
+        self._connection.execute(
+            """CREATE TABLE IF NOT EXISTS entities (
+                scope TEXT NOT NULL,
+                kind TEXT NOT NULL,
+                key TEXT NOT NULL,
+                value TEXT NOT NULL,
+                expires_at REAL NOT NULL,
+                PRIMARY KEY (scope, kind, key)
+            ) WITHOUT ROWID"""
+        )
+
+    def get(self, scope: str, kind: str, key: str):
+        """Returns the stored value, or None if it is missing or expired."""
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT value, expires_at FROM entities WHERE scope = ? AND kind = ? AND key = ?",
+                (scope, kind, key),
+            ).fetchone()
+
+        if row is None or row[1] < time():
+            return None
+        logger.debug(f"Cache hit for {kind} {key}")
+        return json.loads(row[0])
+
+    def set(self, scope: str, kind: str, key: str, value):
+        expires_at = time() + self.ttls.get(kind, EntityCache.DEFAULT_TTLS["entities"])
+        with self._lock:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO entities VALUES (?, ?, ?, ?, ?)",
+                (scope, kind, key, json.dumps(value, default=str), expires_at),
+            )
@@ -1,9 +1,39 @@
+import io
+import zlib
 from urllib.parse import urlparse
 
 from melitk import logging
 
 from sibila.errors import DatasetError
-from sibila.utils import wait_for_resource, logger
+from sibila.utils import (
+    wait_for_resources,
+    list_objects,
+    java_to_strftime,
+    is_header,
+    _iter_csv_chunks,
+    _merge_objects,
+    _ChunkStream,
+    _import_pandas,
+    logger,
+    DOWNLOAD_WORKERS,
+    DOWNLOAD_CHUNK_SIZE,
+)
+
+# Pandas dtypes used to parse each attribute type of a schema. Timestamps are parsed
+# afterwards with the dataset's timestamp_format.
+SCHEMA_DTYPES = {
+    "string": "object",
+    "integer": "Int64",
+    "float": "float64",
+    "timestamp": "object",
+    "geolocation": "object",
+}
+# Tag that holds the sha256 of the file an import was created from.
+SHA256_TAG = "sha256"
+# Tag that holds the latest timestamp imported, incremental imports only add newer rows.
+HIGH_WATER_MARK_TAG = "high_water_mark"
+# Bytes read from the start of a dataset to find out whether it has a header.
+HEADER_SAMPLE_SIZE = 64 * 1024
 
 
 class Dataset:
@@ -14,6 +44,9 @@ class Dataset:
 
     VALID_DATASET_TYPES = (TARGET_TIME_SERIES, RELATED_TIME_SERIES, ITEM_METADATA)
 
+    FULL = "FULL"
+    INCREMENTAL = "INCREMENTAL"
+
     def __init__(
         self,
         dsg_arn: str,
@@ -32,11 +65,16 @@ class Dataset:
                 "You must specify a frequency and a timestamp_format for this type of dataset."
             )
 
+        if timestamp_format:
+            try:
+                java_to_strftime(timestamp_format)
+            except ValueError as e:
+                raise DatasetError(str(e))
+
         self.dsg_arn = dsg_arn
         self.ds_type = ds_type
         self.schema = schema
         self.frequency = frequency
-        # TODO: parsear con datetime y validar.
         self.timestamp_format = timestamp_format
         self.s3_uri = s3_uri
         self.aws_handler = aws_handler
@@ -46,6 +84,22 @@ class Dataset:
         self._import_name = None
         self.arn = None
         self.import_arn = None
+        # sha256 of the imported file, it is tagged on the import to detect changes.
+        self.sha256 = None
+        # INCREMENTAL imports add their rows to the ones of previous imports.
+        self.import_mode = Dataset.FULL
+        # Latest timestamp of the imported rows, tagged on the import.
+        self.high_water_mark = None
+        # Objects with the rows imported incrementally after s3_uri, oldest first. An
+        # INCREMENTAL import imports the last one.
+        self.increments = []
+
+    @property
+    def import_s3_uri(self):
+        """The s3 uri the import reads, the new rows of an INCREMENTAL import."""
+        if self.import_mode == Dataset.INCREMENTAL:
+            return self.increments[-1]
+        return self.s3_uri
 
     def _create(self):
         creation_request = {
@@ -70,13 +124,14 @@ class Dataset:
 
     def _create_import(self):
 
-        # Wait for the dataset to be active before trying to create an import.
-        wait_for_resource("dataset", self.arn, self.aws_handler)
-        wait_for_resource("dataset_group", self.dsg_arn, self.aws_handler)
+        # Wait for the dataset and its group to be active before trying to create an import.
+        wait_for_resources(
+            [("dataset", self.arn), ("dataset_group", self.dsg_arn)], self.aws_handler
+        )
 
         # Instantiate the import in the forecast service.
         logger.debug(
-            f"Creating import {self._import_name} that points to {self.s3_uri}"
+            f"Creating import {self._import_name} that points to {self.import_s3_uri}"
         )
 
         creation_request = {
@@ -84,7 +139,7 @@ class Dataset:
             "DatasetArn": self.arn,
             "DataSource": {
                 "S3Config": {
-                    "Path": self.s3_uri,
+                    "Path": self.import_s3_uri,
                     "RoleArn": self.aws_handler.ROLE_ARN,
                 }
             },
@@ -94,6 +149,18 @@ class Dataset:
         if self.timestamp_format:
             creation_request["TimestampFormat"] = self.timestamp_format
 
+        if self.sha256:
+            creation_request["Tags"].append({"Key": SHA256_TAG, "Value": self.sha256})
+
+        if self.high_water_mark:
+            creation_request["Tags"].append(
+                {"Key": HIGH_WATER_MARK_TAG, "Value": self.high_water_mark}
+            )
+
+        # Only sent when needed, so that older versions of boto3 still work.
+        if self.import_mode != Dataset.FULL:
+            creation_request["ImportMode"] = self.import_mode
+
         response_import = self.aws_handler.forecast.create_dataset_import_job(
             **creation_request
         )
@@ -102,15 +169,129 @@ class Dataset:
 
         self.import_arn = response_import["DatasetImportJobArn"]
 
-    def to_csv(self, destination: str):
+    def to_csv(self, destination: str, download_workers: int = DOWNLOAD_WORKERS):
         parsed_s3_uri = urlparse(self.s3_uri)
         bucket, key = parsed_s3_uri.netloc, parsed_s3_uri.path.lstrip("/")
 
-        self.aws_handler.s3.download_file(
-            Bucket=bucket,
-            Key=key,
-            Filename=destination,
+        if not (self.sharded or self.increments or key.endswith(".gz")):
+            self.aws_handler.s3.download_file(
+                Bucket=bucket,
+                Key=key,
+                Filename=destination,
+            )
+            return
+        objects = self._objects()
+
+        # Shards and increments are merged back into a single csv, with a single header
+        # if they have one, and gzipped objects are decompressed.
+        names = [attribute["AttributeName"] for attribute in self.schema["Attributes"]]
+        _merge_objects(
+            bucket,
+            objects,
+            destination,
+            self.aws_handler,
+            max_workers=download_workers,
+            skip_headers=self._has_header(bucket, objects[0]["Key"], names),
         )
 
-    # def to_df(self):
-    # pass
+    @property
+    def sharded(self):
+        """Whether the dataset is split in several objects under a prefix."""
+        return self.s3_uri.endswith("/")
+
+    def _objects(self):
+        """Returns the s3 objects of the dataset, every one under its prefix if it is
+        sharded, otherwise only its own key, followed by its increments. Listing a
+        single file by prefix would also match others that start alike, e.g. a .csv.gz
+        next to the .csv."""
+        if self.sharded:
+            objects = list(list_objects(self.s3_uri, self.aws_handler))
+            if not objects:
+                raise DatasetError(f"No files were found in {self.s3_uri}")
+        else:
+            objects = [self._object(self.s3_uri)]
+        return objects + [self._object(s3_uri) for s3_uri in self.increments]
+
+    def _object(self, s3_uri: str):
+        parsed_s3_uri = urlparse(s3_uri)
+        bucket, key = parsed_s3_uri.netloc, parsed_s3_uri.path.lstrip("/")
+        size = self.aws_handler.s3.head_object(Bucket=bucket, Key=key)["ContentLength"]
+        return {"Key": key, "Size": size}
+
+    def to_df(self, chunksize: int = None, download_workers: int = DOWNLOAD_WORKERS):
+        """Loads the dataset into a pandas DataFrame, streaming it from s3.
+
+        Columns are parsed with the types of the schema. If chunksize is given, an
+        iterator of DataFrames of chunksize rows is returned instead, so that datasets
+        larger than memory can be processed.
+        """
+        pandas = _import_pandas()
+
+        bucket = urlparse(self.s3_uri).netloc
+        objects = self._objects()
+
+        attributes = self.schema["Attributes"]
+        names = [attribute["AttributeName"] for attribute in attributes]
+        has_header = self._has_header(bucket, objects[0]["Key"], names)
+
+        # The objects are parsed while they are downloaded, without touching the disk.
+        stream = io.BufferedReader(
+            _ChunkStream(
+                data
+                for _, data in _iter_csv_chunks(
+                    bucket,
+                    objects,
+                    self.aws_handler,
+                    max_workers=download_workers,
+                    skip_headers=has_header,
+                )
+            ),
+            buffer_size=DOWNLOAD_CHUNK_SIZE,
+        )
+        reader = pandas.read_csv(
+            stream,
+            names=names,
+            header=0 if has_header else None,
+            dtype={
+                attribute["AttributeName"]: SCHEMA_DTYPES.get(
+                    attribute["AttributeType"], "object"
+                )
+                for attribute in attributes
+            },
+            chunksize=chunksize,
+        )
+
+        timestamps = [
+            attribute["AttributeName"]
+            for attribute in attributes
+            if attribute["AttributeType"] == "timestamp"
+        ]
+        timestamp_format = self.timestamp_format and java_to_strftime(
+            self.timestamp_format
+        )
+
+        def parse_timestamps(df):
+            for name in timestamps:
+                df[name] = pandas.to_datetime(df[name], format=timestamp_format)
+            return df
+
+        if chunksize is None:
+            df = parse_timestamps(reader)
+            stream.close()
+            return df
+
+        def chunks():
+            with stream, reader:
+                for df in reader:
+                    yield parse_timestamps(df)
+
+        return chunks()
+
+    def _has_header(self, bucket: str, key: str, names: list):
+        """Returns whether the csv object starts with a header."""
+        sample = self.aws_handler.s3.get_object(
+            Bucket=bucket, Key=key, Range=f"bytes=0-{HEADER_SAMPLE_SIZE - 1}"
+        )["Body"].read()
+        if key.endswith(".gz"):
+            sample = zlib.decompressobj(31).decompress(sample)
+        return is_header(sample, names)
@@ -20,3 +20,20 @@ class AWSHandlerError(Exception):
 
 class ResourceError(AWSHandlerError):
     pass
+
+
+class ResourceTimeoutError(ResourceError):
+    pass
+
+
+class WaitCancelledError(ResourceError):
+    pass
+
+
+class ResourcesError(ResourceError):
+    """Raised when waiting on several resources. outcomes maps every arn to its status."""
+
+    def __init__(self, message, failed_arn=None, outcomes=None):
+        super().__init__(message)
+        self.failed_arn = failed_arn
+        self.outcomes = outcomes or {}
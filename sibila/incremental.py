@@ -0,0 +1,86 @@
+import gzip
+from datetime import datetime
+
+from sibila.utils import java_to_strftime, is_header, _import_pandas, logger
+
+# Rows parsed at a time from the source file.
+DELTA_CHUNK_ROWS = 1000000
+# Format of the high-water marks tagged on imports, independent of the dataset's.
+HIGH_WATER_MARK_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+def delta_csv(
+    local_path: str,
+    destination_path: str,
+    schema: dict,
+    timestamp_format: str,
+    high_water_mark: str = None,
+    chunk_rows: int = DELTA_CHUNK_ROWS,
+):
+    """Writes the rows of a time series csv that are newer than high_water_mark.
+
+    The file is streamed in chunks of chunk_rows rows and values are copied as they
+    are, after the file's header if it has one. Without a high_water_mark every row
+    is counted, and without a destination_path nothing is written, only the
+    timestamps are parsed. Returns the amount of rows newer than high_water_mark and
+    the new high-water mark, the latest timestamp of the file, formatted with
+    HIGH_WATER_MARK_FORMAT.
+    """
+    pandas = _import_pandas()
+
+    attributes = schema["Attributes"]
+    names = [attribute["AttributeName"] for attribute in attributes]
+    timestamp = next(
+        attribute["AttributeName"]
+        for attribute in attributes
+        if attribute["AttributeType"] == "timestamp"
+    )
+    strftime_format = java_to_strftime(timestamp_format)
+    after = high_water_mark and datetime.strptime(
+        high_water_mark, HIGH_WATER_MARK_FORMAT
+    )
+
+    opener = gzip.open if local_path.endswith(".gz") else open
+    with opener(local_path, mode="rb") as local_file:
+        first_line = local_file.readline()
+    has_header = is_header(first_line, names)
+    # Values are read as text so that they are written back unchanged.
+    reader = pandas.read_csv(
+        local_path,
+        names=names,
+        header=0 if has_header else None,
+        usecols=None if destination_path else [timestamp],
+        dtype=str,
+        keep_default_na=False,
+        chunksize=chunk_rows,
+    )
+
+    written = 0
+    latest = None
+    destination = destination_path and open(destination_path, mode="w")
+    try:
+        # The header is kept so that the delta can be read after the file it extends.
+        if destination and has_header:
+            destination.write(first_line.decode().rstrip("\r\n") + "\n")
+        with reader:
+            for chunk in reader:
+                timestamps = pandas.to_datetime(
+                    chunk[timestamp], format=strftime_format
+                )
+                if len(chunk):
+                    chunk_latest = timestamps.max()
+                    latest = (
+                        chunk_latest if latest is None else max(latest, chunk_latest)
+                    )
+                if after:
+                    chunk = chunk[(timestamps > after).to_numpy()]
+
+                if destination:
+                    chunk.to_csv(destination, header=False, index=False)
+                written += len(chunk)
+    finally:
+        if destination:
+            destination.close()
+
+    logger.debug(f"{written} rows of {local_path} are newer than {high_water_mark}")
+    return written, latest and latest.strftime(HIGH_WATER_MARK_FORMAT)
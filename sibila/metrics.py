@@ -0,0 +1,126 @@
+import os
+import re
+
+from sibila.errors import PredictorError
+from sibila.utils import AWSHandler, _import_pandas, logger
+from sibila.validation import TARGET_FIELDS
+
+# File of Predictor.metrics() with the forecasts of every backtest window.
+BACKTEST_FORECASTS = "backtest_forecasts.csv"
+# Quantile columns, e.g. p10 or p99.5, and the mean forecast.
+_QUANTILE_COLUMN = re.compile(r"^p([0-9.]+)$")
+_MEAN_COLUMN = "mean"
+
+
+def read_backtest(path: str, metadata=None, domain: str = AWSHandler.DOMAIN):
+    """Loads the backtest forecasts exported by Predictor.metrics() into a DataFrame.
+
+    path is the directory given to Predictor.metrics() or its backtest_forecasts.csv.
+    The target and the forecasts are read as floats and every other column, item_id,
+    forecast dimensions, timestamps and backtest windows, as a category, so grouping
+    millions of series compares integer codes instead of strings. metadata, a
+    DataFrame or the path of an item metadata csv with an item_id column, is joined
+    on item_id so its attributes can be used to slice the metrics.
+    """
+    pandas = _import_pandas()
+
+    if os.path.isdir(path):
+        path = os.path.join(path, BACKTEST_FORECASTS)
+    columns = pandas.read_csv(path, nrows=0).columns
+    values = _value_columns(columns, domain)
+    backtest = pandas.read_csv(
+        path,
+        dtype={
+            column: "float64" if column in values else "category" for column in columns
+        },
+    )
+
+    if metadata is not None:
+        if isinstance(metadata, str):
+            metadata = pandas.read_csv(metadata, dtype="category")
+        backtest = backtest.merge(metadata, on="item_id", how="left")
+        for column in metadata.columns:
+            backtest[column] = backtest[column].astype("category")
+    return backtest
+
+
+def backtest_metrics(backtest, by: list = None, domain: str = AWSHandler.DOMAIN):
+    """Computes the accuracy of the backtest forecasts of read_backtest() for each
+    group of by, e.g. ["item_id"] or ["store_id", "category"]. Without by, the
+    metrics of every series together are returned as a single row.
+
+    The metrics are those of Predictor.accuracy_metrics(): WAPE and RMSE of the mean
+    forecast, or of p50 if there is no mean, and the weighted quantile loss of each
+    quantile, as wQL[0.5], and their average. The loss of each row is computed at
+    once for every row and summed with a single group by, rows without a target are
+    left out. Groups whose targets are all 0 have no WAPE nor wQL.
+    """
+    pandas = _import_pandas()
+
+    target = TARGET_FIELDS[domain]
+    quantiles = {
+        column: float(_QUANTILE_COLUMN.match(column).group(1)) / 100
+        for column in backtest.columns
+        if _QUANTILE_COLUMN.match(column)
+    }
+    point = _MEAN_COLUMN if _MEAN_COLUMN in backtest.columns else "p50"
+    if target not in backtest.columns or point not in backtest.columns:
+        raise PredictorError(
+            f"The backtest forecasts need {target} and a mean or p50 forecast"
+        )
+    unknown = set(by or []) - set(backtest.columns)
+    if unknown:
+        raise PredictorError(f"Unknown columns {sorted(unknown)} to group by")
+
+    backtest = backtest[backtest[target].notna()]
+    actual = backtest[target]
+    error = actual - backtest[point]
+    terms = pandas.DataFrame(
+        {
+            "absolute_target": actual.abs(),
+            "absolute_error": error.abs(),
+            "squared_error": error**2,
+            "count": error.notna().astype("int64"),
+        }
+    )
+    for column, quantile in quantiles.items():
+        # Pinball loss, underforecasts weigh quantile and overforecasts 1 - quantile.
+        error = actual - backtest[column]
+        under, over = error.clip(lower=0), (-error).clip(lower=0)
+        terms[column] = quantile * under + (1 - quantile) * over
+
+    if by:
+        sums = terms.groupby(
+            [backtest[column] for column in by], observed=True, sort=True
+        ).sum()
+    else:
+        sums = terms.sum().to_frame().T
+
+    # Errors are relative to the total of the target, unless it is 0.
+    scale = sums["absolute_target"].where(sums["absolute_target"] > 0)
+    metrics = pandas.DataFrame(
+        {
+            "WAPE": sums["absolute_error"] / scale,
+            "RMSE": (sums["squared_error"] / sums["count"]) ** 0.5,
+        },
+        index=sums.index,
+    )
+    for column, quantile in sorted(quantiles.items(), key=lambda item: item[1]):
+        metrics[f"wQL[{quantile:g}]"] = 2 * sums[column] / scale
+    if quantiles:
+        metrics["AverageWeightedQuantileLoss"] = metrics[
+            [f"wQL[{quantile:g}]" for quantile in quantiles.values()]
+        ].mean(axis=1)
+
+    logger.debug(f"Computed the backtest metrics of {len(metrics)} groups")
+    return metrics
+
+
+def _value_columns(columns, domain: str):
+    """Returns the columns of the backtest forecasts that are numeric."""
+    return [
+        column
+        for column in columns
+        if column in (TARGET_FIELDS[domain], _MEAN_COLUMN)
+        or _QUANTILE_COLUMN.match(column)
+    ]
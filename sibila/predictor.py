@@ -1,10 +1,95 @@
 import os
+import json
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from urllib.parse import urlparse
 
+from botocore.exceptions import ClientError
 from melitk import logging
 
-from sibila.errors import PredictorError, ResourceError
-from sibila.utils import wait_for_resource, download_and_merge, logger
+from sibila.store import ForecastStore
+from sibila.query import ForecastQuery, QUERY_CACHE_SIZE
+from sibila.errors import PredictorError, ResourceError, ResourcesError
+from sibila.utils import (
+    wait_for_resource,
+    wait_for_resources,
+    paginate,
+    list_objects,
+    delete_objects,
+    download_and_merge,
+    watch_and_merge,
+    download_objects,
+    read_parquet,
+    _import_pyarrow_dataset,
+    logger,
+    DOWNLOAD_WORKERS,
+    QUERY_WORKERS,
+)
+
+# Forecasts kept by query() to be reused, older ones are deleted since there is a
+# quota. forecast() only keeps them when asked to, as the quota is per account.
+FORECASTS_KEPT = 3
+# Tag that identifies the predictor, imports and quantiles a forecast was made with.
+FORECAST_KEY_TAG = "forecast_key"
+# Statuses of the forecasts and exports that can be reused.
+_REUSABLE_STATUSES = ("ACTIVE", "CREATE_PENDING", "CREATE_IN_PROGRESS")
+# File written to the destination of metrics() once the backtest is downloaded.
+BACKTEST_MARKER = ".backtest_export.json"
+
+
+def _describe_predictor(aws_handler: "AWSHandler", dsg_arn: str, predictor_arn: str):
+    """Returns the describe_predictor response, from the cache once it is ACTIVE."""
+    cache = aws_handler.cache
+    predictor_info = cache and cache.get(dsg_arn, "predictor", predictor_arn)
+    if predictor_info:
+        return predictor_info
+
+    predictor_info = aws_handler.forecast.describe_predictor(PredictorArn=predictor_arn)
+    # An ACTIVE predictor doesn't change anymore.
+    if cache and predictor_info["Status"] == "ACTIVE":
+        cache.set(dsg_arn, "predictor", predictor_arn, predictor_info)
+    return predictor_info
+
+
+def _export_prefix(export: dict):
+    # The slash keeps the exports of forecasts whose name starts alike apart.
+    return export["Destination"]["S3Config"]["Path"].rstrip("/") + "/"
+
+
+def _advance(steps, error: ResourceError = None):
+    """Runs the steps of an operation up to the next resources they wait for.
+
+    Steps are a generator that calls AWS by itself but yields whatever it waits for,
+    a (resource_name, resource_arn) or a list of them to wait for together, and
+    returns the result of the operation. The error of the previous wait, if any, is
+    raised at the yield. Returns (True, result) once they are done, otherwise
+    (False, resources).
+    """
+    try:
+        resources = steps.throw(error) if error else next(steps)
+    except StopIteration as stop:
+        return True, stop.value
+    return False, resources
+
+
+def _run_steps(steps, aws_handler: "AWSHandler"):
+    """Runs the steps of an operation, blocking on each wait. aio drives the same
+    steps without blocking the event loop."""
+    error = None
+    while True:
+        done, resources = _advance(steps, error)
+        if done:
+            return resources
+
+        error = None
+        try:
+            if isinstance(resources, list):
+                wait_for_resources(resources, aws_handler)
+            else:
+                wait_for_resource(*resources, aws_handler)
+        except ResourceError as e:
+            error = e
 
 
 class Predictor:
@@ -19,6 +104,12 @@ class Predictor:
 
     VALID_ALGORITHMS = (AUTO, ARIMA, DEEP_AR_PLUS, ETS, NPTS, PROPHET, CNN_QR)
 
+    CSV = "CSV"
+    PARQUET = "PARQUET"
+    SQLITE = "SQLITE"
+
+    VALID_FORMATS = (CSV, PARQUET, SQLITE)
+
     def __init__(
         self,
         aws_handler: "AWSHandler",
@@ -127,9 +218,7 @@ class Predictor:
         ]
 
     def _update(self):
-        predictor_info = self.aws_handler.forecast.describe_predictor(
-            PredictorArn=self.arn
-        )
+        predictor_info = _describe_predictor(self.aws_handler, self.dsg_arn, self.arn)
         try:
             algorithm = predictor_info["AlgorithmArn"].split("/")[-1]
         except KeyError:
@@ -175,18 +264,79 @@ class Predictor:
             "training_parameters": self.training_parameters,
         }
 
-    def wait_for_training(self):
+    def accuracy_metrics(self):
+        """Returns the summary backtest metrics of the predictor, once it is ACTIVE.
+
+        Every metric is an error, so lower is better. Metrics of other forecast types
+        than the mean are keyed as NAME[type], e.g. wQL[0.5] or WAPE[0.9].
+        """
+        if self.algorithm == Predictor.AUTO:
+            # Find out which algorithm AutoML chose.
+            self._update()
+
+        results = self.aws_handler.forecast.get_accuracy_metrics(PredictorArn=self.arn)[
+            "PredictorEvaluationResults"
+        ]
+        # AutoML evaluates every candidate algorithm, keep the chosen one.
+        result = next(
+            (
+                result
+                for result in results
+                if result.get("AlgorithmArn", "").split("/")[-1] == self.algorithm
+            ),
+            results[0],
+        )
+        window = next(
+            (
+                window
+                for window in result["TestWindows"]
+                if window.get("EvaluationType") == "SUMMARY"
+            ),
+            result["TestWindows"][0],
+        )
+
+        metrics = {
+            name: value
+            for name, value in window["Metrics"].items()
+            if name in ("RMSE", "AverageWeightedQuantileLoss")
+        }
+        for loss in window["Metrics"].get("WeightedQuantileLosses", []):
+            metrics[f"wQL[{loss['Quantile']}]"] = loss["LossValue"]
+        for errors in window["Metrics"].get("ErrorMetrics", []):
+            forecast_type = errors.get("ForecastType", "mean")
+            suffix = "" if forecast_type == "mean" else f"[{forecast_type}]"
+            for name in ("WAPE", "RMSE", "MASE", "MAPE"):
+                if name in errors:
+                    metrics[name + suffix] = errors[name]
+        return metrics
+
+    def wait_for_training(self, timeout: float = None):
         try:
-            wait_for_resource("predictor", self.arn, self.aws_handler)
+            wait_for_resource("predictor", self.arn, self.aws_handler, timeout=timeout)
         except ResourceError as e:  # pragma: no cover
             logger.error(f"There was an error {e} when creating the predictor")
             return
 
-    def metrics(self, destination_dir):
+    def metrics(self, destination_dir, download_workers: int = DOWNLOAD_WORKERS):
+        """Downloads the backtest of the predictor into destination_dir.
+
+        A predictor's backtest never changes, so an export of it under the project's
+        backtests/ prefix is reused instead of exporting it again, and nothing is
+        done if destination_dir already holds a complete download of it.
+        """
+        return _run_steps(
+            self._metrics_steps(destination_dir, download_workers), self.aws_handler
+        )
+
+    def _metrics_steps(self, destination_dir, download_workers: int):
+        """Steps of metrics(), see _run_steps."""
 
         if not os.path.isdir(destination_dir):  # pragma: no cover
             logger.info(f"Creating directory: {destination_dir}")
             os.mkdir(destination_dir)
+        if self._backtest_downloaded(destination_dir):
+            logger.info(f"The backtest is already downloaded in {destination_dir}")
+            return destination_dir
 
         name = "backtest_" + str(datetime.now().timestamp()).replace(".", "_")
         s3_uri = f"{self.aws_handler.s3_uri}/backtests/{name}"
@@ -194,55 +344,46 @@ class Predictor:
         # Wait for the predictor to be active before trying to retrieve the metrics.
         logger.info("Waiting for the predictor to be ready...")
         try:
-            wait_for_resource("predictor", self.arn, self.aws_handler)
+            yield ("predictor", self.arn)
         except ResourceError as e:  # pragma: no cover
             logger.error(
                 f"The metrics could not be retrieved because there was an error {e} when creating the predictor"
             )
             return
 
-        # Create the backtest export job.
-        logger.debug(f"Creating backtest export {name} to {s3_uri}")
-        backtest_arn = self.aws_handler.forecast.create_predictor_backtest_export_job(
-            PredictorBacktestExportJobName=name,
-            PredictorArn=self.arn,
-            Destination={
-                "S3Config": {
-                    "Path": s3_uri,
-                    "RoleArn": self.aws_handler.ROLE_ARN,
-                }
-            },
-            Tags=[
-                {
-                    "Key": "Name",
-                    "Value": self.aws_handler.team,
-                },
-            ],
-        )["PredictorBacktestExportJobArn"]
+        # Create the backtest export job, unless there is one already.
+        export = self._find_backtest_export()
+        if export:
+            backtest_arn, s3_uri = export
+            logger.info(f"Reusing backtest export {backtest_arn}")
+        else:
+            backtest_arn = self._create_backtest_export(name, s3_uri)
 
         logger.info("Waiting for predictor metrics to be ready...")
         try:
-            wait_for_resource(
-                "predictor_backtest_export_job", backtest_arn, self.aws_handler
-            )
+            yield ("predictor_backtest_export_job", backtest_arn)
         except ResourceError as e:  # pragma: no cover
             logger.error(
                 f"The metrics could not be exported because an error {e} ocurred"
             )
             return
 
-        # Download the exported csv files and merge them into the destination path.
+        # Download the exported csv files concurrently into the destination dir.
         logger.debug("Downloading and merging files")
-        download_and_merge(
-            s3_uri + "/accuracy-metrics-values/",
-            os.path.join(destination_dir, "backtest_metrics.csv"),
-            self.aws_handler,
-        )
-        download_and_merge(
-            s3_uri + "/forecasted-values/",
-            os.path.join(destination_dir, "backtest_forecasts.csv"),
-            self.aws_handler,
-        )
+        self._clear_backtest_marker(destination_dir)
+        files = self._backtest_files(s3_uri, destination_dir)
+        with ThreadPoolExecutor(max_workers=len(files)) as executor:
+            merged = list(
+                executor.map(
+                    lambda backtest_file: download_and_merge(
+                        *backtest_file,
+                        self.aws_handler,
+                        max_workers=download_workers,
+                    ),
+                    files,
+                )
+            )
+        self._write_backtest_marker(destination_dir, merged)
 
         return destination_dir
 
@@ -250,84 +391,491 @@ class Predictor:
         self,
         destination_path: str,
         quantiles: list = None,
+        download_workers: int = DOWNLOAD_WORKERS,
+        file_format: str = CSV,
+        keep_forecasts: int = 0,
+        pipelined: bool = False,
+    ):
+        """Forecasts every series and downloads the result to destination_path.
+
+        With the CSV format the exported parts are merged into a single csv file. With
+        PARQUET they are downloaded into the destination_path directory and a lazy
+        pyarrow dataset over them is returned. With SQLITE they are loaded into a
+        store.ForecastStore at destination_path, which is returned.
+
+        By default the forecast is deleted once downloaded. With keep_forecasts the
+        last keep_forecasts forecasts of the project are kept, and one of the same
+        predictor, quantiles and dataset imports is reused along with its export
+        instead of forecasting again. Older ones are deleted since there is a quota of
+        forecasts, shared by every project of the account.
+
+        With pipelined, csv parts are downloaded and merged as the export writes them
+        instead of after it finishes, in the order they appear.
+        """
+        return _run_steps(
+            self._forecast_steps(
+                destination_path,
+                quantiles,
+                download_workers,
+                file_format,
+                keep_forecasts,
+                pipelined,
+            ),
+            self.aws_handler,
+        )
+
+    def _forecast_steps(
+        self,
+        destination_path: str,
+        quantiles: list,
+        download_workers: int,
+        file_format: str,
+        keep_forecasts: int,
+        pipelined: bool,
     ):
+        """Steps of forecast(), see _run_steps."""
 
         quantiles = quantiles or ["0.1", "0.5", "0.9"]
 
+        if file_format not in Predictor.VALID_FORMATS:
+            raise PredictorError(f"Valid formats are {Predictor.VALID_FORMATS}")
+        if pipelined and file_format != Predictor.CSV:
+            raise PredictorError("Only CSV forecasts can be downloaded pipelined")
+        if file_format == Predictor.PARQUET:
+            # Fail before the forecast is created if pyarrow is missing.
+            _import_pyarrow_dataset()
+
         name = "forecast_" + str(datetime.now().timestamp()).replace(".", "_")
-        s3_uri = f"{self.aws_handler.s3_uri}/forecasts/{name}"
 
-        # Wait for all datasets to be ready before forecasting.
-        logger.info("Waiting for all datasets to be ready")
-        for dataset_arn in self.aws_handler._datasets.values():
-            try:
-                wait_for_resource("dataset", dataset_arn, self.aws_handler)
-            except ResourceError as e:  # pragma: no cover
-                logger.error(f"Error in dataset {dataset_arn}: {e}")
-                logger.error(
-                    """The forecast could not be created because some of the datasets in the project contain errors.
-                    You should re-upload the ones that failed."""
-                )
-                return
+        forecast_arn = yield from self._active_forecast_steps(
+            name, quantiles, keep_forecasts
+        )
+        if not forecast_arn:  # pragma: no cover
+            return
 
-        # Wait for the predictor to be active before trying to create a forecast.
-        logger.info("Waiting for the predictor to be ready")
+        # Create the export, unless the reused forecast was already exported.
+        export = self._find_export(forecast_arn, file_format)
+        if export:
+            export_arn, s3_uri = export
+            logger.info(f"Reusing forecast export {export_arn}")
+        else:
+            destination = f"{self.aws_handler.s3_uri}/forecasts/{name}"
+            export_arn = self._create_forecast_export(
+                name, forecast_arn, destination, file_format
+            )
+            # Parts are listed like _export_prefix does, apart from other exports.
+            s3_uri = destination + "/"
+
+        ## Download exports and join them into the destination csv file.
+
+        # Wait for forecast export to be active before trying download files, unless
+        # the parts are downloaded while it is written.
+        logger.debug(f"Waiting for forecast export {export_arn} to be ready...")
         try:
-            wait_for_resource("predictor", self.arn, self.aws_handler)
+            if pipelined:
+                watch_and_merge(
+                    s3_uri,
+                    destination_path,
+                    "forecast_export_job",
+                    export_arn,
+                    self.aws_handler,
+                    max_workers=download_workers,
+                )
+            else:
+                yield ("forecast_export_job", export_arn)
         except ResourceError as e:  # pragma: no cover
             logger.error(
-                f"The forecast could not be generated because there was an error {e} when creating the predictor"
+                f"The forecast could not be retrieved because there was an error {e} while creating the forecast"
             )
             return
 
-        logger.debug(f"Creating forecast {name}")
-        forecast_arn = self.aws_handler.forecast.create_forecast(
-            ForecastName=name,
-            PredictorArn=self.arn,
-            ForecastTypes=quantiles,
-            Tags=[{"Key": "Name", "Value": self.aws_handler.team}],
-        )["ForecastArn"]
+        result = None
+        if not pipelined:
+            result = self._download_forecast(
+                s3_uri, destination_path, download_workers, file_format
+            )
+        self._release_forecast(forecast_arn, keep_forecasts)
+        return result
+
+    def query(
+        self,
+        quantiles: list = None,
+        keep_forecasts: int = FORECASTS_KEPT,
+        max_workers: int = QUERY_WORKERS,
+        cache_size: int = QUERY_CACHE_SIZE,
+    ):
+        """Forecasts every series without exporting them and returns a
+        query.ForecastQuery, which looks up single items in the forecast.
+
+        The forecast is reused and evicted like in forecast(), so keep_forecasts must be
+        at least 1 for the forecast to outlive this call.
+        """
+
+        quantiles = quantiles or ["0.1", "0.5", "0.9"]
+
+        if keep_forecasts < 1:
+            raise PredictorError("The forecast must be kept to be queried")
+
+        name = "forecast_" + str(datetime.now().timestamp()).replace(".", "_")
+        forecast_arn = _run_steps(
+            self._active_forecast_steps(name, quantiles, keep_forecasts),
+            self.aws_handler,
+        )
+        if not forecast_arn:  # pragma: no cover
+            return
+
+        self._release_forecast(forecast_arn, keep_forecasts)
+        return ForecastQuery(
+            forecast_arn,
+            self.aws_handler,
+            max_workers=max_workers,
+            cache_size=cache_size,
+        )
+
+    def _active_forecast_steps(self, name: str, quantiles: list, keep_forecasts: int):
+        """Steps that return the arn of an active forecast of every series, reusing
+        one whose data didn't change unless keep_forecasts is 0. They return None if
+        it couldn't be created."""
+
+        # Wait for all datasets and the predictor to be ready before forecasting.
+        logger.info("Waiting for all datasets and the predictor to be ready")
+        try:
+            yield self._forecast_resources()
+        except ResourcesError as e:  # pragma: no cover
+            self._log_forecast_resources_error(e)
+            return None
+
+        # A forecast of the same predictor, imports and quantiles has the same values.
+        key = self._forecast_key(quantiles)
+        forecast_arn = keep_forecasts and key and self._find_forecast(key)
+        if forecast_arn:
+            logger.info(f"Reusing forecast {forecast_arn}, its data didn't change")
+        else:
+            forecast_arn = self._create_forecast(name, quantiles, key)
 
         # Wait for forecast to be active before trying to make an export.
         logger.info("Waiting for forecast to be ready...")
         try:
-            wait_for_resource("forecast", forecast_arn, self.aws_handler)
+            yield ("forecast", forecast_arn)
         except ResourceError as e:  # pragma: no cover
             logger.error(
                 f"The forecast could not be created because there was an error {e} while creating the export"
             )
+            return None
+        return forecast_arn
+
+    def _forecast_resources(self):
+        """Returns the resources that must be ACTIVE before forecasting."""
+        return [
+            ("dataset", dataset_arn)
+            for dataset_arn in self.aws_handler._datasets.values()
+        ] + [("predictor", self.arn)]
+
+    def _log_forecast_resources_error(self, e: ResourcesError):
+        logger.error(f"Error in {e.failed_arn}: {e}")
+        if e.failed_arn == self.arn:
+            logger.error(
+                f"The forecast could not be generated because there was an error {e} when creating the predictor"
+            )
+        else:
+            logger.error(
+                """The forecast could not be created because some of the datasets in the project contain errors.
+                You should re-upload the ones that failed."""
+            )
+
+    def _create_forecast(self, name: str, quantiles: list, key: str = None):
+        logger.debug(f"Creating forecast {name}")
+        tags = [{"Key": "Name", "Value": self.aws_handler.team}]
+        if key:
+            tags.append({"Key": FORECAST_KEY_TAG, "Value": key})
+        return self.aws_handler.forecast.create_forecast(
+            ForecastName=name,
+            PredictorArn=self.arn,
+            ForecastTypes=quantiles,
+            Tags=tags,
+        )["ForecastArn"]
+
+    def _forecast_key(self, quantiles: list):
+        """Returns a hash of the predictor, the latest import of each dataset and the
+        quantiles, which identifies the values of a forecast. Returns None if the
+        datasets have no imports, in which case forecasts aren't reused."""
+        latest_imports = self._latest_imports()
+        if not latest_imports:
+            return None
+
+        state = [self.arn] + sorted(latest_imports)
+        state += sorted(str(quantile) for quantile in quantiles)
+        return hashlib.sha256("\n".join(state).encode()).hexdigest()
+
+    def _latest_imports(self):
+        """Returns the arn of the latest active import of each dataset.
+
+        They are listed from the service rather than taken from the project's cached
+        entities, which don't see the imports of other processes until they expire.
+        """
+        latest_imports = []
+        for dataset_arn in self.aws_handler._datasets.values():
+            imports = [
+                import_job
+                for import_job in paginate(
+                    self.aws_handler.forecast,
+                    "list_dataset_import_jobs",
+                    "DatasetImportJobs",
+                    Filters=[
+                        {"Key": "DatasetArn", "Value": dataset_arn, "Condition": "IS"}
+                    ],
+                )
+                if import_job["Status"] == "ACTIVE"
+            ]
+            if imports:
+                latest_import = max(
+                    imports,
+                    key=lambda x: float(
+                        x["DatasetImportJobName"].split("__")[1].replace("_", ".")
+                    ),
+                )
+                latest_imports.append(latest_import["DatasetImportJobArn"])
+        return latest_imports
+
+    def _find_forecast(self, key: str):
+        """Returns the arn of a forecast of this predictor tagged with key, if any."""
+        for forecast in paginate(
+            self.aws_handler.forecast,
+            "list_forecasts",
+            "Forecasts",
+            Filters=[{"Key": "PredictorArn", "Value": self.arn, "Condition": "IS"}],
+        ):
+            if forecast["Status"] not in _REUSABLE_STATUSES:
+                continue
+            tags = self.aws_handler.forecast.list_tags_for_resource(
+                ResourceArn=forecast["ForecastArn"]
+            )["Tags"]
+            if {"Key": FORECAST_KEY_TAG, "Value": key} in tags:
+                return forecast["ForecastArn"]
+        return None
+
+    def _find_export(self, forecast_arn: str, file_format: str):
+        """Returns the arn and s3 uri of an export of the forecast that can be
+        downloaded in file_format, if any."""
+        # SQLITE stores are built from a csv export.
+        export_format = (
+            Predictor.PARQUET if file_format == Predictor.PARQUET else Predictor.CSV
+        )
+        for export in paginate(
+            self.aws_handler.forecast,
+            "list_forecast_export_jobs",
+            "ForecastExportJobs",
+            Filters=[{"Key": "ForecastArn", "Value": forecast_arn, "Condition": "IS"}],
+        ):
+            if export["Status"] not in _REUSABLE_STATUSES:
+                continue
+            export_info = self.aws_handler.forecast.describe_forecast_export_job(
+                ForecastExportJobArn=export["ForecastExportJobArn"]
+            )
+            if export_info.get("Format", Predictor.CSV) == export_format:
+                return export["ForecastExportJobArn"], _export_prefix(export)
+        return None
+
+    def _release_forecast(self, forecast_arn: str, keep_forecasts: int):
+        """Deletes the forecast, or the project's oldest ones beyond keep_forecasts."""
+        if not keep_forecasts:
+            # Delete forecast since there is a quota.
+            logger.debug(f"Deleting forecast with ARN {forecast_arn}")
+            self.aws_handler.forecast.delete_forecast(ForecastArn=forecast_arn)
             return
 
-        # Create the export
+        # Only the forecasts created by sibila that are done are evicted.
+        forecasts = sorted(
+            (
+                forecast
+                for forecast in paginate(
+                    self.aws_handler.forecast,
+                    "list_forecasts",
+                    "Forecasts",
+                    Filters=[
+                        {
+                            "Key": "DatasetGroupArn",
+                            "Value": self.dsg_arn,
+                            "Condition": "IS",
+                        }
+                    ],
+                )
+                if forecast["ForecastName"].startswith("forecast_")
+                and forecast["ForecastArn"] != forecast_arn
+                and forecast["Status"] in ("ACTIVE", "CREATE_FAILED")
+            ),
+            key=lambda forecast: forecast["CreationTime"],
+            reverse=True,
+        )
+        for forecast in forecasts[keep_forecasts - 1 :]:
+            self._delete_forecast(forecast["ForecastArn"])
+
+    def _delete_forecast(self, forecast_arn: str):
+        """Deletes a forecast, its export jobs and the exported files."""
+        logger.debug(f"Evicting forecast with ARN {forecast_arn}")
+        for export in paginate(
+            self.aws_handler.forecast,
+            "list_forecast_export_jobs",
+            "ForecastExportJobs",
+            Filters=[{"Key": "ForecastArn", "Value": forecast_arn, "Condition": "IS"}],
+        ):
+            s3_uri = _export_prefix(export)
+            bucket = urlparse(s3_uri).netloc
+            delete_objects(
+                [
+                    f"s3://{bucket}/{s3_object['Key']}"
+                    for s3_object in list_objects(s3_uri, self.aws_handler)
+                ],
+                self.aws_handler,
+            )
+
+        try:
+            self.aws_handler.forecast.delete_resource_tree(ResourceArn=forecast_arn)
+        except ClientError as e:
+            logger.warning(f"The forecast {forecast_arn} could not be deleted: {e}")
+
+    def _create_forecast_export(
+        self, name: str, forecast_arn: str, s3_uri: str, file_format: str = CSV
+    ):
         logger.debug(f"Creating forecast export {name}__e to {s3_uri}")
-        export_arn = self.aws_handler.forecast.create_forecast_export_job(
-            ForecastExportJobName=name + "__e",
-            ForecastArn=forecast_arn,
-            Destination={
+        request = {
+            "ForecastExportJobName": name + "__e",
+            "ForecastArn": forecast_arn,
+            "Destination": {
                 "S3Config": {
                     "Path": s3_uri,
                     "RoleArn": self.aws_handler.ROLE_ARN,
                 }
             },
-            Tags=[{"Key": "Name", "Value": self.aws_handler.team}],
-        )["ForecastExportJobArn"]
+            "Tags": [{"Key": "Name", "Value": self.aws_handler.team}],
+        }
+        # Format is left out for csv so that older boto3 versions keep working. SQLITE
+        # stores are built from a csv export.
+        if file_format == Predictor.PARQUET:
+            request["Format"] = file_format
+        return self.aws_handler.forecast.create_forecast_export_job(**request)[
+            "ForecastExportJobArn"
+        ]
 
-        ## Download exports and join them into the destination csv file.
+    def _download_forecast(
+        self,
+        s3_uri: str,
+        destination_path: str,
+        download_workers: int,
+        file_format: str,
+    ):
+        """Downloads the export and returns what forecast() returns for file_format."""
+        if file_format == Predictor.PARQUET:
+            # Parquet parts can't be concatenated, each one is kept as its own file.
+            # Only the parts of this export are read, the directory may hold others.
+            logger.debug(f"Downloading parquet files into {destination_path}")
+            paths = download_objects(
+                s3_uri,
+                destination_path,
+                self.aws_handler,
+                suffix=".parquet",
+                max_workers=download_workers,
+            )
+            return read_parquet(paths)
+        elif file_format == Predictor.SQLITE:
+            logger.debug(f"Loading the exported csv files into {destination_path}")
+            return ForecastStore.from_s3(
+                s3_uri, destination_path, self.aws_handler, max_workers=download_workers
+            )
+        else:
+            # Download the exported csv files and merge them into the destination path.
+            logger.debug("Downloading and merging files")
+            download_and_merge(
+                s3_uri, destination_path, self.aws_handler, max_workers=download_workers
+            )
 
-        # Wait for forecast export to be active before trying download files.
-        logger.debug(f"Waiting for forecast export {export_arn} to be ready...")
-        try:
-            wait_for_resource("forecast_export_job", export_arn, self.aws_handler)
-        except ResourceError as e:  # pragma: no cover
-            logger.error(
-                f"The forecast could not be retrieved because there was an error {e} while creating the forecast"
+    def _create_backtest_export(self, name: str, s3_uri: str):
+        logger.debug(f"Creating backtest export {name} to {s3_uri}")
+        return self.aws_handler.forecast.create_predictor_backtest_export_job(
+            PredictorBacktestExportJobName=name,
+            PredictorArn=self.arn,
+            Destination={
+                "S3Config": {
+                    "Path": s3_uri,
+                    "RoleArn": self.aws_handler.ROLE_ARN,
+                }
+            },
+            Tags=[
+                {
+                    "Key": "Name",
+                    "Value": self.aws_handler.team,
+                },
+            ],
+        )["PredictorBacktestExportJobArn"]
+
+    def _find_backtest_export(self):
+        """Returns the arn and s3 uri of an export of the predictor's backtest under
+        the project's backtests/ prefix, preferring finished ones, if any. Finished
+        exports whose files were deleted aren't reused."""
+        prefix = f"{self.aws_handler.s3_uri}/backtests/"
+        exports = [
+            export
+            for export in paginate(
+                self.aws_handler.forecast,
+                "list_predictor_backtest_export_jobs",
+                "PredictorBacktestExportJobs",
+                Filters=[{"Key": "PredictorArn", "Value": self.arn, "Condition": "IS"}],
             )
-            return
+            if export["Status"] in _REUSABLE_STATUSES
+            and export["Destination"]["S3Config"]["Path"].startswith(prefix)
+            and (export["Status"] != "ACTIVE" or self._export_has_files(export))
+        ]
+        if not exports:
+            return None
 
-        # Download the exported csv files and merge them into the destination path.
-        logger.debug("Downloading and merging files")
-        download_and_merge(s3_uri, destination_path, self.aws_handler)
+        export = min(exports, key=lambda export: export["Status"] != "ACTIVE")
+        return (
+            export["PredictorBacktestExportJobArn"],
+            export["Destination"]["S3Config"]["Path"].rstrip("/"),
+        )
 
-        # Delete forecast since there is a quota.
-        logger.debug(f"Deleting forecast with ARN {forecast_arn}")
-        self.aws_handler.forecast.delete_forecast(ForecastArn=forecast_arn)
+    def _export_has_files(self, export: dict):
+        s3_objects = list_objects(_export_prefix(export), self.aws_handler)
+        return next(iter(s3_objects), None) is not None
+
+    def _backtest_downloaded(self, destination_dir: str):
+        """Returns whether destination_dir holds a complete download of the backtest
+        of this predictor."""
+        marker_path = os.path.join(destination_dir, BACKTEST_MARKER)
+        if not os.path.isfile(marker_path):
+            return False
+        with open(marker_path) as marker_file:
+            marker = json.load(marker_file)
+        return marker.get("PredictorArn") == self.arn and all(
+            os.path.isfile(destination_path)
+            for _, destination_path in self._backtest_files("", destination_dir)
+        )
+
+    def _clear_backtest_marker(self, destination_dir: str):
+        marker_path = os.path.join(destination_dir, BACKTEST_MARKER)
+        if os.path.isfile(marker_path):
+            os.remove(marker_path)
+
+    def _write_backtest_marker(self, destination_dir: str, merged: list):
+        # Written last, so an interrupted download is started again, and only if
+        # every file has content, so an empty export is downloaded again too.
+        if not all(merged):
+            logger.warning(
+                f"The backtest export of {self.arn} is missing files, it will be downloaded again on the next call"
+            )
+            return
+        with open(os.path.join(destination_dir, BACKTEST_MARKER), "w") as marker_file:
+            json.dump({"PredictorArn": self.arn}, marker_file)
+
+    def _backtest_files(self, s3_uri: str, destination_dir: str):
+        """Returns the (s3_uri, destination_path) of every file in a backtest export."""
+        return [
+            (
+                s3_uri + "/accuracy-metrics-values/",
+                os.path.join(destination_dir, "backtest_metrics.csv"),
+            ),
+            (
+                s3_uri + "/forecasted-values/",
+                os.path.join(destination_dir, "backtest_forecasts.csv"),
+            ),
+        ]
@@ -1,22 +1,55 @@
 import requests
 from os import environ
-from os.path import isfile
+from threading import Lock
+from concurrent.futures import ThreadPoolExecutor
+from os.path import isfile, join
+from tempfile import TemporaryDirectory
 from http import HTTPStatus
 from datetime import datetime
 from urllib.parse import urlparse
 
+from botocore.exceptions import ClientError
 from melitk import logging
 
-from sibila.utils import AWSHandler, wait_for_resource, ds_types_short, logger
-from sibila.dataset import Dataset
-from sibila.predictor import Predictor
+from sibila.utils import (
+    AWSHandler,
+    PollingStrategy,
+    wait_for_resource,
+    wait_for_resources,
+    paginate,
+    upload_file,
+    upload_shards,
+    list_objects,
+    delete_objects,
+    is_header,
+    file_sha256,
+    ds_types_short,
+    logger,
+    UPLOAD_PART_SIZE,
+    UPLOAD_WORKERS,
+)
+from sibila.cache import EntityCache
+from sibila.dataset import Dataset, SHA256_TAG, HIGH_WATER_MARK_TAG
+from sibila.schema import infer_schema
+from sibila.resample import resample_csv
+from sibila.incremental import delta_csv
+from sibila.validation import validate_csv
+from sibila.predictor import Predictor, _describe_predictor
 from sibila.errors import (
     UnableToLoginError,
     DatasetError,
     PredictorError,
     ResourceError,
+    ResourcesError,
+    ResourceTimeoutError,
 )
 
+# Amount of concurrent requests made to retrieve the project's entities.
+ENTITY_WORKERS = 8
+# Amount of predictors trained at once by train_predictors. AWS only allows a few
+# predictors to be in progress at the same time in each account.
+TRAINING_WORKERS = 3
+
 
 class Project:
     def __init__(
@@ -29,6 +62,8 @@ class Project:
         aws_secret_access_key: str = environ.get("AWS_SECRET_ACCESS_KEY"),
         aws_session_token: str = environ.get("AWS_SESSION_TOKEN"),
         region_name: str = "us-east-1",
+        polling: PollingStrategy = None,
+        cache: EntityCache = None,
     ):
         if not aws_access_key_id and not aws_secret_access_key and not aws_session_token:
             # provifing defaults. Remove soon.
@@ -74,45 +109,154 @@ class Project:
             aws_secret_access_key=aws_secret_access_key,
             aws_session_token=aws_session_token,
             region_name=region_name,
+            polling=polling,
+            cache=cache,
         )
 
-        dataset_groups = self._dataset_groups()
-        if self._dsg_name in dataset_groups.keys():
+        self.arn = self._find_dataset_group()
+        if self.arn:
             logger.debug(f"Pointing to existing dataset group {self._dsg_name}")
-            self.arn = dataset_groups[self._dsg_name]
         else:
             logger.debug(f"Creating new dataset group {self._dsg_name}")
             self.arn = self._create_group()
 
-        self._datasets, self.imports, self._predictors = self._get_entities()
+        # Datasets, imports and predictors are retrieved on first access.
+        self._entities = {}
+
+    @property
+    def _datasets(self):
+        return self._get_entity("datasets")
+
+    @_datasets.setter
+    def _datasets(self, datasets):
+        self._entities["datasets"] = datasets
         # This is a hotfix so that I can access the _datasets within the Predictor class.
-        self.aws_handler._datasets = self._datasets
+        self.aws_handler._datasets = datasets
+
+    @property
+    def imports(self):
+        return self._get_entity("imports")
+
+    @imports.setter
+    def imports(self, imports):
+        self._entities["imports"] = imports
+
+    @property
+    def _predictors(self):
+        return self._get_entity("predictors")
+
+    @_predictors.setter
+    def _predictors(self, predictors):
+        self._entities["predictors"] = predictors
+
+    def _get_entity(self, kind):
+        if kind not in self._entities:
+            cache = self.aws_handler.cache
+            cached = cache and cache.get(self.arn, "entities", self.arn)
+            if cached:
+                datasets, imports, predictors = (
+                    cached["datasets"],
+                    cached["imports"],
+                    cached["predictors"],
+                )
+            else:
+                datasets, imports, predictors = self._get_entities()
+
+            # Entities that were already set are kept.
+            self._entities.setdefault("predictors", predictors)
+            if "datasets" not in self._entities:
+                self._datasets = datasets
+            if "imports" not in self._entities:
+                self.imports = imports
+            if not cached:
+                self._save_entities()
+        return self._entities[kind]
+
+    def _save_entities(self):
+        """Writes the project's entities through to the cache after they change."""
+        cache = self.aws_handler.cache
+        if cache and len(self._entities) == 3:
+            cache.set(self.arn, "entities", self.arn, self._entities)
 
     def _create_group(self):
-        return self.aws_handler.forecast.create_dataset_group(
+        dsg_arn = self.aws_handler.forecast.create_dataset_group(
             DatasetGroupName=self._dsg_name,
             Domain=self.aws_handler.DOMAIN,
             Tags=[{"Key": "Name", "Value": self.aws_handler.team}],
         )["DatasetGroupArn"]
 
+        if self.aws_handler.cache:
+            self.aws_handler.cache.set(
+                self._dsg_name, "dataset_group", self._dsg_name, dsg_arn
+            )
+        return dsg_arn
+
     def upload_dataset(
         self,
         local_path: str,
         ds_type: str,
-        schema: dict,
+        schema: dict = None,
         frequency: str = None,
         timestamp_format: str = None,
+        part_size: int = UPLOAD_PART_SIZE,
+        upload_workers: int = UPLOAD_WORKERS,
+        progress_callback=None,
+        shards: int = None,
+        compress: bool = False,
+        validate: bool = False,
+        resample: bool = False,
+        aggregations: dict = None,
+        incremental: bool = False,
     ):
         """Returns a dataset object by creating an import and a dataset to hold it in aws.
         Naming convention:
             CSV Path: s3://bi-ml-forecasting-data/TEAM/project_name/datasets/TARGET_TIME_SERIES.csv"
+            Sharded CSV Path: s3://bi-ml-forecasting-data/TEAM/project_name/datasets/TARGET_TIME_SERIES/"
             DatasetName: TEAM__project_name__TTS
             ImportName: TTS__timestamp
+
+        The csv is uploaded in parts of part_size bytes, upload_workers at a time, and an
+        interrupted upload is resumed by calling this method again. progress_callback is
+        called with the bytes uploaded so far, the total and the bytes per second.
+
+        If shards is given the csv is split in that amount of objects, which are
+        uploaded and imported in parallel.
+
+        A .csv.gz file is uploaded as is. If compress is set a .csv file is gzipped
+        while it is uploaded, which reduces the bytes sent and stored.
+
+        If schema is None it is inferred from a sample of the file with
+        schema.infer_schema, as well as frequency and timestamp_format if they aren't
+        given.
+
+        If validate is set the file is checked against the schema with
+        validation.validate_csv before anything is created, instead of finding out
+        when the import fails.
+
+        If resample is set a time series is aggregated to frequency, per item and
+        dimension, before it is uploaded, with resample.resample_csv and the given
+        aggregations.
+
+        If incremental is set only the rows newer than the latest timestamp of the
+        previous import are uploaded, as a new object, and imported in INCREMENTAL
+        mode so they are added to the ones already imported. The latest timestamp of
+        every incremental upload is tagged on its import. If no previous import has
+        one, the whole file is imported. The dataset keeps pointing to the file of
+        the last full import and lists the new objects in its increments.
         """
 
         # Validations
-        if not local_path.endswith(".csv"):
-            raise DatasetError("The file provided must be a .csv file")
+        gzipped = local_path.endswith(".csv.gz")
+        if not (local_path.endswith(".csv") or gzipped):
+            raise DatasetError("The file provided must be a .csv or .csv.gz file")
+
+        if gzipped and shards and not resample:
+            raise DatasetError(
+                "A .csv.gz file can't be split in shards, upload the .csv with compress instead"
+            )
+
+        if incremental and shards:
+            raise DatasetError("Incremental imports can't be split in shards")
 
         if not isfile(local_path):
             raise DatasetError("Could not find a file in the specified local_path")
@@ -120,11 +264,62 @@ class Project:
         if ds_type not in Dataset.VALID_DATASET_TYPES:
             raise DatasetError(f"Valid dataset types are {Dataset.VALID_DATASET_TYPES}")
 
+        if schema is None:
+            inferred = infer_schema(local_path, ds_type)
+            logger.info(
+                f"Inferred schema {inferred.schema}, frequency {inferred.frequency} and timestamp format {inferred.timestamp_format}"
+            )
+            schema = inferred.schema
+            frequency = frequency or inferred.frequency
+            timestamp_format = timestamp_format or inferred.timestamp_format
+
         if (ds_type != Dataset.ITEM_METADATA) and not (frequency and timestamp_format):
             raise DatasetError(
                 "You must specify a frequency and a timestamp_format for this type of dataset."
             )
 
+        if incremental and ds_type == Dataset.ITEM_METADATA:
+            raise DatasetError("Only time series can be imported incrementally")
+
+        if validate:
+            logger.info(f"Validating {local_path}")
+            validate_csv(
+                local_path,
+                ds_type,
+                schema,
+                frequency=frequency,
+                timestamp_format=timestamp_format,
+                domain=self.aws_handler.DOMAIN,
+            )
+
+        if resample:
+            with TemporaryDirectory() as directory:
+                resampled_path = join(directory, f"{ds_type}.csv")
+                logger.info(f"Resampling {local_path} to a frequency of {frequency}")
+                resample_csv(
+                    local_path,
+                    resampled_path,
+                    ds_type,
+                    schema,
+                    frequency,
+                    timestamp_format,
+                    aggregations=aggregations,
+                    domain=self.aws_handler.DOMAIN,
+                )
+                return self.upload_dataset(
+                    resampled_path,
+                    ds_type,
+                    schema,
+                    frequency=frequency,
+                    timestamp_format=timestamp_format,
+                    part_size=part_size,
+                    upload_workers=upload_workers,
+                    progress_callback=progress_callback,
+                    shards=shards,
+                    compress=compress,
+                    incremental=incremental,
+                )
+
         # Service names according to convention. ds_types_short is used because aws has a cap in length
         ds_name = f"{self.aws_handler.team}__{self.name}__{ds_types_short[ds_type]}"
         import_name = (
@@ -133,8 +328,12 @@ class Project:
             + str(datetime.now().timestamp()).replace(".", "_")
         )
 
-        # Determine the dataset s3_uri.
-        s3_uri = self.aws_handler.s3_uri + f"/datasets/{ds_type}.csv"
+        # Determine the dataset s3_uri. Sharded datasets are imported from a prefix.
+        extension = ".csv.gz" if (compress or gzipped) else ".csv"
+        if shards:
+            s3_uri = self.aws_handler.s3_uri + f"/datasets/{ds_type}/"
+        else:
+            s3_uri = self.aws_handler.s3_uri + f"/datasets/{ds_type}{extension}"
 
         # If the dataset doesn't exist, create it.
         if ds_name not in self._datasets.keys():
@@ -169,6 +368,7 @@ class Project:
             )
 
             logger.debug(f"Dataset group update response: {response_dsg}")
+            self._save_entities()
 
         # If the dataset exists, point to it
         else:  # pragma: no cover
@@ -199,15 +399,78 @@ class Project:
             dataset._import_name = import_name
             dataset.arn = dataset_arn
 
-        # Upload the csv to s3.
-        parsed_s3_uri = urlparse(dataset.s3_uri)
-        bucket, key = parsed_s3_uri.netloc, parsed_s3_uri.path.lstrip("/")
-        logger.info(f"Uploading dataset to s3")
-        logger.debug(f"Uploading {local_path} to key {key} in bucket {bucket}")
-        self.aws_handler.s3.upload_file(Filename=local_path, Bucket=bucket, Key=key)
+        # If the file didn't change since the last import, neither is repeated.
+        dataset.sha256 = file_sha256(local_path)
+        unchanged_dataset = self._find_unchanged_dataset(ds_type, dataset.sha256)
+        if unchanged_dataset:
+            logger.info(
+                f"The {ds_type} didn't change since its last import, it won't be uploaded again"
+            )
+            return unchanged_dataset
+
+        # Incremental imports upload only the rows after the previous import.
+        if incremental:
+            with TemporaryDirectory() as directory:
+                delta_path = self._prepare_increment(
+                    local_path, dataset, directory, compress=compress
+                )
+                if delta_path is None:
+                    logger.info(f"The {ds_type} has no rows after its last import")
+                    return self.get_dataset(ds_type)
+
+                if dataset.import_mode == Dataset.INCREMENTAL:
+                    logger.info("Uploading the new rows of the dataset to s3")
+                    upload_file(
+                        delta_path,
+                        dataset.import_s3_uri,
+                        self.aws_handler,
+                        part_size=part_size,
+                        max_workers=upload_workers,
+                        callback=progress_callback,
+                        compress=compress,
+                    )
+                    return self._import(dataset)
+
+        # Upload the csv to s3, unless it is already there.
+        if dataset.sharded:
+            self._upload_shards(
+                local_path,
+                dataset,
+                shards,
+                part_size=part_size,
+                upload_workers=upload_workers,
+                progress_callback=progress_callback,
+                compress=compress,
+            )
+        elif self._uploaded_sha256(dataset.s3_uri) == dataset.sha256:
+            logger.info("The dataset is already uploaded to s3")
+        else:
+            logger.info("Uploading dataset to s3")
+            logger.debug(f"Uploading {local_path} to {dataset.s3_uri}")
+            upload_file(
+                local_path,
+                dataset.s3_uri,
+                self.aws_handler,
+                part_size=part_size,
+                max_workers=upload_workers,
+                callback=progress_callback,
+                compress=compress and not gzipped,
+            )
+            self._tag_upload(dataset.s3_uri, dataset.sha256)
+            # The object of a previous upload with the other extension is stale.
+            if dataset.s3_uri.endswith(".gz"):
+                stale_uri = dataset.s3_uri[: -len(".gz")]
+            else:
+                stale_uri = dataset.s3_uri + ".gz"
+            delete_objects([stale_uri], self.aws_handler)
+
+        return self._import(dataset)
+
+    def _import(self, dataset: Dataset):
+        """Creates an import of the dataset's s3_uri and saves it to the project."""
 
         # Create an import.
-        logger.debug(f"Creating new import")
+        logger.debug("Creating new import")
         try:
             dataset._create_import()
         except ResourceError as e:  # pragma: no cover
@@ -218,6 +481,7 @@ class Project:
 
         # Save the import to the Project's imports.
         self.imports[dataset._import_name] = dataset.import_arn
+        self._save_entities()
 
         return dataset
 
@@ -226,15 +490,7 @@ class Project:
 
         ds_name = f"{self.aws_handler.team}__{self.name}__{ds_types_short[ds_type]}"
 
-        # sorting by import job by timestamp and ds_type
-        ds_imports = filter(
-            lambda x: x.startswith(ds_types_short[ds_type]), self.imports.keys()
-        )
-        ds_imports = sorted(
-            ds_imports, key=lambda x: float(x.split("__")[1].replace("_", "."))
-        )
-
-        import_name = ds_imports[-1] if len(ds_imports) > 0 else None
+        import_name = self._latest_import(ds_type)
         if not (ds_name in self._datasets.keys() and import_name):
             raise DatasetError(
                 f"No {ds_type} dataset was found in project {self.name}.\nTo create a new dataset, use the `upload_dataset` method"
@@ -250,16 +506,24 @@ class Project:
             DatasetArn=dataset_arn
         )
 
+        # An incremental import only has the new rows, the dataset is read from the
+        # last full import and the increments after it.
+        s3_uri = import_info["DataSource"]["S3Config"]["Path"]
+        increments = []
+        if s3_uri.startswith(self._increments_prefix(ds_type)):
+            s3_uri, increments = self._increments(ds_type)
+
         dataset = Dataset(
             dsg_arn=self.arn,
             ds_type=dataset_info["DatasetType"],
             schema=dataset_info["Schema"],
             frequency=dataset_info["DataFrequency"],
             timestamp_format=import_info.get("TimestampFormat"),
-            s3_uri=import_info["DataSource"]["S3Config"]["Path"],
+            s3_uri=s3_uri,
             aws_handler=self.aws_handler,
         )
 
+        dataset.increments = increments
         dataset._ds_name = ds_name
         dataset._import_name = import_name
         dataset.arn = dataset_arn
@@ -270,6 +534,210 @@ class Project:
         dataset.failure_reason = import_info.get("FailureReason")
         return dataset
 
+    def _latest_import(self, ds_type: str):
+        """Returns the name of the most recent import of the dataset, if there is any."""
+
+        ds_imports = self._ds_imports(ds_type)
+        return ds_imports[-1] if len(ds_imports) > 0 else None
+
+    def _ds_imports(self, ds_type: str):
+        """Returns the names of the imports of the dataset, oldest first."""
+
+        # sorting by import job by timestamp and ds_type
+        ds_imports = filter(
+            lambda x: x.startswith(ds_types_short[ds_type]), self.imports.keys()
+        )
+        return sorted(
+            ds_imports, key=lambda x: float(x.split("__")[1].replace("_", "."))
+        )
+
+    def _increments_prefix(self, ds_type: str):
+        """Returns the s3 prefix of the objects imported incrementally."""
+        return f"{self.aws_handler.s3_uri}/datasets/{ds_type}_increments/"
+
+    def _increments(self, ds_type: str):
+        """Returns the s3_uri of the last full import of the dataset and the objects
+        imported incrementally after it, oldest first. Failed imports are left out."""
+
+        increments = []
+        for import_name in reversed(self._ds_imports(ds_type)):
+            import_info = self.aws_handler.forecast.describe_dataset_import_job(
+                DatasetImportJobArn=self.imports[import_name]
+            )
+            if import_info["Status"] == "CREATE_FAILED":
+                continue
+            s3_uri = import_info["DataSource"]["S3Config"]["Path"]
+            if not s3_uri.startswith(self._increments_prefix(ds_type)):
+                return s3_uri, increments[::-1]
+            increments.append(s3_uri)
+
+        raise DatasetError(f"No full import of the {ds_type} was found")
+
+    def _high_water_mark(self, ds_type: str):
+        """Returns the latest timestamp imported so far, if the latest import recorded
+        it and didn't fail, otherwise None."""
+
+        import_name = self._latest_import(ds_type)
+        if not import_name:
+            return None
+
+        import_arn = self.imports[import_name]
+        import_info = self.aws_handler.forecast.describe_dataset_import_job(
+            DatasetImportJobArn=import_arn
+        )
+        if import_info["Status"] == "CREATE_FAILED":
+            return None
+
+        tags = self.aws_handler.forecast.list_tags_for_resource(ResourceArn=import_arn)[
+            "Tags"
+        ]
+        return next(
+            (tag["Value"] for tag in tags if tag["Key"] == HIGH_WATER_MARK_TAG), None
+        )
+
+    def _prepare_increment(
+        self, local_path: str, dataset: Dataset, directory: str, compress: bool = False
+    ):
+        """Writes the rows after the high-water mark of the latest import to directory
+        and adds a new object for them to the increments of the dataset.
+
+        Returns the path of the rows to upload, or None if there are none. Without a
+        previous high-water mark the dataset is left as a full import of the whole
+        file, local_path, and only its latest timestamp is read.
+        """
+
+        high_water_mark = self._high_water_mark(dataset.ds_type)
+        if high_water_mark is None:
+            logger.info(
+                f"No previous import of the {dataset.ds_type} recorded its latest timestamp, the whole file will be imported"
+            )
+            _, dataset.high_water_mark = delta_csv(
+                local_path, None, dataset.schema, dataset.timestamp_format
+            )
+            return local_path
+
+        delta_path = join(directory, f"{dataset.ds_type}.csv")
+        rows, dataset.high_water_mark = delta_csv(
+            local_path,
+            delta_path,
+            dataset.schema,
+            dataset.timestamp_format,
+            high_water_mark=high_water_mark,
+        )
+        if not rows:
+            return None
+
+        logger.debug(f"{rows} rows are newer than {high_water_mark}")
+        previous = self.get_dataset(dataset.ds_type)
+        extension = ".csv.gz" if compress else ".csv"
+        dataset.s3_uri = previous.s3_uri
+        dataset.increments = previous.increments + [
+            f"{self._increments_prefix(dataset.ds_type)}{dataset._import_name}{extension}"
+        ]
+        dataset.import_mode = Dataset.INCREMENTAL
+        return delta_path
+
+    def _find_unchanged_dataset(self, ds_type: str, sha256: str):
+        """Returns the dataset if its latest import was created from a file with this
+        sha256 and didn't fail, otherwise None."""
+
+        import_name = self._latest_import(ds_type)
+        if not import_name:
+            return None
+
+        tags = self.aws_handler.forecast.list_tags_for_resource(
+            ResourceArn=self.imports[import_name]
+        )["Tags"]
+        if {"Key": SHA256_TAG, "Value": sha256} not in tags:
+            return None
+
+        dataset = self.get_dataset(ds_type)
+        if dataset.status == "CREATE_FAILED":
+            return None
+
+        dataset.sha256 = sha256
+        return dataset
+
+    def _upload_shards(
+        self,
+        local_path: str,
+        dataset: Dataset,
+        shards: int,
+        part_size: int = UPLOAD_PART_SIZE,
+        upload_workers: int = UPLOAD_WORKERS,
+        progress_callback=None,
+        compress: bool = False,
+    ):
+        """Uploads the csv split in shards under the dataset's prefix and deletes the
+        shards of previous uploads, since the import would read them too."""
+
+        extension = ".csv.gz" if compress else ".csv"
+        shard_uris = [
+            f"{dataset.s3_uri}part_{i:05}_of_{shards:05}{extension}"
+            for i in range(shards)
+        ]
+        if all(self._uploaded_sha256(uri) == dataset.sha256 for uri in shard_uris):
+            logger.info("The dataset is already uploaded to s3")
+        else:
+            # The header is repeated in every shard.
+            with open(local_path, mode="rb") as local_file:
+                first_line = local_file.readline()
+            names = [
+                attribute["AttributeName"]
+                for attribute in dataset.schema.get("Attributes", [])
+            ]
+            header = first_line if is_header(first_line, names) else b""
+
+            logger.info(f"Uploading dataset to s3 in {shards} shards")
+            shard_uris = upload_shards(
+                local_path,
+                shard_uris,
+                self.aws_handler,
+                header=header,
+                part_size=part_size,
+                max_workers=upload_workers,
+                callback=progress_callback,
+                compress=compress,
+            )
+            for uri in shard_uris:
+                self._tag_upload(uri, dataset.sha256)
+
+        bucket = urlparse(dataset.s3_uri).netloc
+        stale_uris = [
+            f"s3://{bucket}/{s3_object['Key']}"
+            for s3_object in list_objects(dataset.s3_uri, self.aws_handler)
+            if f"s3://{bucket}/{s3_object['Key']}" not in shard_uris
+        ]
+        if stale_uris:
+            logger.debug(f"Deleting stale shards {stale_uris}")
+            delete_objects(stale_uris, self.aws_handler)
+
+    def _uploaded_sha256(self, s3_uri: str):
+        """Returns the sha256 tagged on the s3 object, or None if it doesn't exist."""
+        parsed_s3_uri = urlparse(s3_uri)
+        try:
+            tags = self.aws_handler.s3.get_object_tagging(
+                Bucket=parsed_s3_uri.netloc, Key=parsed_s3_uri.path.lstrip("/")
+            )["TagSet"]
+        except ClientError as e:
+            if e.response["Error"]["Code"] == "NoSuchKey":
+                return None
+            raise
+
+        for tag in tags:
+            if tag["Key"] == SHA256_TAG:
+                return tag["Value"]
+
+    def _tag_upload(self, s3_uri: str, sha256: str):
+        # Objects are tagged after they are uploaded, since resumed uploads could have
+        # been started for another version of the file.
+        parsed_s3_uri = urlparse(s3_uri)
+        self.aws_handler.s3.put_object_tagging(
+            Bucket=parsed_s3_uri.netloc,
+            Key=parsed_s3_uri.path.lstrip("/"),
+            Tagging={"TagSet": [{"Key": SHA256_TAG, "Value": sha256}]},
+        )
+
     def train_new_predictor(
         self,
         name: str,
@@ -290,20 +758,7 @@ class Project:
             PredictorName: TEAM__name
         """
 
-        name = name.replace("-", "_")
-        while "__" in name:
-            name = name.replace("__", "_")
-
-        predictor_name = f"{self.aws_handler.team}__{name}"
-
-        if predictor_name in self._predictors.keys():
-            raise PredictorError(
-                f"A predictor with the name {name} already exists for this project.\nYou can retrieve it by using the `get_predictor` method"
-            )
-
-        predictor = Predictor(
-            aws_handler=self.aws_handler,
-            dsg_arn=self.arn,
+        predictor = self._new_predictor(
             name=name,
             algorithm=algorithm,
             horizon=horizon,
@@ -318,51 +773,100 @@ class Project:
             training_parameters=training_parameters,
         )
 
-        predictor._predictor_name = predictor_name
+        logger.info("Waiting for all datasets and imports to be ready.")
+        # Wait for all datasets and dataset imports to be ready before training the predictor.
+        try:
+            wait_for_resources(self._data_resources(), self.aws_handler)
+        except ResourcesError as e:  # pragma: no cover
+            self._discard_failed_imports(e)
+            return
 
-        logger.info("Waiting for all datasets to be ready.")
-        # Wait for all datasets to be ready before training the predictor.
-        for dataset_arn in self._datasets.values():
-            try:
-                wait_for_resource("dataset", dataset_arn, self.aws_handler)
-            except ResourceError as e:  # pragma: no cover
-                logger.error(f"Error in dataset {dataset_arn}: {e}")
-                logger.error(
-                    """The predictor could not be created because some of the datasets in the project contain errors.
-                    You should re-upload the ones that failed."""
-                )
-                return
+        return self._create_predictor(predictor)
 
-        # Wait for all dataset imports to be ready before training the predictor.
-        for import_name, import_arn in self.imports.items():
-            try:
-                wait_for_resource("dataset_import_job", import_arn, self.aws_handler)
-            except ResourceError as e:  # pragma: no cover
-                logger.error(f"Error in dataset {import_arn}: {e}")
-                # Delete the import
-                self.aws_handler.forecast.delete_dataset_import_job(
-                    DatasetImportJobArn=import_arn
-                )
+    def train_predictors(
+        self,
+        variants: list,
+        metric: str = "AverageWeightedQuantileLoss",
+        max_concurrent: int = TRAINING_WORKERS,
+        timeout: float = None,
+    ):
+        """Trains several predictors concurrently and ranks them by a backtest metric.
 
-                # Delete the import from the project's imports
-                del self.imports[import_name]
+        variants is a list with the train_new_predictor arguments of each predictor.
+        At most max_concurrent predictors are trained at the same time, each one is
+        submitted as soon as another one finishes.
 
-                logger.error(
-                    """The predictor could not be created because some of the datasets in the project contain errors.
-                    You should re-upload the ones that failed."""
-                )
-                return
+        Returns a leaderboard, best first: a list with the name, algorithm, status,
+        metrics, error and predictor of each variant. A variant that can't be created,
+        trained or evaluated gets the status CREATE_FAILED, TIMED_OUT or
+        METRICS_FAILED and its error instead of stopping the others. Predictors that
+        failed or lack the metric are ranked last.
+        """
 
-        logger.info(f"Creating predictor {predictor._predictor_name}")
-        predictor.arn = predictor._create()
+        predictors = [self._new_predictor(**variant) for variant in variants]
+        predictor_names = [predictor._predictor_name for predictor in predictors]
+        if len(set(predictor_names)) != len(predictor_names):
+            raise PredictorError("The name of every predictor must be unique")
 
-        # Add predictor to the project's _predictors
-        self._predictors[predictor_name] = predictor.arn
+        logger.info("Waiting for all datasets and imports to be ready.")
+        try:
+            wait_for_resources(self._data_resources(), self.aws_handler)
+        except ResourcesError as e:  # pragma: no cover
+            self._discard_failed_imports(e)
+            return
 
-        return predictor
+        # Predictors are created from several threads, but the project's entities
+        # are updated one at a time.
+        lock = Lock()
+
+        def train(predictor):
+            entry = {
+                "name": predictor.name,
+                "algorithm": predictor.algorithm,
+                "status": "ACTIVE",
+                "metrics": {},
+                "error": None,
+                "predictor": predictor,
+            }
+            # A variant that fails doesn't stop the rest, which are still training.
+            try:
+                with lock:
+                    self._create_predictor(predictor)
+                wait_for_resource(
+                    "predictor", predictor.arn, self.aws_handler, timeout=timeout
+                )
+            except ResourceTimeoutError as e:
+                entry["status"], entry["error"] = "TIMED_OUT", str(e)
+                return entry
+            except Exception as e:
+                logger.error(f"Predictor {predictor.name} could not be trained: {e}")
+                entry["status"], entry["error"] = "CREATE_FAILED", str(e)
+                return entry
 
-    def get_predictor(self, name: str):
-        """Returns a predictor object by retrieving information from an existing predictor in aws."""
+            try:
+                entry["metrics"] = predictor.accuracy_metrics()
+            except Exception as e:
+                logger.error(f"The metrics of predictor {predictor.name} failed: {e}")
+                entry["status"], entry["error"] = "METRICS_FAILED", str(e)
+                return entry
+            entry["algorithm"] = predictor.algorithm
+            logger.info(f"Predictor {predictor.name} trained: {entry['metrics']}")
+            return entry
+
+        with ThreadPoolExecutor(max_workers=max_concurrent) as executor:
+            leaderboard = list(executor.map(train, predictors))
+
+        return sorted(
+            leaderboard,
+            key=lambda entry: (
+                (0, entry["metrics"][metric])
+                if entry["metrics"].get(metric) is not None
+                else (1, 0)
+            ),
+        )
+
+    def _new_predictor(self, name: str, **kwargs):
+        """Returns a Predictor that is yet to be created, validating its name."""
 
         name = name.replace("-", "_")
         while "__" in name:
@@ -370,20 +874,65 @@ class Project:
 
         predictor_name = f"{self.aws_handler.team}__{name}"
 
-        logger.debug(f"Attempting to retrieve predictor {predictor_name}")
-        if predictor_name not in self._predictors.keys():
+        if predictor_name in self._predictors.keys():
             raise PredictorError(
-                f"No predictor with the name {name} was found in project {self.name}.\nTo create a new predictor, use the `train_new_predictor` method"
+                f"A predictor with the name {name} already exists for this project.\nYou can retrieve it by using the `get_predictor` method"
             )
 
-        predictor_arn = self._predictors[predictor_name]
+        predictor = Predictor(
+            aws_handler=self.aws_handler, dsg_arn=self.arn, name=name, **kwargs
+        )
 
-        # Wait for the predictor to be active so that predictor_info is accurate.
-        wait_for_resource("predictor", predictor_arn, self.aws_handler)
+        predictor._predictor_name = predictor_name
+        return predictor
 
-        predictor_info = self.aws_handler.forecast.describe_predictor(
-            PredictorArn=predictor_arn
+    def _data_resources(self):
+        """Returns the datasets and imports that must be ACTIVE before training."""
+        return [("dataset", dataset_arn) for dataset_arn in self._datasets.values()] + [
+            ("dataset_import_job", import_arn) for import_arn in self.imports.values()
+        ]
+
+    def _discard_failed_imports(self, e: ResourcesError):
+        logger.error(f"Error in {e.failed_arn}: {e}")
+        for import_name, import_arn in list(self.imports.items()):
+            if e.outcomes.get(import_arn) != "CREATE_FAILED":
+                continue
+            # Delete the import
+            self.aws_handler.forecast.delete_dataset_import_job(
+                DatasetImportJobArn=import_arn
+            )
+
+            # Delete the import from the project's imports
+            del self.imports[import_name]
+            self._save_entities()
+
+        logger.error(
+            """The predictor could not be created because some of the datasets in the project contain errors.
+            You should re-upload the ones that failed."""
         )
+
+    def _create_predictor(self, predictor: Predictor):
+        logger.info(f"Creating predictor {predictor._predictor_name}")
+        predictor.arn = predictor._create()
+
+        # Add predictor to the project's _predictors
+        self._predictors[predictor._predictor_name] = predictor.arn
+        self._save_entities()
+
+        return predictor
+
+    def get_predictor(self, name: str):
+        """Returns a predictor object by retrieving information from an existing predictor in aws."""
+
+        name, predictor_name, predictor_arn = self._find_predictor(name)
+
+        predictor_info = _describe_predictor(self.aws_handler, self.arn, predictor_arn)
+        if predictor_info["Status"] != "ACTIVE":
+            # Wait for the predictor to be active so that predictor_info is accurate.
+            wait_for_resource("predictor", predictor_arn, self.aws_handler)
+            predictor_info = _describe_predictor(
+                self.aws_handler, self.arn, predictor_arn
+            )
         # TODO: this doesn't work when autoML was used with the predictor. AlgorithmArn is not a valid key.
         # This is mocked until AWS fixes this issue.
         try:
@@ -421,38 +970,91 @@ class Project:
 
         return predictor
 
-    def _dataset_groups(self):
-        return {
-            dataset_group["DatasetGroupName"]: dataset_group["DatasetGroupArn"]
-            for dataset_group in self.aws_handler.forecast.list_dataset_groups()[
-                "DatasetGroups"
-            ]
-        }
+    def _find_predictor(self, name: str):
+        """Returns the normalized name, service name and arn of an existing predictor."""
+
+        name = name.replace("-", "_")
+        while "__" in name:
+            name = name.replace("__", "_")
+
+        predictor_name = f"{self.aws_handler.team}__{name}"
+
+        logger.debug(f"Attempting to retrieve predictor {predictor_name}")
+        if predictor_name not in self._predictors.keys():
+            raise PredictorError(
+                f"No predictor with the name {name} was found in project {self.name}.\nTo create a new predictor, use the `train_new_predictor` method"
+            )
+
+        return name, predictor_name, self._predictors[predictor_name]
+
+    def _find_dataset_group(self):
+        """Returns the arn of the project's dataset group, or None if it doesn't exist."""
+        cache = self.aws_handler.cache
+        dsg_arn = cache and cache.get(self._dsg_name, "dataset_group", self._dsg_name)
+        if dsg_arn:
+            return dsg_arn
+
+        for dataset_group in paginate(
+            self.aws_handler.forecast, "list_dataset_groups", "DatasetGroups"
+        ):
+            if dataset_group["DatasetGroupName"] == self._dsg_name:
+                if cache:
+                    cache.set(
+                        self._dsg_name,
+                        "dataset_group",
+                        self._dsg_name,
+                        dataset_group["DatasetGroupArn"],
+                    )
+                return dataset_group["DatasetGroupArn"]
 
     def _get_entities(self):
-        datasets = {
-            dataset_arn.split("/")[-1]: dataset_arn
-            for dataset_arn in self.aws_handler.forecast.describe_dataset_group(
-                DatasetGroupArn=self.arn
-            )["DatasetArns"]
-        }
+        """Retrieves the project's datasets, imports and predictors concurrently.
 
-        imports = {
+        Import jobs and predictors are filtered by the service instead of listing the
+        ones of the whole account.
+        """
+        with ThreadPoolExecutor(max_workers=ENTITY_WORKERS) as executor:
+            predictors = executor.submit(self._list_predictors)
+
+            datasets = {
+                dataset_arn.split("/")[-1]: dataset_arn
+                for dataset_arn in self.aws_handler.forecast.describe_dataset_group(
+                    DatasetGroupArn=self.arn
+                )["DatasetArns"]
+            }
+
+            imports = {}
+            for dataset_imports in executor.map(self._list_imports, datasets.values()):
+                imports.update(dataset_imports)
+
+            return datasets, imports, predictors.result()
+
+    def _list_imports(self, dataset_arn):
+        return {
             import_job["DatasetImportJobName"]: import_job["DatasetImportJobArn"]
-            for import_job in self.aws_handler.forecast.list_dataset_import_jobs()[
-                "DatasetImportJobs"
-            ]
-            if import_job["DatasetImportJobArn"].split("/")[-2] in datasets.keys()
+            for import_job in paginate(
+                self.aws_handler.forecast,
+                "list_dataset_import_jobs",
+                "DatasetImportJobs",
+                Filters=[
+                    {"Key": "DatasetArn", "Value": dataset_arn, "Condition": "IS"}
+                ],
+            )
         }
 
-        predictors = {
+    def _list_predictors(self):
+        return {
             predictor["PredictorName"]: predictor["PredictorArn"]
-            for predictor in self.aws_handler.forecast.list_predictors()["Predictors"]
-            if predictor["DatasetGroupArn"] == self.arn
+            for predictor in paginate(
+                self.aws_handler.forecast,
+                "list_predictors",
+                "Predictors",
+                Filters=[
+                    {"Key": "DatasetGroupArn", "Value": self.arn, "Condition": "IS"}
+                ],
+            )
         }
 
-        return datasets, imports, predictors
-
     def predictors(self):
         predictors = []
         for name in self._predictors.keys():
@@ -0,0 +1,128 @@
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from threading import Lock
+
+from sibila.errors import PredictorError
+from sibila.utils import logger, QUERY_WORKERS
+
+# Lookups whose results are kept, the least recently used ones are dropped first.
+QUERY_CACHE_SIZE = 4096
+
+
+class ForecastQuery:
+    """Item level lookups of a forecast through the forecastquery API.
+
+    Each lookup is a single QueryForecast call, so a few items are answered in well
+    under a second instead of waiting for an export of every series. Lookups run
+    max_workers at a time on a forecastquery client with as many pooled connections,
+    which are kept alive. Results are kept in an LRU cache of cache_size lookups, and a
+    lookup that is already in flight is shared instead of being sent twice. Build one
+    with Predictor.query().
+    """
+
+    def __init__(
+        self,
+        forecast_arn: str,
+        aws_handler: "AWSHandler",
+        max_workers: int = QUERY_WORKERS,
+        cache_size: int = QUERY_CACHE_SIZE,
+    ):
+        self.forecast_arn = forecast_arn
+        self.aws_handler = aws_handler
+        self.cache_size = cache_size
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+        # The handler's client pools QUERY_WORKERS connections, more workers would
+        # wait for one, so they get a client of their own.
+        if max_workers > QUERY_WORKERS:
+            self._client = aws_handler.client(
+                "forecastquery", max_pool_connections=max_workers
+            )
+        else:
+            self._client = aws_handler.forecastquery
+        self._lock = Lock()
+        self._cache = OrderedDict()
+        self._in_flight = {}
+
+    def forecast(self, item_id: str, start: str = None, end: str = None, **dimensions):
+        """Returns the forecast of an item as a list of rows sorted by date, like
+        ForecastStore.forecast.
+
+        dimensions filter the series by forecast dimension, and must be given for
+        predictors that have them. start and end are passed to the service as the
+        StartDate and EndDate of the query, in yyyy-MM-ddTHH:mm:ss format.
+        """
+        return self.submit(item_id, start, end, **dimensions).result()
+
+    def forecasts(
+        self, item_ids: list, start: str = None, end: str = None, **dimensions
+    ):
+        """Returns the forecasts of several items concurrently, as a dict of rows by
+        item_id."""
+        futures = {
+            item_id: self.submit(item_id, start, end, **dimensions)
+            for item_id in item_ids
+        }
+        return {item_id: future.result() for item_id, future in futures.items()}
+
+    def submit(self, item_id: str, start: str = None, end: str = None, **dimensions):
+        """Starts looking up an item and returns a concurrent.futures.Future of its
+        rows. asyncio code can await it with asyncio.wrap_future."""
+        key = (item_id, start, end, tuple(sorted(dimensions.items())))
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                future = Future()
+                future.set_result(self._cache[key])
+                return future
+            if key in self._in_flight:
+                return self._in_flight[key]
+
+            future = self._executor.submit(self._query, item_id, start, end, dimensions)
+            self._in_flight[key] = future
+        future.add_done_callback(lambda done: self._store(key, done))
+        return future
+
+    def _store(self, key: tuple, future: Future):
+        # Failed lookups aren't cached, so they are retried on the next call.
+        with self._lock:
+            self._in_flight.pop(key, None)
+            if future.cancelled() or future.exception() or not self.cache_size:
+                return
+            self._cache[key] = future.result()
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def _query(self, item_id: str, start: str, end: str, dimensions: dict):
+        request = {
+            "ForecastArn": self.forecast_arn,
+            "Filters": {"item_id": item_id, **dimensions},
+        }
+        if start is not None:
+            request["StartDate"] = start
+        if end is not None:
+            request["EndDate"] = end
+
+        logger.debug(f"Querying the forecast of {request['Filters']}")
+        predictions = self._client.query_forecast(**request)["Forecast"]["Predictions"]
+        if not predictions:
+            raise PredictorError(f"There is no forecast for {request['Filters']}")
+
+        # Predictions are a list of values by date for each quantile.
+        rows = {}
+        for quantile, values in predictions.items():
+            for value in values:
+                row = rows.setdefault(
+                    value["Timestamp"],
+                    {"item_id": item_id, **dimensions, "date": value["Timestamp"]},
+                )
+                row[quantile] = value["Value"]
+        return [rows[date] for date in sorted(rows)]
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
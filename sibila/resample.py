@@ -0,0 +1,226 @@
+import os
+import gzip
+import zlib
+from tempfile import TemporaryDirectory
+
+from sibila.errors import DatasetError
+from sibila.dataset import SCHEMA_DTYPES
+from sibila.utils import (
+    AWSHandler,
+    java_to_strftime,
+    is_header,
+    _import_pandas,
+    logger,
+)
+from sibila.validation import TARGET_FIELDS, FREQUENCY_MINUTES
+
+AGGREGATIONS = ("sum", "mean", "last")
+# Rows parsed at a time from the source file.
+RESAMPLE_CHUNK_ROWS = 1000000
+# Bytes of source file that go to each partition, so that every partition fits in
+# memory once aggregated.
+RESAMPLE_PARTITION_SIZE = 256 * 1024 * 1024
+# Compressed bytes decompressed to estimate the size of a .csv.gz once decompressed.
+_GZIP_RATIO_SAMPLE_SIZE = 1024 * 1024
+
+# Columns of the partial aggregates written to the partitions.
+_COUNT = "__count_{}"
+_LAST_TIMESTAMP = "__last_timestamp"
+# Pandas periods of the frequencies longer than a day.
+_PERIODS = {"W": "W", "M": "M", "Y": "Y"}
+
+
+def resample_csv(
+    local_path: str,
+    destination_path: str,
+    ds_type: str,
+    schema: dict,
+    frequency: str,
+    timestamp_format: str,
+    aggregations: dict = None,
+    domain: str = AWSHandler.DOMAIN,
+    chunk_rows: int = RESAMPLE_CHUNK_ROWS,
+    partitions: int = None,
+):
+    """Aggregates a time series csv to frequency, per item and forecast dimension.
+
+    Rows are grouped by every string attribute and the period of frequency their
+    timestamp falls in. aggregations maps numeric attributes to "sum", "mean" or
+    "last", by default the target is summed and the rest are averaged. Means of
+    integer attributes are rounded.
+
+    The file is read in chunks of chunk_rows rows, each chunk is aggregated and
+    hashed by item to a partition on disk, and partitions are aggregated one at a
+    time, so memory is bounded by the size of a partition and not of the file.
+    Returns the amount of rows written.
+    """
+    pandas = _import_pandas()
+
+    if ds_type not in ("TARGET_TIME_SERIES", "RELATED_TIME_SERIES"):
+        raise DatasetError("Only time series datasets can be resampled")
+
+    attributes = schema["Attributes"]
+    names = [attribute["AttributeName"] for attribute in attributes]
+    types = {
+        attribute["AttributeName"]: attribute["AttributeType"]
+        for attribute in attributes
+    }
+    timestamp = next((name for name in names if types[name] == "timestamp"), None)
+    if timestamp is None:
+        raise DatasetError("The schema has no timestamp attribute to resample by")
+    keys = [name for name in names if types[name] in ("string", "geolocation")]
+    values = [name for name in names if types[name] in ("integer", "float")]
+
+    target = TARGET_FIELDS.get(domain) if ds_type == "TARGET_TIME_SERIES" else None
+    aggregations = dict(
+        {name: "sum" if name == target else "mean" for name in values},
+        **(aggregations or {}),
+    )
+    for name, aggregation in aggregations.items():
+        if name not in values or aggregation not in AGGREGATIONS:
+            raise DatasetError(
+                f"{name} can't be aggregated with {aggregation}. Numeric attributes can be aggregated with {AGGREGATIONS}"
+            )
+
+    gzipped = local_path.endswith(".gz")
+    with open(local_path, mode="rb") as local_file:
+        has_header = is_header(_first_line(local_file, gzipped), names)
+    size = _uncompressed_size(local_path) if gzipped else os.path.getsize(local_path)
+    partitions = partitions or max(-(-size // RESAMPLE_PARTITION_SIZE), 1)
+    strftime_format = java_to_strftime(timestamp_format)
+
+    with TemporaryDirectory() as directory:
+        partition_paths = [
+            os.path.join(directory, f"partition_{i}.csv") for i in range(partitions)
+        ]
+        partial_columns = None
+
+        reader = pandas.read_csv(
+            local_path,
+            names=names,
+            header=0 if has_header else None,
+            dtype={
+                name: SCHEMA_DTYPES.get(types[name], "object")
+                for name in names
+                if name != timestamp
+            },
+            chunksize=chunk_rows,
+        )
+        with reader:
+            for chunk in reader:
+                chunk[timestamp] = pandas.to_datetime(
+                    chunk[timestamp], format=strftime_format
+                )
+                partial = _aggregate(
+                    pandas, chunk, timestamp, keys, aggregations, frequency
+                )
+                partial_columns = list(partial.columns)
+
+                # Every row of an item goes to the same partition.
+                partition = (
+                    pandas.util.hash_pandas_object(partial[keys], index=False)
+                    % partitions
+                    if keys
+                    else pandas.Series(0, index=partial.index)
+                )
+                for i, rows in partial.groupby(partition.to_numpy()):
+                    rows.to_csv(
+                        partition_paths[i],
+                        mode="a",
+                        header=False,
+                        index=False,
+                        date_format="%Y-%m-%d %H:%M:%S.%f",
+                    )
+
+        written = 0
+        with open(destination_path, mode="w") as destination:
+            if has_header:
+                destination.write(",".join(names) + "\n")
+
+            for partition_path in partition_paths:
+                if not os.path.exists(partition_path):
+                    continue
+                partial = pandas.read_csv(
+                    partition_path,
+                    names=partial_columns,
+                    dtype={key: "object" for key in keys},
+                    keep_default_na=False,
+                    na_values={name: [""] for name in partial_columns},
+                    parse_dates=[timestamp, _LAST_TIMESTAMP],
+                )
+                result = _merge(pandas, partial, timestamp, keys, aggregations)
+                result[timestamp] = result[timestamp].dt.strftime(strftime_format)
+                for name in values:
+                    if types[name] == "integer":
+                        result[name] = result[name].round().astype("Int64")
+                result[names].to_csv(destination, header=False, index=False)
+                written += len(result)
+
+    logger.info(f"Resampled {local_path} to {written} rows of frequency {frequency}")
+    return written
+
+
+def _first_line(local_file, gzipped: bool):
+    if gzipped:
+        local_file = gzip.GzipFile(fileobj=local_file)
+    return local_file.readline()
+
+
+def _uncompressed_size(local_path: str):
+    """Estimates the size of a .csv.gz once decompressed, from the compression ratio
+    of its first bytes."""
+    with open(local_path, mode="rb") as local_file:
+        sample = local_file.read(_GZIP_RATIO_SAMPLE_SIZE)
+    decompressor = zlib.decompressobj(31)
+    data = decompressor.decompress(sample)
+    # Only the first member is decompressed, the bytes after it aren't counted.
+    consumed = len(sample) - len(decompressor.unused_data)
+    return os.path.getsize(local_path) * len(data) // max(consumed, 1)
+
+
+def _period_start(pandas, timestamps, frequency: str):
+    """Returns the start of the period of frequency of every timestamp."""
+    if frequency in FREQUENCY_MINUTES:
+        return timestamps.dt.floor(
+            pandas.Timedelta(minutes=FREQUENCY_MINUTES[frequency])
+        )
+    if frequency in _PERIODS:
+        return timestamps.dt.to_period(_PERIODS[frequency]).dt.start_time
+    return timestamps.dt.normalize()
+
+
+def _aggregate(
+    pandas, chunk, timestamp: str, keys: list, aggregations: dict, frequency
+):
+    """Returns the partial aggregates of a chunk, which can be merged with _merge."""
+    chunk[_LAST_TIMESTAMP] = chunk[timestamp]
+    chunk[timestamp] = _period_start(pandas, chunk[timestamp], frequency)
+    # Rows are sorted by time so that last is the latest value of each period.
+    chunk = chunk.sort_values(_LAST_TIMESTAMP, kind="mergesort")
+
+    groups = chunk.groupby(keys + [timestamp], sort=False, dropna=False)
+    partial = groups[_LAST_TIMESTAMP].max().to_frame()
+    for name, aggregation in aggregations.items():
+        if aggregation == "last":
+            partial[name] = groups[name].last()
+        else:
+            partial[name] = groups[name].sum(min_count=1)
+        if aggregation == "mean":
+            partial[_COUNT.format(name)] = groups[name].count()
+    return partial.reset_index()
+
+
+def _merge(pandas, partial, timestamp: str, keys: list, aggregations: dict):
+    """Merges the partial aggregates of several chunks into the final values."""
+    partial = partial.sort_values(_LAST_TIMESTAMP, kind="mergesort")
+    groups = partial.groupby(keys + [timestamp], sort=True, dropna=False)
+
+    result = pandas.DataFrame(index=groups.size().index)
+    for name, aggregation in aggregations.items():
+        if aggregation == "last":
+            result[name] = groups[name].last()
+        else:
+            result[name] = groups[name].sum(min_count=1)
+        if aggregation == "mean":
+            result[name] = result[name] / groups[_COUNT.format(name)].sum()
+    return result.reset_index()
@@ -0,0 +1,242 @@
+import re
+import csv
+import gzip
+import random
+from datetime import datetime, timedelta
+from collections import Counter, namedtuple
+
+from sibila.errors import DatasetError
+from sibila.utils import java_to_strftime, _FileRange, logger
+from sibila.validation import TARGET_FIELDS
+
+# Bytes read from the start of the file, plus SCHEMA_SAMPLES ranges of
+# SCHEMA_SAMPLE_RANGE bytes at random offsets of the rest of it.
+SCHEMA_SAMPLE_SIZE = 4 * 1024 * 1024
+SCHEMA_SAMPLES = 8
+SCHEMA_SAMPLE_RANGE = 256 * 1024
+
+# Timestamp formats that Forecast accepts, with the values they match.
+TIMESTAMP_FORMATS = [
+    ("yyyy-MM-dd HH:mm:ss", re.compile(r"\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}$")),
+    ("yyyy-MM-dd'T'HH:mm:ss", re.compile(r"\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}$")),
+    ("yyyy-MM-dd", re.compile(r"\d{4}-\d{2}-\d{2}$")),
+]
+_INTEGER = re.compile(r"[-+]?\d+$")
+_FLOAT = re.compile(r"[-+]?(\d+\.?\d*|\.\d+)([eE][-+]?\d+)?$")
+_NAME = re.compile(r"[A-Za-z_][A-Za-z0-9_]*$")
+
+# Frequencies with a fixed period, from the longest to the shortest.
+FREQUENCY_PERIODS = [
+    ("W", timedelta(weeks=1)),
+    ("D", timedelta(days=1)),
+    ("H", timedelta(hours=1)),
+    ("30min", timedelta(minutes=30)),
+    ("15min", timedelta(minutes=15)),
+    ("10min", timedelta(minutes=10)),
+    ("5min", timedelta(minutes=5)),
+    ("1min", timedelta(minutes=1)),
+]
+
+InferredSchema = namedtuple(
+    "InferredSchema", ["schema", "frequency", "timestamp_format"]
+)
+
+
+def infer_schema(
+    local_path: str,
+    ds_type: str,
+    sample_size: int = SCHEMA_SAMPLE_SIZE,
+    samples: int = SCHEMA_SAMPLES,
+):
+    """Infers the schema, frequency and timestamp format of a local .csv or .csv.gz.
+
+    Only a bounded sample of the file is read, its first sample_size bytes and a few
+    ranges at random offsets, so it takes the same time for any size of file. Without
+    a header the columns are named after the fields Forecast expects for the ds_type.
+    Returns an InferredSchema, whose fields can be passed to Project.upload_dataset.
+    frequency and timestamp_format are None if the file has no timestamps.
+    """
+    rows = _sample_rows(local_path, sample_size, samples)
+    if not rows:
+        raise DatasetError(f"{local_path} has no rows to infer a schema from")
+
+    width = len(rows[0])
+    types = [
+        _column_type([row[i] for row in rows[1:] if len(row) == width])
+        for i in range(width)
+    ]
+
+    # The first row is a header if its values don't have the type of their column,
+    # or if every column is a string and it looks like a list of names.
+    first_types = [_column_type([value]) for value in rows[0]]
+    if any(first != "string" for first in first_types):
+        has_header = False
+    elif any(column_type != "string" for column_type in types):
+        has_header = True
+    else:
+        has_header = all(_NAME.match(value) for value in rows[0])
+
+    if has_header:
+        names = [value.strip() for value in rows[0]]
+        rows = rows[1:]
+    else:
+        types = [
+            _column_type([row[i] for row in rows if len(row) == width])
+            for i in range(width)
+        ]
+        names = _default_names(types, ds_type)
+    types = _key_types(names, types, ds_type)
+
+    timestamp_format = frequency = None
+    if "timestamp" in types:
+        column = types.index("timestamp")
+        timestamp_format = _timestamp_format(
+            [row[column] for row in rows if len(row) == width]
+        )
+        item_column = names.index("item_id") if "item_id" in names else None
+        if timestamp_format:
+            frequency = _frequency(rows, column, item_column, timestamp_format)
+
+    schema = {
+        "Attributes": [
+            {"AttributeName": name, "AttributeType": attribute_type}
+            for name, attribute_type in zip(names, types)
+        ]
+    }
+    logger.debug(
+        f"Inferred schema {schema} with frequency {frequency} and timestamp format {timestamp_format} from {len(rows)} rows"
+    )
+    return InferredSchema(schema, frequency, timestamp_format)
+
+
+def _sample_rows(local_path: str, sample_size: int, samples: int):
+    """Returns the parsed rows of the start of the file and of a few random ranges."""
+    if local_path.endswith(".gz"):
+        # Compressed files can only be read from the start. GzipFile goes on through
+        # every gzip member, so the head is only short if the file is.
+        with gzip.open(local_path, mode="rb") as local_file:
+            chunks = [local_file.read(sample_size)]
+    else:
+        source = _FileRange(local_path)
+        chunks = [source.read(0, sample_size)]
+        if source.size > sample_size + SCHEMA_SAMPLE_RANGE:
+            # A fixed seed infers the same schema every time.
+            generator = random.Random(0)
+            for _ in range(samples):
+                offset = generator.randrange(
+                    sample_size, source.size - SCHEMA_SAMPLE_RANGE
+                )
+                # Ranges start and end at a line boundary.
+                chunk = source.read(offset, SCHEMA_SAMPLE_RANGE)
+                chunks.append(chunk[chunk.find(b"\n") + 1 :])
+
+    rows = []
+    for i, chunk in enumerate(chunks):
+        # The last line of a chunk may be cut, unless the chunk is the whole file.
+        if len(chunk) >= (sample_size if i == 0 else 1):
+            chunk = chunk[: chunk.rfind(b"\n") + 1]
+        lines = chunk.decode("utf-8", "replace").splitlines()
+        rows.extend(row for row in csv.reader(lines) if row)
+    return rows
+
+
+def _value_type(value: str):
+    if _INTEGER.match(value):
+        return "integer"
+    if _FLOAT.match(value):
+        return "float"
+    if any(pattern.match(value) for _, pattern in TIMESTAMP_FORMATS):
+        return "timestamp"
+    return "string"
+
+
+def _column_type(values):
+    """Returns the narrowest attribute type of every non empty value."""
+    types = {_value_type(value.strip()) for value in values if value.strip()}
+    if types <= {"integer"} and types:
+        return "integer"
+    if types <= {"integer", "float"} and types:
+        return "float"
+    if types == {"timestamp"}:
+        return "timestamp"
+    return "string"
+
+
+def _default_names(types: list, ds_type: str):
+    """Names the columns of a file without header after the fields Forecast expects.
+
+    item_id is the first column besides the timestamp, whatever its values look
+    like, and the target of a time series the last numeric column after it.
+    """
+    names = [f"attribute_{i}" for i in range(len(types))]
+    timestamp = types.index("timestamp") if "timestamp" in types else None
+    if timestamp is not None:
+        names[timestamp] = "timestamp"
+    item = next((i for i in range(len(types)) if i != timestamp), None)
+    if item is not None:
+        names[item] = "item_id"
+    numeric = [
+        i for i, t in enumerate(types) if t in ("integer", "float") and i != item
+    ]
+    if ds_type == "TARGET_TIME_SERIES" and numeric:
+        names[numeric[-1]] = "target_value"
+    return names
+
+
+def _key_types(names: list, types: list, ds_type: str):
+    """Types item_id and the forecast dimensions as strings, as Forecast requires
+    for keys, even if their values are numbers. The dimensions are only known in a
+    target time series: every column besides the timestamp and the target."""
+    keys = {"item_id"}
+    targets = set(TARGET_FIELDS.values())
+    if ds_type == "TARGET_TIME_SERIES" and targets & set(names):
+        keys.update(
+            name
+            for name, column_type in zip(names, types)
+            if name not in targets and column_type != "timestamp"
+        )
+    return [
+        "string" if name in keys else column_type
+        for name, column_type in zip(names, types)
+    ]
+
+
+def _timestamp_format(values):
+    """Returns the first format that matches every value."""
+    values = [value.strip() for value in values if value.strip()]
+    for timestamp_format, pattern in TIMESTAMP_FORMATS:
+        if all(pattern.match(value) for value in values):
+            return timestamp_format
+
+
+def _frequency(rows, column: int, item_column: int, timestamp_format: str):
+    """Returns the frequency of the most common gap between timestamps of an item."""
+    strftime_format = java_to_strftime(timestamp_format)
+    series = {}
+    for row in rows:
+        try:
+            timestamp = datetime.strptime(row[column].strip(), strftime_format)
+        except (ValueError, IndexError):
+            continue
+        item = row[item_column] if item_column is not None else None
+        series.setdefault(item, set()).add(timestamp)
+
+    gaps = Counter()
+    for timestamps in series.values():
+        timestamps = sorted(timestamps)
+        gaps.update(
+            later - earlier for earlier, later in zip(timestamps, timestamps[1:])
+        )
+    if not gaps:
+        return None
+
+    gap = gaps.most_common(1)[0][0]
+    if timedelta(days=365) <= gap <= timedelta(days=366):
+        return "Y"
+    if timedelta(days=28) <= gap <= timedelta(days=31):
+        return "M"
+    # Otherwise the longest frequency whose period fits evenly in the gap.
+    for frequency, period in FREQUENCY_PERIODS:
+        if gap % period == timedelta(0):
+            return frequency
+    return None
@@ -0,0 +1,197 @@
+import io
+import re
+import csv
+import sqlite3
+from os import remove, replace
+from os.path import exists
+from threading import Lock
+from urllib.parse import urlparse
+
+from sibila.errors import PredictorError
+from sibila.utils import (
+    list_objects,
+    _iter_csv_chunks,
+    _ChunkStream,
+    logger,
+    DOWNLOAD_WORKERS,
+    DOWNLOAD_CHUNK_SIZE,
+)
+
+# Rows inserted at a time when a store is built.
+STORE_BATCH_ROWS = 10000
+# Columns of an export that hold forecasts, every other one identifies a series.
+_VALUE_COLUMN = re.compile(r"^(p[0-9.]+|mean)$")
+_DATE_COLUMN = "date"
+
+
+class ForecastStore:
+    """Local store of a forecast export, indexed by item_id, dimensions and date.
+
+    The rows are kept in a SQLite table clustered by its primary key, so looking up
+    an item is a B-tree search instead of a scan of the whole export, and the store
+    is opened read only so every worker of a server shares it through the page cache
+    instead of loading the csv. Build one with from_csv or from_s3, or with
+    Predictor.forecast(file_format=Predictor.SQLITE).
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = Lock()
+        self._connection = sqlite3.connect(
+            f"file:{path}?mode=ro", uri=True, check_same_thread=False
+        )
+        columns = self._connection.execute("PRAGMA table_info(forecasts)").fetchall()
+        if not columns:
+            raise PredictorError(f"{path} is not a forecast store")
+
+        # Rows of table_info are (cid, name, type, notnull, default, pk).
+        self.columns = [column[1] for column in columns]
+        self.dimensions = [
+            column[1]
+            for column in sorted(columns, key=lambda column: column[5])
+            if column[5] and column[1] not in ("item_id", _DATE_COLUMN)
+        ]
+
+    @classmethod
+    def from_csv(cls, csv_path: str, path: str):
+        """Builds a store at path from a merged csv export."""
+        with open(csv_path, newline="") as csv_file:
+            _build(csv_file, path)
+        return cls(path)
+
+    @classmethod
+    def from_s3(
+        cls,
+        s3_uri: str,
+        path: str,
+        aws_handler: "AWSHandler",
+        max_workers: int = DOWNLOAD_WORKERS,
+    ):
+        """Builds a store at path streaming the csv parts of an export, which are
+        never written to disk."""
+        bucket = urlparse(s3_uri).netloc
+        objects = list_objects(s3_uri, aws_handler, suffix=".csv")
+        stream = io.BufferedReader(
+            _ChunkStream(
+                data
+                for _, data in _iter_csv_chunks(
+                    bucket, objects, aws_handler, max_workers=max_workers
+                )
+            ),
+            buffer_size=DOWNLOAD_CHUNK_SIZE,
+        )
+        with io.TextIOWrapper(stream, encoding="utf-8", newline="") as csv_file:
+            _build(csv_file, path)
+        return cls(path)
+
+    def forecast(self, item_id: str, start: str = None, end: str = None, **dimensions):
+        """Returns the forecast of an item as a list of rows, sorted by dimensions and
+        date, optionally only of the given dimension values.
+
+        start and end filter the dates, start included and end excluded. They are
+        compared as text, so "2021-01-02" includes every row of that day as start and
+        excludes them as end.
+        """
+        unknown = set(dimensions) - set(self.dimensions)
+        if unknown:
+            raise PredictorError(
+                f"Unknown dimensions {sorted(unknown)}, valid dimensions are {self.dimensions}"
+            )
+
+        query = "SELECT * FROM forecasts WHERE item_id = ?"
+        params = [item_id]
+        for name in self.dimensions:
+            if name in dimensions:
+                query += f' AND "{name}" = ?'
+                params.append(dimensions[name])
+        if start is not None:
+            query += " AND date >= ?"
+            params.append(start)
+        if end is not None:
+            query += " AND date < ?"
+            params.append(end)
+
+        with self._lock:
+            rows = self._connection.execute(
+                query + f" ORDER BY {_order(self.dimensions)}", params
+            ).fetchall()
+        return [dict(zip(self.columns, row)) for row in rows]
+
+    def close(self):
+        self._connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def _order(dimensions: list):
+    return ", ".join([f'"{name}"' for name in dimensions] + [_DATE_COLUMN])
+
+
+def _build(csv_file, path: str):
+    """Loads the rows of a csv export into a new store at path.
+
+    The store is built next to path and moved there at the end, so that readers of a
+    previous version never see it half written.
+    """
+    reader = csv.reader(csv_file)
+    header = next(reader, None)
+    if not header or "item_id" not in header or _DATE_COLUMN not in header:
+        raise PredictorError("The forecast export has no item_id and date columns")
+    if any('"' in name for name in header):
+        raise PredictorError(f"Invalid column names {header}")
+
+    values = [name for name in header if _VALUE_COLUMN.match(name)]
+    keys = [
+        name
+        for name in header
+        if name not in values and name not in ("item_id", _DATE_COLUMN)
+    ]
+    primary_key = ", ".join(f'"{name}"' for name in ["item_id"] + keys + [_DATE_COLUMN])
+
+    building_path = path + ".building"
+    if exists(building_path):
+        remove(building_path)
+    connection = sqlite3.connect(building_path, isolation_level=None)
+    try:
+        # Nothing is lost if the build is interrupted, it is started again.
+        connection.execute("PRAGMA journal_mode = OFF")
+        connection.execute("PRAGMA synchronous = OFF")
+        connection.execute(
+            "CREATE TABLE forecasts ("
+            + ", ".join(
+                f'"{name}" REAL' if name in values else f'"{name}" TEXT NOT NULL'
+                for name in header
+            )
+            + f", PRIMARY KEY ({primary_key})) WITHOUT ROWID"
+        )
+
+        insert = (
+            f"INSERT OR REPLACE INTO forecasts VALUES ({', '.join('?' * len(header))})"
+        )
+        value_indexes = [header.index(name) for name in values]
+        rows = 0
+        batch = []
+        connection.execute("BEGIN")
+        for row in reader:
+            if not row:
+                continue
+            # Missing forecasts are stored as NULL.
+            for i in value_indexes:
+                if row[i] == "":
+                    row[i] = None
+            batch.append(row)
+            if len(batch) >= STORE_BATCH_ROWS:
+                connection.executemany(insert, batch)
+                rows, batch = rows + len(batch), []
+        connection.executemany(insert, batch)
+        rows += len(batch)
+        connection.execute("COMMIT")
+    finally:
+        connection.close()
+
+    replace(building_path, path)
+    logger.debug(f"Built a forecast store of {rows} rows in {path}")
@@ -1,13 +1,31 @@
+import io
+import re
 import sys
-from os import environ
-from time import sleep
+import zlib
+import base64
+import random
+import hashlib
+from os import environ, makedirs, cpu_count
+from os.path import join, getsize
+from time import sleep, monotonic
 import logging
+from queue import Queue
+from threading import Event, Lock
+from datetime import datetime, timezone
+from itertools import chain
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from urllib.parse import urlparse
-from tempfile import TemporaryDirectory
 
 import boto3
+from botocore.config import Config
 
-from sibila.errors import ResourceError
+from sibila.errors import (
+    ResourceError,
+    ResourcesError,
+    ResourceTimeoutError,
+    WaitCancelledError,
+)
 
 logging.basicConfig()
 logger = logging.getLogger("sibila")
@@ -22,6 +40,99 @@ ds_types_short = {
 }
 
 
+class PollingStrategy:
+    """Decides how long to sleep between describe calls while waiting for a resource.
+
+    The first sleep is based on how long that type of resource usually takes to become
+    ACTIVE, which is learned from the resources waited on so far. After that the delay
+    grows exponentially, with jitter, up to max_delay. timeout is the default deadline
+    (in seconds) for every wait that uses this strategy.
+    """
+
+    # Rough seconds each resource takes to be created, used until durations are observed.
+    DEFAULT_DURATIONS = {
+        "dataset": 10,
+        "dataset_group": 10,
+        "dataset_import_job": 600,
+        "predictor": 1800,
+        "forecast": 1200,
+        "forecast_export_job": 300,
+        "predictor_backtest_export_job": 300,
+    }
+
+    def __init__(
+        self,
+        min_delay: float = 2,
+        max_delay: float = 300,
+        multiplier: float = 2,
+        jitter: bool = True,
+        timeout: float = None,
+        initial_fraction: float = 0.5,
+        smoothing: float = 0.3,
+    ):
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.multiplier = multiplier
+        self.jitter = jitter
+        self.timeout = timeout
+        # Fraction of the expected remaining duration to sleep before the second describe.
+        self.initial_fraction = initial_fraction
+        # Weight of the newest observation in the learned durations.
+        self.smoothing = smoothing
+
+        self._durations = dict(PollingStrategy.DEFAULT_DURATIONS)
+        self._lock = Lock()
+
+    def expected_duration(self, resource_name: str):
+        with self._lock:
+            return self._durations.get(resource_name, self.max_delay)
+
+    def record(self, resource_name: str, response: dict):
+        """Learns the creation duration of a resource from its describe response."""
+
+        try:
+            duration = (
+                response["LastModificationTime"] - response["CreationTime"]
+            ).total_seconds()
+        except (KeyError, TypeError, AttributeError):
+            return
+
+        with self._lock:
+            previous = self._durations.get(resource_name, duration)
+            self._durations[resource_name] = (
+                self.smoothing * duration + (1 - self.smoothing) * previous
+            )
+        logger.debug(f"{resource_name.upper()} took {duration}s to be created")
+
+    def delays(self, resource_name: str, response: dict):
+        """Yields the seconds to sleep before each of the following describe calls."""
+
+        # Time the resource has already spent being created.
+        age = 0
+        creation_time = response.get("CreationTime")
+        if isinstance(creation_time, datetime) and creation_time.tzinfo:
+            age = (datetime.now(timezone.utc) - creation_time).total_seconds()
+
+        remaining = self.expected_duration(resource_name) - age
+        yield min(
+            max(self.min_delay, remaining * self.initial_fraction), self.max_delay
+        )
+
+        delay = self.min_delay
+        while True:
+            yield random.uniform(delay / 2, delay) if self.jitter else delay
+            delay = min(self.max_delay, delay * self.multiplier)
+
+
+# Shared by every AWSHandler that isn't given its own strategy, so durations learned
+# by one project are used by the rest.
+default_polling = PollingStrategy()
+
+
+# Concurrent QueryForecast calls, each one on a pooled connection that is kept alive.
+QUERY_WORKERS = 32
+
+
 class AWSHandler:
     DEFAULT_AWS_REGION = "us-east-1"
     ROLE_ARN = "arn:aws:iam::628956477585:role/BI-Forecast"
@@ -35,77 +146,1076 @@ class AWSHandler:
         aws_secret_access_key: str = environ.get("AWS_SECRET_ACCESS_KEY"),
         aws_session_token: str = environ.get("AWS_SESSION_TOKEN"),
         region_name: str = DEFAULT_AWS_REGION,
+        polling: PollingStrategy = None,
+        cache: "EntityCache" = None,
     ):
 
         self.team = team
         self.s3_uri = s3_uri
+        self.polling = polling or default_polling
+        self.cache = cache
+
+        self._credentials = {
+            "aws_access_key_id": aws_access_key_id,
+            "aws_secret_access_key": aws_secret_access_key,
+            "aws_session_token": aws_session_token,
+            "region_name": region_name,
+        }
 
         logger.debug("Creating s3 client")
-        self.s3 = boto3.client(
-            "s3",
-            aws_access_key_id=aws_access_key_id,
-            aws_secret_access_key=aws_secret_access_key,
-            aws_session_token=aws_session_token,
-            region_name=region_name,
-        )
+        self.s3 = self.client("s3")
 
         logger.debug("Creating forecast client")
-        self.forecast = boto3.client(
-            "forecast",
-            aws_access_key_id=aws_access_key_id,
-            aws_secret_access_key=aws_secret_access_key,
-            aws_session_token=aws_session_token,
-            region_name=region_name,
+        self.forecast = self.client("forecast")
+
+        self._forecastquery = None
+        self._forecastquery_lock = Lock()
+
+    @property
+    def forecastquery(self):
+        """forecastquery client pooling QUERY_WORKERS connections. It is only used by
+        item lookups, so it is created on first use."""
+        with self._forecastquery_lock:
+            if self._forecastquery is None:
+                logger.debug("Creating forecastquery client")
+                self._forecastquery = self.client(
+                    "forecastquery", max_pool_connections=QUERY_WORKERS
+                )
+            return self._forecastquery
+
+    def client(self, service_name: str, max_pool_connections: int = None):
+        """Returns a new boto3 client with the handler's credentials. Its connection
+        pool holds max_pool_connections, botocore's default if it isn't given."""
+        config = max_pool_connections and Config(
+            max_pool_connections=max_pool_connections
         )
+        return boto3.client(service_name, config=config, **self._credentials)
 
 
-def wait_for_resource(resource_name: str, resource_arn: str, aws_handler: "AWSHandler"):
-    describing_method = getattr(aws_handler.forecast, f"describe_{resource_name}")
-    keyword_arg = "".join([word.title() for word in resource_name.split("_")]) + "Arn"
+class _Waiter:
+    """Polling state of a single resource, shared by the blocking and asyncio waiters.
 
-    while True:
-        response = describing_method(**{keyword_arg: resource_arn})
+    It doesn't sleep nor call the service by itself: given each describe response it
+    decides whether to stop or how long to wait before describing again.
+    """
+
+    def __init__(
+        self,
+        resource_name: str,
+        resource_arn: str,
+        aws_handler: "AWSHandler",
+        polling: PollingStrategy = None,
+        timeout: float = None,
+    ):
+        self.resource_name = resource_name
+        self.resource_arn = resource_arn
+        self.aws_handler = aws_handler
+        self.polling = polling or aws_handler.polling
+
+        self.timeout = timeout if timeout is not None else self.polling.timeout
+        self._deadline = (
+            monotonic() + self.timeout if self.timeout is not None else None
+        )
+        self._delays = None
+        self._creating = False
+
+    def describe(self):
+        describing_method = getattr(
+            self.aws_handler.forecast, f"describe_{self.resource_name}"
+        )
+        keyword_arg = (
+            "".join([word.title() for word in self.resource_name.split("_")]) + "Arn"
+        )
+        return describing_method(**{keyword_arg: self.resource_arn})
+
+    def next_delay(self, response: dict):
+        """Returns None once the resource is ACTIVE, else the seconds to sleep.
+
+        Raises ResourceError if it failed to be created and ResourceTimeoutError once
+        the timeout is over.
+        """
         logger.debug(
-            f"{resource_name.upper()} {resource_arn} has status {response['Status']}"
+            f"{self.resource_name.upper()} {self.resource_arn} has status {response['Status']}"
         )
         if response["Status"] == "ACTIVE":
-            return
+            # Only durations of resources seen while being created are meaningful.
+            if self._creating:
+                self.polling.record(self.resource_name, response)
+            return None
         elif response["Status"] == "CREATE_FAILED":
             raise ResourceError(response["Message"])
 
-        sleep(20)
+        if self._delays is None:
+            self._creating = response["Status"].startswith("CREATE")
+            self._delays = self.polling.delays(self.resource_name, response)
+        delay = next(self._delays)
+
+        if self._deadline is not None:
+            remaining = self._deadline - monotonic()
+            if remaining <= 0:
+                raise ResourceTimeoutError(
+                    f"Timed out after {self.timeout}s waiting for {self.resource_name} {self.resource_arn}"
+                )
+            delay = min(delay, remaining)
+
+        return delay
+
+    def cancelled(self):
+        return WaitCancelledError(
+            f"Stopped waiting for {self.resource_name} {self.resource_arn}"
+        )
+
+
+def wait_for_resource(
+    resource_name: str,
+    resource_arn: str,
+    aws_handler: "AWSHandler",
+    polling: PollingStrategy = None,
+    timeout: float = None,
+    cancel_event: Event = None,
+):
+    """Blocks until the resource is ACTIVE.
+
+    Raises ResourceError if it fails to be created, ResourceTimeoutError if timeout
+    seconds go by first, and WaitCancelledError if cancel_event is set while waiting.
+    """
+    waiter = _Waiter(resource_name, resource_arn, aws_handler, polling, timeout)
+
+    while True:
+        delay = waiter.next_delay(waiter.describe())
+        if delay is None:
+            return
+
+        if cancel_event is None:
+            sleep(delay)
+        elif cancel_event.wait(delay):
+            raise waiter.cancelled()
 
     # status_indicator.end()
 
 
-def download_and_merge(s3_uri, destination_path, aws_handler):
+# Upper bound of resources that are polled at the same time by wait_for_resources.
+WAIT_WORKERS = 32
+
+
+def wait_for_resources(
+    resources,
+    aws_handler: "AWSHandler",
+    polling: PollingStrategy = None,
+    timeout: float = None,
+    max_workers: int = WAIT_WORKERS,
+):
+    """Blocks until every (resource_name, resource_arn) in resources is ACTIVE.
+
+    The resources are polled concurrently on a shared thread pool. As soon as one of them
+    fails the rest stop being polled and a ResourcesError is raised, whose outcomes map
+    every arn to ACTIVE, CREATE_FAILED, TIMED_OUT or CANCELLED. Returns the outcomes.
+    """
+    resources = list(resources)
+    outcomes = {resource_arn: "CANCELLED" for _, resource_arn in resources}
+    if not resources:
+        return outcomes
+
+    cancel_event = Event()
+    failure = None
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(resources))) as executor:
+        futures = {
+            executor.submit(
+                wait_for_resource,
+                resource_name,
+                resource_arn,
+                aws_handler,
+                polling,
+                timeout,
+                cancel_event,
+            ): (resource_name, resource_arn)
+            for resource_name, resource_arn in resources
+        }
+
+        for future in as_completed(futures):
+            resource_name, resource_arn = futures[future]
+            try:
+                future.result()
+            except WaitCancelledError:
+                continue
+            except ResourceError as e:
+                if isinstance(e, ResourceTimeoutError):
+                    outcomes[resource_arn] = "TIMED_OUT"
+                else:
+                    outcomes[resource_arn] = "CREATE_FAILED"
+                logger.debug(f"{resource_name.upper()} {resource_arn} failed: {e}")
+                failure = failure or (resource_arn, e)
+                cancel_event.set()
+            except Exception:
+                cancel_event.set()
+                raise
+            else:
+                outcomes[resource_arn] = "ACTIVE"
+
+    if failure:
+        failed_arn, error = failure
+        raise ResourcesError(str(error), failed_arn=failed_arn, outcomes=outcomes)
+
+    return outcomes
+
+
+def paginate(client, operation: str, result_key: str, **kwargs):
+    """Lazily yields the items under result_key of every page of a list operation.
+
+    Pages are requested as they are consumed, so callers that find what they were
+    looking for can stop without listing the rest of the account.
+    """
+    for page in client.get_paginator(operation).paginate(**kwargs):
+        for item in page.get(result_key, []):
+            yield item
+
+
+# Amount of sub-prefixes that are listed concurrently.
+LIST_WORKERS = 8
+
+
+def _paginate_objects(bucket: str, prefix: str, aws_handler: "AWSHandler", **kwargs):
+    """Yields every list_objects_v2 page under prefix, following continuation tokens."""
+
+    paginator = aws_handler.s3.get_paginator("list_objects_v2")
+    for page in paginator.paginate(Bucket=bucket, Prefix=prefix, **kwargs):
+        yield page
+
+
+def _list_shard(bucket, prefix, aws_handler, queue, stop):
+    """Lists every object under prefix into queue, followed by a None sentinel."""
+
+    try:
+        for page in _paginate_objects(bucket, prefix, aws_handler):
+            if stop.is_set():
+                break
+            for s3_object in page.get("Contents", []):
+                queue.put(s3_object)
+    except Exception as e:  # pragma: no cover
+        queue.put(e)
+    queue.put(None)
+
+
+def list_objects(
+    s3_uri: str,
+    aws_handler: "AWSHandler",
+    suffix: str = None,
+    max_workers: int = LIST_WORKERS,
+):
+    """Lazily yields the objects found under s3_uri in key order.
+
+    The prefix is listed one level deep and every sub-prefix found is listed in the
+    background, in parallel, while the caller is still consuming keys. This way
+    downloads can start before the listing finishes.
+    """
     parsed_s3_uri = urlparse(s3_uri)
     bucket, prefix = parsed_s3_uri.netloc, parsed_s3_uri.path.lstrip("/")
 
-    file_keys = [
-        f["Key"]
-        for f in aws_handler.s3.list_objects_v2(Bucket=bucket, Prefix=prefix)[
-            "Contents"
+    stop = Event()
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+    try:
+        for page in _paginate_objects(bucket, prefix, aws_handler, Delimiter="/"):
+            entries = [(f["Key"], f, None) for f in page.get("Contents", [])]
+            for common_prefix in page.get("CommonPrefixes", []):
+                shard = Queue()
+                executor.submit(
+                    _list_shard,
+                    bucket,
+                    common_prefix["Prefix"],
+                    aws_handler,
+                    shard,
+                    stop,
+                )
+                entries.append((common_prefix["Prefix"], None, shard))
+
+            # Contents and CommonPrefixes are each sorted, merge them by name.
+            for _, s3_object, shard in sorted(entries, key=lambda entry: entry[0]):
+                listed = [s3_object] if shard is None else iter(shard.get, None)
+                for listed_object in listed:
+                    if isinstance(listed_object, Exception):  # pragma: no cover
+                        raise listed_object
+                    if suffix is None or listed_object["Key"].endswith(suffix):
+                        yield listed_object
+    finally:
+        stop.set()
+        executor.shutdown(wait=False)
+
+
+# Concurrency and chunk size used when downloading exported files from s3.
+# At most 2 * DOWNLOAD_WORKERS chunks are held in memory at any given time.
+DOWNLOAD_WORKERS = 8
+DOWNLOAD_CHUNK_SIZE = 8 * 1024 * 1024
+
+
+# Seconds between listings of a prefix that an export is still writing.
+WATCH_INTERVAL = 10
+
+
+def watch_objects(
+    s3_uri: str,
+    resource_name: str,
+    resource_arn: str,
+    aws_handler: "AWSHandler",
+    suffix: str = None,
+    interval: float = WATCH_INTERVAL,
+):
+    """Lazily yields the objects that the resource writes under s3_uri while it is
+    being created, each one once and in the order they appear.
+
+    s3 objects are only visible once they are completely written, so each one can
+    be downloaded as soon as it is yielded. The prefix is listed every interval
+    seconds until the resource is ACTIVE, and once more after that, while its status
+    is described on the schedule of the handler's PollingStrategy. Raises the errors
+    of wait_for_resource if the resource fails or times out.
+    """
+    waiter = _Waiter(resource_name, resource_arn, aws_handler)
+    seen = set()
+    until_describe = 0
+    while True:
+        active = False
+        if until_describe <= 0:
+            # The status is described before listing, so the last listing is complete.
+            until_describe = waiter.next_delay(waiter.describe())
+            active = until_describe is None
+        for s3_object in list_objects(s3_uri, aws_handler, suffix=suffix):
+            if s3_object["Key"] not in seen:
+                seen.add(s3_object["Key"])
+                yield s3_object
+
+        if active:
+            return
+        pause = min(until_describe, interval)
+        sleep(pause)
+        until_describe -= pause
+
+
+def _iter_object_chunks(
+    bucket: str,
+    objects,
+    aws_handler: "AWSHandler",
+    max_workers: int = DOWNLOAD_WORKERS,
+    chunk_size: int = DOWNLOAD_CHUNK_SIZE,
+):
+    """Yields (key, offset, data) for every byte range of the given objects, in order.
+
+    Ranges are fetched concurrently with ranged GETs, but only a bounded window of them
+    is in flight so memory usage doesn't depend on the size of the objects.
+    """
+
+    def fetch(key, start, end):
+        logger.debug(
+            f"Downloading bytes {start}-{end} of key {key} from bucket {bucket}"
+        )
+        response = aws_handler.s3.get_object(
+            Bucket=bucket, Key=key, Range=f"bytes={start}-{end}"
+        )
+        return response["Body"].read()
+
+    def ranges():
+        for s3_object in objects:
+            size = s3_object["Size"]
+            for start in range(0, size, chunk_size):
+                yield s3_object["Key"], start, min(start + chunk_size, size) - 1
+
+    window = 2 * max_workers
+    pending = deque()
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        try:
+            for key, start, end in ranges():
+                pending.append((key, start, executor.submit(fetch, key, start, end)))
+                if len(pending) >= window:
+                    key, start, future = pending.popleft()
+                    yield key, start, future.result()
+
+            while pending:
+                key, start, future = pending.popleft()
+                yield key, start, future.result()
+        finally:
+            for _, _, future in pending:
+                future.cancel()
+
+
+def _gunzip_chunks(chunks):
+    """Decompresses the chunks of .gz objects, other objects are passed through.
+
+    Yields (key, offset, data) where offset is still the one of the compressed chunk,
+    so that offset 0 marks the start of every object even if it decompresses to nothing.
+    """
+    decompressor = None
+    for key, offset, data in chunks:
+        if not key.endswith(".gz"):
+            yield key, offset, data
+            continue
+
+        if offset == 0:
+            decompressor = zlib.decompressobj(31)
+
+        decompressed = b""
+        while data:
+            decompressed += decompressor.decompress(data)
+            data = b""
+            if decompressor.eof:
+                # The object may be made of several gzip members.
+                data = decompressor.unused_data
+                decompressor = zlib.decompressobj(31)
+
+        yield key, offset, decompressed
+
+
+def _iter_csv_chunks(
+    bucket: str,
+    objects,
+    aws_handler: "AWSHandler",
+    max_workers: int = DOWNLOAD_WORKERS,
+    chunk_size: int = DOWNLOAD_CHUNK_SIZE,
+    skip_headers: bool = True,
+):
+    """Yields (key, data) for the csv objects as if they were a single file.
+
+    Parts are always separated by a newline and, if skip_headers is set, only the
+    header of the first part is kept.
+    """
+
+    header_written = False
+    skipping_header = False
+    ends_with_newline = True
+    for key, offset, data in _gunzip_chunks(
+        _iter_object_chunks(bucket, objects, aws_handler, max_workers, chunk_size)
+    ):
+        if offset == 0:
+            # Write header only for first file
+            skipping_header = skip_headers and header_written
+            header_written = True
+            if not ends_with_newline:
+                yield key, b"\n"
+
+        if skipping_header:
+            # The header may span more than one chunk.
+            newline = data.find(b"\n")
+            if newline == -1:
+                continue
+            data = data[newline + 1 :]
+            skipping_header = False
+
+        if data:
+            ends_with_newline = data.endswith(b"\n")
+            yield key, data
+
+
+def _merge_objects(
+    bucket: str,
+    objects,
+    destination_path: str,
+    aws_handler: "AWSHandler",
+    max_workers: int = DOWNLOAD_WORKERS,
+    chunk_size: int = DOWNLOAD_CHUNK_SIZE,
+    skip_headers: bool = True,
+):
+    """Streams the csv objects into destination_path keeping only the first header.
+
+    Returns the amount of non empty objects that were merged.
+    """
+
+    merged = 0
+    last_key = None
+    with open(destination_path, mode="wb") as dest_file:
+        for key, data in _iter_csv_chunks(
+            bucket, objects, aws_handler, max_workers, chunk_size, skip_headers
+        ):
+            if key != last_key:
+                logger.debug(f"Appending {key} to {destination_path}")
+                merged += 1
+                last_key = key
+
+            dest_file.write(data)
+
+    return merged
+
+
+class _ChunkStream(io.RawIOBase):
+    """Read only file object over an iterable of bytes, e.g. to feed a csv parser."""
+
+    def __init__(self, chunks):
+        self._chunks = iter(chunks)
+        self._chunk = memoryview(b"")
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        while not self._chunk:
+            try:
+                self._chunk = memoryview(next(self._chunks))
+            except StopIteration:
+                return 0
+
+        size = min(len(buffer), len(self._chunk))
+        buffer[:size] = self._chunk[:size]
+        self._chunk = self._chunk[size:]
+        return size
+
+    def close(self):
+        # Stops the downloads of a generator that wasn't consumed entirely.
+        if hasattr(self._chunks, "close"):
+            self._chunks.close()
+        super().close()
+
+
+def download_and_merge(
+    s3_uri, destination_path, aws_handler, max_workers: int = DOWNLOAD_WORKERS
+):
+    """Merges the csv files under s3_uri into destination_path and returns the
+    amount of non empty files that were merged."""
+    bucket = urlparse(s3_uri).netloc
+    file_objects = list_objects(s3_uri, aws_handler, suffix=".csv")
+
+    merged = _merge_objects(
+        bucket, file_objects, destination_path, aws_handler, max_workers=max_workers
+    )
+    if not merged:
+        logger.warning(f"No csv files were found in {s3_uri}")
+    return merged
+
+
+def watch_and_merge(
+    s3_uri: str,
+    destination_path: str,
+    resource_name: str,
+    resource_arn: str,
+    aws_handler: "AWSHandler",
+    max_workers: int = DOWNLOAD_WORKERS,
+    interval: float = WATCH_INTERVAL,
+):
+    """Same as download_and_merge, but it starts while the resource is still
+    exporting: parts are downloaded and appended as they appear under s3_uri, so
+    the merge finishes shortly after the resource is ACTIVE.
+
+    Parts are merged in the order they appear instead of in key order.
+    """
+    bucket = urlparse(s3_uri).netloc
+    file_objects = watch_objects(
+        s3_uri, resource_name, resource_arn, aws_handler, ".csv", interval
+    )
+
+    merged = _merge_objects(
+        bucket, file_objects, destination_path, aws_handler, max_workers=max_workers
+    )
+    if not merged:
+        logger.warning(f"No csv files were found in {s3_uri}")
+    return merged
+
+
+def download_objects(
+    s3_uri: str,
+    destination_dir: str,
+    aws_handler: "AWSHandler",
+    suffix: str = None,
+    max_workers: int = DOWNLOAD_WORKERS,
+):
+    """Downloads every object under s3_uri into its own file in destination_dir.
+
+    Returns the local paths of the downloaded files.
+    """
+    bucket = urlparse(s3_uri).netloc
+    prefix = urlparse(s3_uri).path.lstrip("/")
+    makedirs(destination_dir, exist_ok=True)
+
+    paths = []
+    dest_file = None
+    try:
+        for key, offset, data in _iter_object_chunks(
+            bucket,
+            list_objects(s3_uri, aws_handler, suffix=suffix),
+            aws_handler,
+            max_workers,
+        ):
+            if offset == 0:
+                if dest_file:
+                    dest_file.close()
+                # Parts of nested prefixes keep their relative path in the name.
+                path = join(
+                    destination_dir, key[len(prefix) :].strip("/").replace("/", "_")
+                )
+                logger.debug(f"Writing {key} to {path}")
+                dest_file = open(path, mode="wb")
+                paths.append(path)
+            dest_file.write(data)
+    finally:
+        if dest_file:
+            dest_file.close()
+
+    return paths
+
+
+# Bytes read at a time while hashing a file.
+HASH_BLOCK_SIZE = 8 * 1024 * 1024
+
+
+def file_sha256(local_path: str):
+    """Returns the hex sha256 of a file, reading it in blocks."""
+    sha256 = hashlib.sha256()
+    with open(local_path, mode="rb") as local_file:
+        for block in iter(lambda: local_file.read(HASH_BLOCK_SIZE), b""):
+            sha256.update(block)
+    return sha256.hexdigest()
+
+
+# Amount of parts uploaded concurrently and their default size.
+UPLOAD_WORKERS = 8
+UPLOAD_PART_SIZE = 64 * 1024 * 1024
+# Limits of s3 multipart uploads.
+MIN_PART_SIZE = 5 * 1024 * 1024
+MAX_PARTS = 10000
+
+
+class _Progress:
+    """Reports the progress of a transfer as callback(transferred, total, throughput).
+
+    The throughput, in bytes per second, only counts the bytes transferred by this
+    call and not the ones reused from an interrupted transfer.
+    """
+
+    def __init__(self, total: int, callback=None):
+        self.total = total
+        self.callback = callback
+        self.transferred = 0
+        self.resumed = 0
+        self.start = monotonic()
+        self._lock = Lock()
+
+    def resume(self, amount: int):
+        self.resumed += amount
+        self(amount)
+
+    def __call__(self, amount: int):
+        if self.callback is None:
+            return
+
+        with self._lock:
+            self.transferred += amount
+            elapsed = monotonic() - self.start
+            throughput = (self.transferred - self.resumed) / elapsed if elapsed else 0.0
+            self.callback(self.transferred, self.total, throughput)
+
+
+class _FileRange:
+    """Bytes start to end of a local file, optionally preceded by a header."""
+
+    def __init__(self, local_path: str, start: int = 0, end: int = None, header=b""):
+        self.local_path = local_path
+        self.start = start
+        self.end = getsize(local_path) if end is None else end
+        self.header = header
+        self.size = len(header) + self.end - self.start
+
+    def read(self, offset: int, length: int):
+        data = self.header[offset : offset + length]
+        offset = max(offset - len(self.header), 0)
+        length = min(length - len(data), self.end - self.start - offset)
+        if length <= 0:
+            return data
+
+        with open(self.local_path, mode="rb") as local_file:
+            local_file.seek(self.start + offset)
+            return data + local_file.read(length)
+
+    def parts(self, part_size: int):
+        """Yields (data, source_bytes) for each part of part_size bytes."""
+        for offset in range(0, self.size, part_size):
+            data = self.read(offset, part_size)
+            yield data, len(data)
+
+
+# Uncompressed bytes of each gzip member. Members are compressed in parallel.
+COMPRESS_BLOCK_SIZE = 8 * 1024 * 1024
+COMPRESS_WORKERS = cpu_count() or 4
+
+
+def _gzip_member(data: bytes, level: int):
+    # zlib writes no timestamp nor file name in the header, so compressing the same
+    # data always gives the same bytes and resumed uploads can reuse their parts.
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    return compressor.compress(data) + compressor.flush()
+
+
+class _GzipStream:
+    """Gzip compression of a source, made of independent members compressed in parallel.
+
+    Concatenated gzip members are a valid gzip file, so the whole file is never held in
+    memory and compression is spread across cores.
+    """
+
+    def __init__(
+        self,
+        source: _FileRange,
+        level: int = 6,
+        max_workers: int = COMPRESS_WORKERS,
+        block_size: int = COMPRESS_BLOCK_SIZE,
+    ):
+        self.source = source
+        self.local_path = source.local_path
+        # The compressed size is unknown, this is an upper bound to size the parts.
+        self.size = source.size
+        self.level = level
+        self.max_workers = max_workers
+        self.block_size = block_size
+
+    def _members(self):
+        """Yields (member, source_bytes) in order, compressing a bounded window of blocks."""
+        if not self.source.size:
+            yield _gzip_member(b"", self.level), 0
+            return
+
+        pending = deque()
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            try:
+                for offset in range(0, self.source.size, self.block_size):
+                    data = self.source.read(offset, self.block_size)
+                    pending.append(
+                        (len(data), executor.submit(_gzip_member, data, self.level))
+                    )
+                    if len(pending) >= 2 * self.max_workers:
+                        source_bytes, future = pending.popleft()
+                        yield future.result(), source_bytes
+
+                while pending:
+                    source_bytes, future = pending.popleft()
+                    yield future.result(), source_bytes
+            finally:
+                for _, future in pending:
+                    future.cancel()
+
+    def parts(self, part_size: int):
+        buffer = bytearray()
+        source_bytes = 0
+        for member, member_source_bytes in self._members():
+            buffer += member
+            source_bytes += member_source_bytes
+            while len(buffer) >= part_size:
+                yield bytes(buffer[:part_size]), source_bytes
+                del buffer[:part_size]
+                source_bytes = 0
+
+        if buffer:
+            yield bytes(buffer), source_bytes
+
+
+def _resume_upload(bucket: str, key: str, aws_handler: "AWSHandler"):
+    """Returns the id and {part_number: etag} of an interrupted upload to the key.
+
+    Only the latest unfinished upload is resumed, older ones are aborted. Returns
+    (None, {}) if there is no upload to resume.
+    """
+    uploads = sorted(
+        (
+            upload
+            for upload in paginate(
+                aws_handler.s3,
+                "list_multipart_uploads",
+                "Uploads",
+                Bucket=bucket,
+                Prefix=key,
+            )
+            if upload["Key"] == key
+        ),
+        key=lambda upload: upload["Initiated"],
+    )
+    if not uploads:
+        return None, {}
+
+    for stale_upload in uploads[:-1]:
+        logger.debug(f"Aborting stale upload {stale_upload['UploadId']} of {key}")
+        aws_handler.s3.abort_multipart_upload(
+            Bucket=bucket, Key=key, UploadId=stale_upload["UploadId"]
+        )
+
+    upload_id = uploads[-1]["UploadId"]
+    parts = {
+        part["PartNumber"]: part["ETag"]
+        for part in paginate(
+            aws_handler.s3,
+            "list_parts",
+            "Parts",
+            Bucket=bucket,
+            Key=key,
+            UploadId=upload_id,
+        )
+    }
+
+    logger.info(f"Resuming the upload of {key}, {len(parts)} parts were uploaded")
+    return upload_id, parts
+
+
+def upload_file(
+    local_path: str,
+    s3_uri: str,
+    aws_handler: "AWSHandler",
+    part_size: int = UPLOAD_PART_SIZE,
+    max_workers: int = UPLOAD_WORKERS,
+    callback=None,
+    compress: bool = False,
+):
+    """Uploads local_path to s3_uri in parts of part_size bytes sent concurrently.
+
+    Every part is sent with its md5 so that s3 rejects it if it gets corrupted. If an
+    upload of the same file to the same key was interrupted, the parts that were
+    already uploaded are reused. callback, if given, is called after every part with
+    the bytes uploaded so far, the total bytes and the throughput in bytes per second.
+
+    If compress is set the file is gzipped while it is uploaded, and the progress is
+    measured in bytes of the local file.
+    """
+    source = _FileRange(local_path)
+    _upload(
+        _GzipStream(source) if compress else source,
+        s3_uri,
+        aws_handler,
+        part_size,
+        max_workers,
+        _Progress(source.size, callback),
+    )
+
+
+def upload_shards(
+    local_path: str,
+    s3_uris: list,
+    aws_handler: "AWSHandler",
+    header: bytes = b"",
+    part_size: int = UPLOAD_PART_SIZE,
+    max_workers: int = UPLOAD_WORKERS,
+    callback=None,
+    compress: bool = False,
+):
+    """Splits local_path on line boundaries and uploads a shard to each s3 uri.
+
+    Shards are read straight from the local file and uploaded concurrently, every
+    shard but the first is preceded by header. callback and compress work like in
+    upload_file, with the progress of all the shards. Returns the s3 uris that were
+    uploaded, which are less than the given ones if the file has fewer lines than
+    shards.
+    """
+    shards = [
+        _FileRange(local_path, start, end, header if i else b"")
+        for i, (start, end) in enumerate(split_lines(local_path, len(s3_uris)))
+    ]
+    progress = _Progress(sum(shard.size for shard in shards), callback)
+    if compress:
+        shards = [
+            _GzipStream(shard, max_workers=max(COMPRESS_WORKERS // len(shards), 1))
+            for shard in shards
+        ]
+
+    # The workers are divided among the shards.
+    shard_workers = max(max_workers // len(shards), 1)
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(shards))) as executor:
+        futures = [
+            executor.submit(
+                _upload, shard, s3_uri, aws_handler, part_size, shard_workers, progress
+            )
+            for shard, s3_uri in zip(shards, s3_uris)
         ]
-        if f["Key"].endswith(".csv")
+        for future in futures:
+            future.result()
+
+    return s3_uris[: len(shards)]
+
+
+def split_lines(local_path: str, parts: int):
+    """Returns the (start, end) byte ranges that split a file in parts of about the
+    same size without splitting any line."""
+    size = getsize(local_path)
+    boundaries = [0]
+    with open(local_path, mode="rb") as local_file:
+        for i in range(1, parts):
+            local_file.seek(max(size * i // parts, boundaries[-1]))
+            # Move to the start of the next line.
+            local_file.readline()
+            boundaries.append(min(local_file.tell(), size))
+    boundaries.append(size)
+
+    # Lines longer than a part leave some parts empty.
+    return [
+        (start, end) for start, end in zip(boundaries, boundaries[1:]) if end > start
     ]
 
-    dest_file = open(destination_path, mode="a")
-    with TemporaryDirectory() as tmpdir:  # pragma: no cover
-        for i, file_key in enumerate(file_keys):
-            logger.debug(
-                f"Downloading key {file_key} from bucket {bucket} into {tmpdir}/{i}"
+
+def _upload(
+    source,
+    s3_uri: str,
+    aws_handler: "AWSHandler",
+    part_size: int,
+    max_workers: int,
+    progress: _Progress,
+):
+    """Uploads the parts of a _FileRange or _GzipStream to s3_uri."""
+    parsed_s3_uri = urlparse(s3_uri)
+    bucket, key = parsed_s3_uri.netloc, parsed_s3_uri.path.lstrip("/")
+
+    # Parts can't be smaller than 5 MB and there can't be more than 10000 of them.
+    part_size = max(part_size, MIN_PART_SIZE, -(-source.size // MAX_PARTS))
+    parts = source.parts(part_size)
+    first_part = next(parts, (b"", 0))
+    second_part = next(parts, None)
+
+    if second_part is None:
+        data, source_bytes = first_part
+        aws_handler.s3.put_object(
+            Bucket=bucket,
+            Key=key,
+            Body=data,
+            ContentMD5=base64.b64encode(hashlib.md5(data).digest()).decode(),
+        )
+        progress(source_bytes)
+        return
+
+    upload_id, uploaded_parts = _resume_upload(bucket, key, aws_handler)
+    if upload_id is None:
+        upload_id = aws_handler.s3.create_multipart_upload(Bucket=bucket, Key=key)[
+            "UploadId"
+        ]
+
+    def upload_part(part_number, data, source_bytes):
+        logger.debug(f"Uploading part {part_number} of {key} ({len(data)} bytes)")
+        etag = aws_handler.s3.upload_part(
+            Bucket=bucket,
+            Key=key,
+            UploadId=upload_id,
+            PartNumber=part_number,
+            Body=data,
+            ContentMD5=base64.b64encode(hashlib.md5(data).digest()).decode(),
+        )["ETag"]
+        progress(source_bytes)
+        return part_number, etag
+
+    etags = {}
+    pending = deque()
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        try:
+            for part_number, (data, source_bytes) in enumerate(
+                chain([first_part, second_part], parts), 1
+            ):
+                # Parts of an interrupted upload are kept if they have the same content.
+                etag = uploaded_parts.get(part_number)
+                if etag and etag.strip('"') == hashlib.md5(data).hexdigest():
+                    etags[part_number] = etag
+                    progress.resume(source_bytes)
+                    continue
+
+                pending.append(
+                    executor.submit(upload_part, part_number, data, source_bytes)
+                )
+                # Only max_workers parts are held in memory at the same time.
+                if len(pending) >= max_workers:
+                    part_number, etag = pending.popleft().result()
+                    etags[part_number] = etag
+
+            while pending:
+                part_number, etag = pending.popleft().result()
+                etags[part_number] = etag
+        except Exception:
+            for future in pending:
+                future.cancel()
+            logger.warning(
+                f"The upload of {source.local_path} to {s3_uri} was interrupted. Uploading it again to the same key resumes it."
             )
-            aws_handler.s3.download_file(
-                Bucket=bucket,
-                Key=file_key,
-                Filename=f"{tmpdir}/{i}",
+            raise
+
+    aws_handler.s3.complete_multipart_upload(
+        Bucket=bucket,
+        Key=key,
+        UploadId=upload_id,
+        MultipartUpload={
+            "Parts": [
+                {"PartNumber": part_number, "ETag": etags[part_number]}
+                for part_number in sorted(etags)
+            ]
+        },
+    )
+
+
+def delete_objects(s3_uris: list, aws_handler: "AWSHandler"):
+    """Deletes the objects of the same bucket, a thousand per request."""
+    for i in range(0, len(s3_uris), 1000):
+        batch = [urlparse(s3_uri) for s3_uri in s3_uris[i : i + 1000]]
+        aws_handler.s3.delete_objects(
+            Bucket=batch[0].netloc,
+            Delete={
+                "Objects": [{"Key": s3_uri.path.lstrip("/")} for s3_uri in batch],
+                "Quiet": True,
+            },
+        )
+
+
+def is_header(line: bytes, names: list):
+    """Returns whether a csv line is a header of the given column names."""
+    if not names:
+        return False
+    first_field = line.split(b"\n", 1)[0].split(b",", 1)[0]
+    return first_field.strip().strip(b'"').decode("utf-8", "replace") == names[0]
+
+
+_JAVA_TIMESTAMP_TOKENS = {
+    "yyyy": "%Y",
+    "yy": "%y",
+    "MM": "%m",
+    "dd": "%d",
+    "HH": "%H",
+    # Forecast reads hh as a 24 hour clock too.
+    "hh": "%H",
+    "mm": "%M",
+    "ss": "%S",
+    "SSS": "%f",
+}
+_JAVA_TIMESTAMP_TOKEN = re.compile(
+    "'[^']*'|" + "|".join(sorted(_JAVA_TIMESTAMP_TOKENS, key=len, reverse=True)) + "|."
+)
+
+
+def java_to_strftime(timestamp_format: str):
+    """Translates a java timestamp format like the ones Forecast uses to strftime.
+
+    For example yyyy-MM-dd'T'HH:mm:ss becomes %Y-%m-%dT%H:%M:%S. Raises a ValueError
+    if it has a pattern letter that Forecast doesn't support.
+    """
+    translation = ""
+    for token in _JAVA_TIMESTAMP_TOKEN.findall(timestamp_format):
+        if token.startswith("'"):
+            translation += token.strip("'").replace("%", "%%")
+        elif token in _JAVA_TIMESTAMP_TOKENS:
+            translation += _JAVA_TIMESTAMP_TOKENS[token]
+        elif token.isalpha():
+            raise ValueError(
+                f"The timestamp format {timestamp_format} has an unsupported pattern {token}"
             )
+        else:
+            translation += token.replace("%", "%%")
+    return translation
 
-            # Write header only for first file
-            logger.debug(f"Appending {tmpdir}/{i} to {destination_path}")
-            if i == 0:
-                dest_file.write(open(f"{tmpdir}/{i}").read())
-            else:
-                dest_file.writelines(open(f"{tmpdir}/{i}").readlines()[1:])
-    dest_file.close()
+
+def _import_pandas():
+    try:
+        import pandas
+    except ImportError:
+        raise ImportError(
+            "pandas is required to load datasets into dataframes. Install it with `pip install sibila[pandas]`"
+        )
+    return pandas
+
+
+def _import_pyarrow_dataset():
+    try:
+        import pyarrow.dataset
+    except ImportError:
+        raise ImportError(
+            "pyarrow is required to read parquet files. Install it with `pip install sibila[arrow]`"
+        )
+    return pyarrow.dataset
+
+
+def read_parquet(path):
+    """Returns a lazy pyarrow dataset over the parquet files in path, a directory or
+    a list of files.
+
+    Use .to_table() to load it, or .to_batches() to iterate over it in chunks.
+    """
+    return _import_pyarrow_dataset().dataset(path, format="parquet")
@@ -0,0 +1,287 @@
+import io
+import re
+from os import cpu_count
+from itertools import chain
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from sibila.errors import DatasetError
+from sibila.utils import (
+    AWSHandler,
+    java_to_strftime,
+    is_header,
+    split_lines,
+    _gunzip_chunks,
+    _import_pandas,
+    _FileRange,
+    logger,
+)
+
+# Bytes of csv validated by each task. Blocks always end on a line boundary.
+VALIDATION_BLOCK_SIZE = 16 * 1024 * 1024
+VALIDATION_WORKERS = cpu_count() or 1
+# Lines reported for each kind of problem, the rest are only counted.
+REPORTED_LINES = 5
+
+# Target field of the target time series of each domain.
+TARGET_FIELDS = {
+    "RETAIL": "demand",
+    "CUSTOM": "target_value",
+    "INVENTORY_PLANNING": "demand",
+    "EC2_CAPACITY": "number_of_instances",
+    "WORK_FORCE": "workforce_demand",
+    "WEB_TRAFFIC": "value",
+    "METRICS": "metric_value",
+}
+
+# Minutes in the periods of the frequencies shorter than a day.
+FREQUENCY_MINUTES = {
+    "H": 60,
+    "30min": 30,
+    "15min": 15,
+    "10min": 10,
+    "5min": 5,
+    "1min": 1,
+}
+
+
+def validate_csv(
+    local_path: str,
+    ds_type: str,
+    schema: dict,
+    frequency: str = None,
+    timestamp_format: str = None,
+    domain: str = AWSHandler.DOMAIN,
+    max_workers: int = VALIDATION_WORKERS,
+    block_size: int = VALIDATION_BLOCK_SIZE,
+):
+    """Checks a local .csv or .csv.gz against the schema before it is imported.
+
+    The file is read in blocks that are validated in parallel processes, so it never
+    has to fit in memory. These are checked:
+        - every row has the columns of the schema, and the header (if any) their order
+        - integer and float attributes are numbers
+        - timestamps parse with timestamp_format and are aligned with frequency
+        - targets of a TARGET_TIME_SERIES are not empty
+
+    Raises a DatasetError that lists every kind of problem with the lines where it
+    was found. Returns the amount of rows validated.
+    """
+    # Fail before any process is started if pandas is missing.
+    _import_pandas()
+
+    names = [attribute["AttributeName"] for attribute in schema["Attributes"]]
+    target = TARGET_FIELDS.get(domain) if ds_type == "TARGET_TIME_SERIES" else None
+    checks = dict(
+        names=names,
+        types=[attribute["AttributeType"] for attribute in schema["Attributes"]],
+        target=target if target in names else None,
+        frequency=frequency,
+        timestamp_format=timestamp_format and java_to_strftime(timestamp_format),
+    )
+
+    blocks = _csv_blocks(local_path, block_size)
+    first_block = next(blocks, b"")
+    first_line = _first_line(first_block)
+    has_header = is_header(first_line, names)
+
+    problems = {}
+    if has_header:
+        header = [
+            name.strip().strip('"')
+            for name in first_line.decode("utf-8", "replace").rstrip("\r\n").split(",")
+        ]
+        if header != names:
+            problems[f"The header {header} doesn't match the schema {names}"] = [1, [1]]
+
+    # Problems are found by row in each block, they are turned into line numbers here.
+    line = 2 if has_header else 1
+    for rows, block_problems in _map_blocks(
+        first_block, blocks, has_header, checks, max_workers
+    ):
+        for message, (count, rows_found) in block_problems.items():
+            problem = problems.setdefault(message, [0, []])
+            problem[0] += count
+            problem[1].extend(
+                line + row for row in rows_found[: REPORTED_LINES - len(problem[1])]
+            )
+        line += rows
+
+    rows = line - (2 if has_header else 1)
+    if problems:
+        raise DatasetError(
+            f"{local_path} doesn't match the schema:\n"
+            + "\n".join(
+                f"- {message}: {count} rows, in lines {', '.join(map(str, lines))}"
+                + ("..." if count > len(lines) else "")
+                for message, (count, lines) in problems.items()
+            )
+        )
+
+    logger.info(f"{local_path} is valid, {rows} rows were checked")
+    return rows
+
+
+def _first_line(block):
+    if isinstance(block, _FileRange):
+        block = block.read(0, min(block.size, 64 * 1024))
+    return block.split(b"\n", 1)[0]
+
+
+def _csv_blocks(local_path: str, block_size: int):
+    """Yields blocks of about block_size bytes that end on a line boundary.
+
+    Blocks of a plain csv are _FileRanges that each process reads by itself, gzipped
+    files are decompressed here and their blocks are sent as bytes.
+    """
+    if not local_path.endswith(".gz"):
+        size = _FileRange(local_path).size
+        for start, end in split_lines(local_path, max(-(-size // block_size), 1)):
+            yield _FileRange(local_path, start, end)
+        return
+
+    def compressed_chunks():
+        with open(local_path, mode="rb") as local_file:
+            offset = 0
+            for data in iter(lambda: local_file.read(block_size), b""):
+                yield local_path, offset, data
+                offset += len(data)
+
+    buffer = bytearray()
+    for _, _, data in _gunzip_chunks(compressed_chunks()):
+        buffer += data
+        end = buffer.rfind(b"\n")
+        if len(buffer) >= block_size and end != -1:
+            yield bytes(buffer[: end + 1])
+            del buffer[: end + 1]
+    if buffer:
+        yield bytes(buffer)
+
+
+def _map_blocks(first_block, blocks, has_header: bool, checks: dict, max_workers):
+    """Yields the result of _validate_block for every block, in order."""
+    second_block = next(blocks, None)
+    if second_block is None or max_workers <= 1:
+        # A process pool isn't worth it for a single block.
+        yield _validate_block(first_block, has_header, checks)
+        for block in chain([second_block] if second_block else [], blocks):
+            yield _validate_block(block, False, checks)
+        return
+
+    pending = deque()
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        try:
+            pending.append(
+                executor.submit(_validate_block, first_block, has_header, checks)
+            )
+            pending.append(
+                executor.submit(_validate_block, second_block, False, checks)
+            )
+            for block in blocks:
+                # Only a bounded window of blocks is held in memory.
+                if len(pending) >= 2 * max_workers:
+                    yield pending.popleft().result()
+                pending.append(executor.submit(_validate_block, block, False, checks))
+
+            while pending:
+                yield pending.popleft().result()
+        finally:
+            for future in pending:
+                future.cancel()
+
+
+def _validate_block(block, skip_header: bool, checks: dict):
+    """Returns (rows, {problem: (count, rows)}) for a block of csv lines.
+
+    Rows are counted from 0 after the header, only the first REPORTED_LINES rows of
+    each problem are returned.
+    """
+    pandas = _import_pandas()
+
+    if isinstance(block, _FileRange):
+        block = block.read(0, block.size)
+    names = checks["names"]
+    problems = {}
+
+    def report(message, invalid):
+        count = int(invalid.sum())
+        if count:
+            rows = invalid.to_numpy().nonzero()[0][:REPORTED_LINES].tolist()
+            problems[message] = (count, rows)
+
+    # Everything is read as text, so that a bad value doesn't fail the whole block.
+    try:
+        df = pandas.read_csv(
+            io.BytesIO(block),
+            header=None,
+            skiprows=1 if skip_header else 0,
+            dtype=str,
+            keep_default_na=False,
+            na_values=[""],
+            skip_blank_lines=False,
+        )
+    except pandas.errors.EmptyDataError:
+        return 0, problems
+    except pandas.errors.ParserError as e:
+        # Raised on the first row that has more fields than the first one.
+        line = re.search(r"line (\d+)", str(e))
+        problems["Rows with more columns than the schema"] = (
+            1,
+            [int(line.group(1)) - 1 - skip_header] if line else [],
+        )
+        return block.count(b"\n") - skip_header, problems
+
+    if df.shape[1] != len(names):
+        problems[
+            f"Rows with {df.shape[1]} columns instead of the {len(names)} of the schema"
+        ] = (len(df), list(range(min(len(df), REPORTED_LINES))))
+        return len(df), problems
+
+    df.columns = names
+    for name, attribute_type in zip(names, checks["types"]):
+        column = df[name]
+        present = column.notna()
+
+        if attribute_type in ("integer", "float"):
+            numbers = pandas.to_numeric(column, errors="coerce")
+            invalid = present & numbers.isna()
+            if attribute_type == "integer":
+                invalid |= numbers.notna() & (numbers % 1 != 0)
+            report(f"{name} is not a valid {attribute_type}", invalid)
+
+        elif attribute_type == "timestamp":
+            timestamps = pandas.to_datetime(
+                column, format=checks["timestamp_format"], errors="coerce"
+            )
+            report(
+                f"{name} doesn't have the format {checks['timestamp_format']}",
+                timestamps.isna(),
+            )
+            if checks["frequency"]:
+                report(
+                    f"{name} is not aligned with the frequency {checks['frequency']}",
+                    _misaligned(timestamps, checks["frequency"]),
+                )
+
+    if checks["target"]:
+        report(f"{checks['target']} is empty", df[checks["target"]].isna())
+
+    return len(df), problems
+
+
+def _misaligned(timestamps, frequency: str):
+    """Returns which timestamps don't start a period of the given frequency."""
+    pandas = _import_pandas()
+
+    parsed = timestamps.notna()
+    if frequency in FREQUENCY_MINUTES:
+        period = pandas.Timedelta(minutes=FREQUENCY_MINUTES[frequency])
+        aligned = timestamps == timestamps.dt.floor(period)
+    else:
+        # Periods of a day or longer start at midnight.
+        aligned = timestamps == timestamps.dt.normalize()
+        if frequency == "M":
+            aligned &= timestamps.dt.day == 1
+        elif frequency == "Y":
+            aligned &= timestamps.dt.dayofyear == 1
+    return parsed & ~aligned
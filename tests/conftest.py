@@ -1,10 +1,12 @@
 import pytest
 import datetime
-from unittest.mock import patch
+from collections import defaultdict
+from unittest.mock import MagicMock, patch
 import requests_mock
 from http import HTTPStatus
 
 from sibila.project import Project
+from sibila.utils import PollingStrategy
 
 
 def tzlocal():
@@ -27,7 +29,12 @@ def project(
         mocked_handler.forecast.describe_dataset.return_value = (
             describe_dataset_response
         )
-        mocked_handler.forecast.list_predictors.return_value = list_predictors_response
+        # Every list operation is paginated, the same paginator is returned for each one.
+        paginators = defaultdict(MagicMock)
+        paginators["list_predictors"].paginate.return_value = [
+            list_predictors_response
+        ]
+        mocked_handler.forecast.get_paginator.side_effect = paginators.__getitem__
         mocked_handler.forecast.describe_dataset_import_job.return_value = (
             describe_dataset_import_job_response
         )
@@ -50,6 +57,8 @@ def project(
         )
 
         mocked_handler.team = "EQUIPO_DE_PRUEBA_1"
+        mocked_handler.polling = PollingStrategy()
+        mocked_handler.cache = None
         with requests_mock.Mocker() as request_mock:
             request_mock.post(
                 "https://internal-api.mercadolibre.com/data-team/auth/login",
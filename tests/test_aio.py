@@ -0,0 +1,73 @@
+import asyncio
+from os.path import isfile
+from unittest.mock import MagicMock
+
+import pytest
+
+from sibila.aio import AsyncPredictor, AsyncProject, wait_for_resources
+from sibila.errors import ResourcesError
+from sibila.utils import PollingStrategy
+
+
+def run(coroutine):
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        loop.close()
+
+
+def test_async_train_and_forecast(project, tmp_path):
+    async_project = AsyncProject(project)
+
+    async def pipeline():
+        predictor = await async_project.train_new_predictor(
+            name="test_predictor", algorithm="ARIMA", horizon=30, frequency="D"
+        )
+        await predictor.wait_for_training()
+        await predictor.forecast(str(tmp_path / "forecast.csv"), keep_forecasts=0)
+        return predictor
+
+    predictor = run(pipeline())
+
+    assert predictor.name == "test_predictor"
+    assert isfile(str(tmp_path / "forecast.csv"))
+    project.aws_handler.forecast.delete_forecast.assert_called_once()
+
+
+def test_async_metrics_stops_when_the_predictor_failed(project, tmp_path):
+    predictor_name = f"{project.aws_handler.team}__test_predictor"
+    project._predictors = {predictor_name: "test_predictor_arn"}
+    predictor = project.get_predictor("test_predictor")
+    project.aws_handler.forecast.describe_predictor.return_value = {
+        "Status": "CREATE_FAILED",
+        "Message": "Not enough data",
+    }
+
+    # The failed wait is raised into the same steps as Predictor.metrics.
+    assert run(AsyncPredictor(predictor).metrics(str(tmp_path))) is None
+    project.aws_handler.forecast.create_predictor_backtest_export_job.assert_not_called()
+
+
+def test_async_wait_for_resources_fails_fast():
+    aws_handler = MagicMock()
+    aws_handler.polling = PollingStrategy()
+    aws_handler.forecast.describe_dataset.return_value = {
+        "Status": "CREATE_IN_PROGRESS"
+    }
+    aws_handler.forecast.describe_predictor.return_value = {
+        "Status": "CREATE_FAILED",
+        "Message": "Not enough data",
+    }
+
+    with pytest.raises(ResourcesError) as error:
+        run(
+            wait_for_resources(
+                [("dataset", "dataset"), ("predictor", "predictor")], aws_handler
+            )
+        )
+
+    assert error.value.outcomes == {
+        "dataset": "CANCELLED",
+        "predictor": "CREATE_FAILED",
+    }
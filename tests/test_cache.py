@@ -0,0 +1,34 @@
+from unittest.mock import patch
+
+from sibila.cache import EntityCache
+
+
+def test_entity_cache_expires(tmp_path):
+    cache = EntityCache(str(tmp_path / "cache.sqlite"), ttls={"entities": 10})
+    cache.set("dsg_arn", "entities", "dsg_arn", {"imports": {"TTS__1": "arn"}})
+    cache.set("dsg_arn", "predictor", "predictor_arn", {"Status": "ACTIVE"})
+
+    assert cache.get("dsg_arn", "entities", "dsg_arn") == {"imports": {"TTS__1": "arn"}}
+    assert cache.get("other_arn", "entities", "dsg_arn") is None
+
+    with patch("sibila.cache.time", return_value=10**10):
+        assert cache.get("dsg_arn", "entities", "dsg_arn") is None
+
+
+def test_warm_project_makes_no_calls(project, tmp_path):
+    project.aws_handler.cache = EntityCache(str(tmp_path / "cache.sqlite"))
+    project.arn = "dsg_arn"
+    forecast = project.aws_handler.forecast
+
+    datasets = project._datasets
+    # A new Project for the same dataset group starts with no entities loaded.
+    project._entities = {}
+
+    assert project._datasets == datasets
+    forecast.describe_dataset_group.assert_called_once()
+
+    project._predictors = {"EQUIPO_DE_PRUEBA_1__test_predictor": "predictor_arn"}
+    predictor = project.get_predictor("test_predictor")
+    predictor.info
+    predictor.info
+    forecast.describe_predictor.assert_called_once_with(PredictorArn="predictor_arn")
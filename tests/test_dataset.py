@@ -0,0 +1,153 @@
+import gzip
+from unittest.mock import MagicMock
+
+import pytest
+
+from sibila.dataset import Dataset
+from sibila.errors import DatasetError
+from tests.test_utils import s3_with_objects
+
+SCHEMA = {
+    "Attributes": [
+        {"AttributeName": "item_id", "AttributeType": "string"},
+        {"AttributeName": "timestamp", "AttributeType": "timestamp"},
+        {"AttributeName": "demand", "AttributeType": "integer"},
+    ]
+}
+
+
+def dataset_with_objects(objects):
+    aws_handler = MagicMock()
+    aws_handler.s3 = s3_with_objects(objects)
+    return Dataset(
+        dsg_arn="dsg_arn",
+        ds_type=Dataset.TARGET_TIME_SERIES,
+        schema=SCHEMA,
+        s3_uri="s3://bucket/datasets/TARGET_TIME_SERIES/",
+        aws_handler=aws_handler,
+        frequency="H",
+        timestamp_format="yyyy-MM-dd hh:mm:ss",
+    )
+
+
+def test_to_df_parses_schema_types():
+    pandas = pytest.importorskip("pandas")
+    dataset = dataset_with_objects(
+        {
+            "datasets/TARGET_TIME_SERIES/part0.csv": b"item_id,timestamp,demand\n"
+            b"007,2021-01-01 13:00:00,1\n",
+            # The last part lacks a trailing newline and has an empty target.
+            "datasets/TARGET_TIME_SERIES/part1.csv": b"item_id,timestamp,demand\n"
+            b"008,2021-01-01 14:00:00,",
+        }
+    )
+
+    df = dataset.to_df()
+
+    assert list(df["item_id"]) == ["007", "008"]
+    assert list(df["timestamp"]) == [
+        pandas.Timestamp("2021-01-01 13:00:00"),
+        pandas.Timestamp("2021-01-01 14:00:00"),
+    ]
+    assert str(df["demand"].dtype) == "Int64"
+    assert df["demand"].isna().tolist() == [False, True]
+
+
+def test_to_df_in_chunks_without_header():
+    pytest.importorskip("pandas")
+    rows = b"".join(b"a,2021-01-01 00:00:00,%d\n" % i for i in range(5))
+    dataset = dataset_with_objects({"datasets/TARGET_TIME_SERIES/part0.csv": rows})
+
+    chunks = list(dataset.to_df(chunksize=2))
+
+    assert [len(chunk) for chunk in chunks] == [2, 2, 1]
+    assert [value for chunk in chunks for value in chunk["demand"]] == list(range(5))
+
+
+def test_to_csv_merges_shards(tmp_path):
+    dataset = dataset_with_objects(
+        {
+            "datasets/TARGET_TIME_SERIES/part_00000_of_00002.csv": b"item_id,timestamp,demand\n"
+            b"a,2021-01-01 00:00:00,1\n",
+            "datasets/TARGET_TIME_SERIES/part_00001_of_00002.csv": b"item_id,timestamp,demand\n"
+            b"b,2021-01-01 00:00:00,2\n",
+        }
+    )
+    destination = tmp_path / "dataset.csv"
+
+    dataset.to_csv(str(destination))
+
+    assert destination.read_bytes() == (
+        b"item_id,timestamp,demand\n"
+        b"a,2021-01-01 00:00:00,1\n"
+        b"b,2021-01-01 00:00:00,2\n"
+    )
+
+
+def test_to_csv_decompresses_gzipped_dataset(tmp_path):
+    content = b"item_id,timestamp,demand\na,2021-01-01 00:00:00,1\n"
+    dataset = dataset_with_objects(
+        {"datasets/TARGET_TIME_SERIES.csv.gz": gzip.compress(content)}
+    )
+    dataset.s3_uri = "s3://bucket/datasets/TARGET_TIME_SERIES.csv.gz"
+    dataset.aws_handler.s3.head_object.return_value = {
+        "ContentLength": len(gzip.compress(content))
+    }
+    destination = tmp_path / "dataset.csv"
+
+    dataset.to_csv(str(destination))
+
+    assert destination.read_bytes() == content
+
+
+def test_to_df_reads_only_the_dataset_key():
+    pytest.importorskip("pandas")
+    content = b"a,2021-01-01 00:00:00,1\n"
+    dataset = dataset_with_objects(
+        {
+            "datasets/TARGET_TIME_SERIES.csv": content,
+            # Left over from an earlier compressed upload.
+            "datasets/TARGET_TIME_SERIES.csv.gz": gzip.compress(
+                b"b,2020-01-01 00:00:00,2\n"
+            ),
+        }
+    )
+    dataset.s3_uri = "s3://bucket/datasets/TARGET_TIME_SERIES.csv"
+    dataset.aws_handler.s3.head_object.return_value = {"ContentLength": len(content)}
+
+    df = dataset.to_df()
+
+    assert list(df["item_id"]) == ["a"]
+
+
+def test_to_df_reads_the_increments_after_the_dataset():
+    pytest.importorskip("pandas")
+    objects = {
+        "datasets/TARGET_TIME_SERIES.csv": b"item_id,timestamp,demand\na,2021-01-01 00:00:00,1\n",
+        "datasets/TARGET_TIME_SERIES_increments/TTS__2.csv": b"item_id,timestamp,demand\na,2021-01-02 00:00:00,2\n",
+    }
+    dataset = dataset_with_objects(objects)
+    dataset.s3_uri = "s3://bucket/datasets/TARGET_TIME_SERIES.csv"
+    dataset.increments = [
+        "s3://bucket/datasets/TARGET_TIME_SERIES_increments/TTS__2.csv"
+    ]
+    dataset.aws_handler.s3.head_object.side_effect = lambda Bucket, Key: {
+        "ContentLength": len(objects[Key])
+    }
+
+    df = dataset.to_df()
+
+    assert list(df["demand"]) == [1, 2]
+
+
+def test_unsupported_timestamp_format():
+    with pytest.raises(DatasetError, match="unsupported pattern a"):
+        Dataset(
+            dsg_arn="dsg_arn",
+            ds_type=Dataset.TARGET_TIME_SERIES,
+            schema=SCHEMA,
+            s3_uri="s3://bucket/datasets/TARGET_TIME_SERIES.csv",
+            aws_handler=MagicMock(),
+            frequency="H",
+            timestamp_format="yyyy-MM-dd hh:mm a",
+        )
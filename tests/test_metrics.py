@@ -0,0 +1,64 @@
+import pytest
+
+from sibila.errors import PredictorError
+from sibila.metrics import read_backtest, backtest_metrics
+
+
+@pytest.fixture()
+def backtest_dir(tmp_path):
+    (tmp_path / "backtest_forecasts.csv").write_text(
+        "item_id,store,timestamp,target_value,backtestwindow_start_time,p10,p50,p90\n"
+        "a,1,2021-01-01,10,2021-01-01,8,9,14\n"
+        "a,1,2021-01-02,20,2021-01-01,10,22,30\n"
+        "a,2,2021-01-01,0,2021-01-01,0,1,2\n"
+        "b,1,2021-01-01,0,2021-01-01,0,0,1\n"
+        "b,1,2021-01-02,,2021-01-01,0,5,10\n"
+    )
+    (tmp_path / "metadata.csv").write_text("item_id,category\na,food\nb,toys\n")
+    return tmp_path
+
+
+def test_backtest_metrics_by_item(backtest_dir):
+    pytest.importorskip("pandas")
+    backtest = read_backtest(str(backtest_dir))
+
+    metrics = backtest_metrics(backtest, by=["item_id"])
+
+    assert list(metrics.columns) == [
+        "WAPE",
+        "RMSE",
+        "wQL[0.1]",
+        "wQL[0.5]",
+        "wQL[0.9]",
+        "AverageWeightedQuantileLoss",
+    ]
+    a = metrics.loc["a"]
+    # Errors of p50 are 1, 2 and 1 over a total target of 30.
+    assert a["WAPE"] == pytest.approx(4 / 30)
+    assert a["RMSE"] == pytest.approx((6 / 3) ** 0.5)
+    # 0.1 * (2 + 10) + 0.9 * 0, p10 is never above the target.
+    assert a["wQL[0.1]"] == pytest.approx(2 * 1.2 / 30)
+    # 0.1 * 0 + 0.9 * 0 for the target above p90, 0.1 * (4 + 10 + 2) otherwise.
+    assert a["wQL[0.9]"] == pytest.approx(2 * 0.1 * 16 / 30)
+    # Item b has no WAPE nor wQL since its only target is 0, its missing one is left out.
+    b = metrics.loc["b"]
+    assert b["RMSE"] == 0
+    assert b.isna()[["WAPE", "wQL[0.5]"]].all()
+
+
+def test_backtest_metrics_by_metadata(backtest_dir):
+    pytest.importorskip("pandas")
+    backtest = read_backtest(
+        str(backtest_dir / "backtest_forecasts.csv"),
+        metadata=str(backtest_dir / "metadata.csv"),
+    )
+
+    metrics = backtest_metrics(backtest, by=["category", "store"])
+    overall = backtest_metrics(backtest)
+
+    assert list(metrics.index) == [("food", "1"), ("food", "2"), ("toys", "1")]
+    assert metrics.loc[("food", "1"), "WAPE"] == pytest.approx(3 / 30)
+    assert len(overall) == 1
+    assert overall["WAPE"].iloc[0] == pytest.approx(4 / 30)
+    with pytest.raises(PredictorError):
+        backtest_metrics(backtest, by=["region"])
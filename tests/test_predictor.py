@@ -1,6 +1,12 @@
-from os.path import isfile, isdir
+import io
+from os.path import isfile, isdir, join
 from unittest.mock import patch
 
+import pytest
+
+from sibila.predictor import BACKTEST_MARKER
+from tests.test_utils import s3_with_objects
+
 
 def test_forecast(
     describe_dataset_group_response, describe_predictor_response, project
@@ -22,7 +28,7 @@ def test_forecast(
 
 
 def test_predictor_metrics(
-    describe_dataset_group_response, describe_predictor_response, project
+    describe_dataset_group_response, describe_predictor_response, project, tmp_path
 ):
 
     predictor_name = f"{project.aws_handler.team}__test_predictor"
@@ -34,5 +40,269 @@ def test_predictor_metrics(
     )
 
     predictor = project.get_predictor("test_predictor")
-    predictor.metrics("./test_metrics")
-    assert isdir("./test_metrics")
+    destination_dir = str(tmp_path / "test_metrics")
+    predictor.metrics(destination_dir)
+    assert isdir(destination_dir)
+    # The export has no files, so it isn't marked as downloaded.
+    assert not isfile(join(destination_dir, BACKTEST_MARKER))
+
+
+def test_forecast_parquet(project, tmp_path):
+    pq = pytest.importorskip("pyarrow.parquet")
+    import pyarrow
+
+    predictor_name = f"{project.aws_handler.team}__test_predictor"
+    project._predictors = {predictor_name: "test_predictor_arn"}
+    project.aws_handler.s3_uri = "s3://bucket/project"
+
+    objects = {}
+    project.aws_handler.s3 = s3_with_objects(objects)
+
+    def create_forecast_export_job(**request):
+        # The export writes one parquet file per part.
+        prefix = request["Destination"]["S3Config"]["Path"].replace("s3://bucket/", "")
+        for part, item_id in enumerate(["a", "b"]):
+            buffer = io.BytesIO()
+            pq.write_table(pyarrow.table({"item_id": [item_id], "p50": [1.0]}), buffer)
+            objects[f"{prefix}/part{part}.parquet"] = buffer.getvalue()
+        assert request["Format"] == "PARQUET"
+        return {"ForecastExportJobArn": "export_arn"}
+
+    project.aws_handler.forecast.create_forecast_export_job.side_effect = (
+        create_forecast_export_job
+    )
+
+    # A part left by an earlier export into the same directory isn't read.
+    (tmp_path / "forecast").mkdir()
+    pq.write_table(
+        pyarrow.table({"item_id": ["stale"], "p50": [1.0]}),
+        str(tmp_path / "forecast" / "old_part0.parquet"),
+    )
+
+    predictor = project.get_predictor("test_predictor")
+    with patch("sibila.predictor.wait_for_resource"):
+        dataset = predictor.forecast(str(tmp_path / "forecast"), file_format="PARQUET")
+
+    assert dataset.to_table().column("item_id").to_pylist() == ["a", "b"]
+
+
+def test_forecast_sqlite(project, tmp_path):
+    predictor_name = f"{project.aws_handler.team}__test_predictor"
+    project._predictors = {predictor_name: "test_predictor_arn"}
+    project.aws_handler.s3_uri = "s3://bucket/project"
+
+    objects = {}
+    project.aws_handler.s3 = s3_with_objects(objects)
+
+    def create_forecast_export_job(**request):
+        prefix = request["Destination"]["S3Config"]["Path"].replace("s3://bucket/", "")
+        objects[f"{prefix}/part0.csv"] = b"item_id,date,p50\na,2021-01-01,1.0\n"
+        objects[f"{prefix}/part1.csv"] = b"item_id,date,p50\nb,2021-01-01,2.0\n"
+        # A kept export whose name starts the same way isn't read.
+        objects[f"{prefix}0/part0.csv"] = b"item_id,date,p50\nb,2020-01-01,9.0\n"
+        # The store is built from a csv export.
+        assert "Format" not in request
+        return {"ForecastExportJobArn": "export_arn"}
+
+    project.aws_handler.forecast.create_forecast_export_job.side_effect = (
+        create_forecast_export_job
+    )
+
+    predictor = project.get_predictor("test_predictor")
+    with patch("sibila.predictor.wait_for_resource"):
+        store = predictor.forecast(str(tmp_path / "forecast.db"), file_format="SQLITE")
+
+    assert store.forecast("b") == [{"item_id": "b", "date": "2021-01-01", "p50": 2.0}]
+
+
+def _import_job(name: str, status: str = "ACTIVE"):
+    return {
+        "DatasetImportJobName": name,
+        "DatasetImportJobArn": f"{name}_arn",
+        "Status": status,
+    }
+
+
+def test_forecast_key_lists_the_latest_imports(project):
+    predictor_name = f"{project.aws_handler.team}__test_predictor"
+    project._predictors = {predictor_name: "test_predictor_arn"}
+    project._datasets = {"BI_ML_CROSS__demanda_point__TTS": "dataset_arn"}
+    # The cached imports don't know about the ones made by other processes.
+    project.imports = {"TTS__1610000000_0": "TTS__1610000000_0_arn"}
+    paginator = project.aws_handler.forecast.get_paginator("list_dataset_import_jobs")
+    paginator.paginate.return_value = [
+        {"DatasetImportJobs": [_import_job("TTS__1610000000_0")]}
+    ]
+
+    predictor = project.get_predictor("test_predictor")
+    key = predictor._forecast_key(["0.5"])
+    assert predictor._latest_imports() == ["TTS__1610000000_0_arn"]
+
+    paginator.paginate.return_value = [
+        {
+            "DatasetImportJobs": [
+                _import_job("TTS__1610000000_0"),
+                _import_job("TTS__1620000000_0"),
+                _import_job("TTS__1630000000_0", status="CREATE_FAILED"),
+            ]
+        }
+    ]
+    assert predictor._latest_imports() == ["TTS__1620000000_0_arn"]
+    assert predictor._forecast_key(["0.5"]) != key
+
+
+def test_forecast_reuses_unchanged_forecast(project, tmp_path):
+    predictor_name = f"{project.aws_handler.team}__test_predictor"
+    project._predictors = {predictor_name: "test_predictor_arn"}
+    project._datasets = {"BI_ML_CROSS__demanda_point__TTS": "dataset_arn"}
+    project.aws_handler.s3_uri = "s3://bucket/project"
+    project.aws_handler.forecast.get_paginator(
+        "list_dataset_import_jobs"
+    ).paginate.return_value = [
+        {"DatasetImportJobs": [_import_job("TTS__1610000000_0")]}
+    ]
+
+    objects = {
+        "project/forecasts/old/part0.csv": b"item_id,date,p50\na,2021-01-01,1.0\n",
+        "project/forecasts/older/part0.csv": b"item_id,date,p50\na,2020-01-01,1.0\n",
+    }
+    project.aws_handler.s3 = s3_with_objects(objects)
+
+    predictor = project.get_predictor("test_predictor")
+    key = predictor._forecast_key(["0.5"])
+    forecasts = [
+        {
+            "ForecastArn": arn,
+            "ForecastName": f"forecast_{arn}",
+            "Status": "ACTIVE",
+            "CreationTime": time,
+        }
+        for arn, time in [("old", 2), ("older", 1), ("oldest", 0)]
+    ]
+    exports = {
+        arn: [
+            {
+                "ForecastExportJobArn": f"{arn}_export",
+                "Status": "ACTIVE",
+                "Destination": {
+                    "S3Config": {"Path": f"s3://bucket/project/forecasts/{arn}"}
+                },
+            }
+        ]
+        for arn in ["old", "older"]
+    }
+    forecast_client = project.aws_handler.forecast
+    forecast_client.get_paginator("list_forecasts").paginate.return_value = [
+        {"Forecasts": forecasts}
+    ]
+    forecast_client.get_paginator("list_forecast_export_jobs").paginate.side_effect = (
+        lambda Filters: [{"ForecastExportJobs": exports.get(Filters[0]["Value"], [])}]
+    )
+    forecast_client.list_tags_for_resource.side_effect = lambda ResourceArn: {
+        "Tags": [{"Key": "forecast_key", "Value": key if ResourceArn == "old" else ""}]
+    }
+    forecast_client.describe_forecast_export_job.return_value = {"Status": "ACTIVE"}
+
+    with patch("sibila.predictor.wait_for_resource"):
+        predictor.forecast(
+            str(tmp_path / "forecast.csv"), quantiles=["0.5"], keep_forecasts=2
+        )
+
+    # The forecast and its export are reused, and the oldest ones beyond 2 evicted.
+    forecast_client.create_forecast.assert_not_called()
+    forecast_client.create_forecast_export_job.assert_not_called()
+    assert (tmp_path / "forecast.csv").read_bytes() == objects[
+        "project/forecasts/old/part0.csv"
+    ]
+    deleted = [
+        call[1]["ResourceArn"]
+        for call in forecast_client.delete_resource_tree.call_args_list
+    ]
+    assert deleted == ["oldest"]
+
+
+def test_metrics_reuses_backtest_export(project, tmp_path):
+    predictor_name = f"{project.aws_handler.team}__test_predictor"
+    project._predictors = {predictor_name: "test_predictor_arn"}
+    project.aws_handler.s3_uri = "s3://bucket/project"
+
+    objects = {
+        "project/backtests/old/accuracy-metrics-values/part0.csv": b"item_id,wQL\n",
+        "project/backtests/old/forecasted-values/part0.csv": b"item_id,p50\n",
+    }
+    project.aws_handler.s3 = s3_with_objects(objects)
+    forecast_client = project.aws_handler.forecast
+    forecast_client.get_paginator(
+        "list_predictor_backtest_export_jobs"
+    ).paginate.return_value = [
+        {
+            "PredictorBacktestExportJobs": [
+                {
+                    "PredictorBacktestExportJobArn": "backtest_arn",
+                    "Status": "ACTIVE",
+                    "Destination": {
+                        "S3Config": {"Path": "s3://bucket/project/backtests/old"}
+                    },
+                }
+            ]
+        }
+    ]
+
+    predictor = project.get_predictor("test_predictor")
+    predictor.metrics(str(tmp_path))
+    # The second call finds the backtest already downloaded.
+    project.aws_handler.s3 = None
+    predictor.metrics(str(tmp_path))
+
+    forecast_client.create_predictor_backtest_export_job.assert_not_called()
+    assert (tmp_path / "backtest_forecasts.csv").read_bytes() == b"item_id,p50\n"
+    assert (
+        forecast_client.get_paginator(
+            "list_predictor_backtest_export_jobs"
+        ).paginate.call_count
+        == 1
+    )
+
+
+def test_metrics_exports_again_when_the_export_files_are_gone(project, tmp_path):
+    predictor_name = f"{project.aws_handler.team}__test_predictor"
+    project._predictors = {predictor_name: "test_predictor_arn"}
+    project.aws_handler.s3_uri = "s3://bucket/project"
+
+    objects = {}
+    project.aws_handler.s3 = s3_with_objects(objects)
+    forecast_client = project.aws_handler.forecast
+    # The files of the finished export were deleted.
+    forecast_client.get_paginator(
+        "list_predictor_backtest_export_jobs"
+    ).paginate.return_value = [
+        {
+            "PredictorBacktestExportJobs": [
+                {
+                    "PredictorBacktestExportJobArn": "backtest_arn",
+                    "Status": "ACTIVE",
+                    "Destination": {
+                        "S3Config": {"Path": "s3://bucket/project/backtests/old"}
+                    },
+                }
+            ]
+        }
+    ]
+
+    def create_predictor_backtest_export_job(**request):
+        prefix = request["Destination"]["S3Config"]["Path"].replace("s3://bucket/", "")
+        objects[f"{prefix}/accuracy-metrics-values/part0.csv"] = b"item_id,wQL\n"
+        objects[f"{prefix}/forecasted-values/part0.csv"] = b"item_id,p50\n"
+        return {"PredictorBacktestExportJobArn": "new_backtest_arn"}
+
+    forecast_client.create_predictor_backtest_export_job.side_effect = (
+        create_predictor_backtest_export_job
+    )
+
+    predictor = project.get_predictor("test_predictor")
+    with patch("sibila.predictor.wait_for_resource"):
+        predictor.metrics(str(tmp_path))
+
+    forecast_client.create_predictor_backtest_export_job.assert_called_once()
+    assert (tmp_path / "backtest_forecasts.csv").read_bytes() == b"item_id,p50\n"
+    assert isfile(join(str(tmp_path), BACKTEST_MARKER))
@@ -1,9 +1,13 @@
 import pytest
+import hashlib
 from unittest.mock import patch
 
+from botocore.exceptions import ClientError
+
 from datetime import datetime
 
 from sibila.utils import AWSHandler
+from tests.test_utils import s3_with_objects
 from sibila.errors import DatasetError
 
 
@@ -35,8 +39,30 @@ def test_aws_handler_attributes(boto3_mock):
     )
 
 
+@patch("sibila.utils.boto3")
+def test_aws_handler_creates_forecastquery_client_on_first_use(boto3_mock):
+    aws_handler = AWSHandler(
+        team="EQUIPO_DE_PRUEBA_1",
+        s3_uri="s3://bi-ml-forecasting-data/EQUIPO_DE_PRUEBA_1/nombre_de_prueba_1",
+    )
+    services = [call[0][0] for call in boto3_mock.client.call_args_list]
+    assert services == ["s3", "forecast"]
+
+    assert aws_handler.forecastquery is aws_handler.forecastquery
+    services = [call[0][0] for call in boto3_mock.client.call_args_list]
+    assert services == ["s3", "forecast", "forecastquery"]
+
+
+@patch("sibila.project.file_sha256")
+@patch("sibila.project.upload_file")
 @patch("sibila.project.isfile")
-def test_upload_dataset(isfile_mock, describe_predictor_response, project):
+def test_upload_dataset(
+    isfile_mock,
+    upload_file_mock,
+    file_sha256_mock,
+    describe_predictor_response,
+    project,
+):
 
     local_path = "./here.csv"
     ds_type = "TARGET_TIME_SERIES"
@@ -68,11 +94,18 @@ def test_upload_dataset(isfile_mock, describe_predictor_response, project):
         dataset.s3_uri
         == "s3://bi-ml-forecasting-data/input/EQUIPO_DE_PRUEBA_1/nombre_de_prueba_1/datasets/TARGET_TIME_SERIES.csv"
     )
+    assert upload_file_mock.call_args[0][:2] == (local_path, dataset.s3_uri)
 
 
+@patch("sibila.project.file_sha256")
+@patch("sibila.project.upload_file")
 @patch("sibila.project.isfile")
 def test_upload_dataset_with_existing_name(
-    isfile_mock, describe_predictor_response, project
+    isfile_mock,
+    upload_file_mock,
+    file_sha256_mock,
+    describe_predictor_response,
+    project,
 ):
 
     project.aws_handler.forecast.describe_dataset.return_value = {
@@ -210,3 +243,313 @@ def test_upload_dataset_fails_if_csv_is_invalid(project):
             frequency=frequency,
             timestamp_format=timestamp_format,
         )
+
+
+def test_entities_are_retrieved_lazily(project, describe_dataset_group_response):
+    forecast = project.aws_handler.forecast
+    forecast.describe_dataset_group.assert_not_called()
+    forecast.get_paginator("list_predictors").paginate.assert_not_called()
+
+    assert project.datasets() == ["TARGET_TIME_SERIES"]
+
+    dataset_arn = describe_dataset_group_response["DatasetArns"][0]
+    forecast.get_paginator("list_dataset_import_jobs").paginate.assert_called_once_with(
+        Filters=[{"Key": "DatasetArn", "Value": dataset_arn, "Condition": "IS"}]
+    )
+    forecast.get_paginator("list_predictors").paginate.assert_called_once_with(
+        Filters=[{"Key": "DatasetGroupArn", "Value": project.arn, "Condition": "IS"}]
+    )
+    assert project.aws_handler._datasets == project._datasets
+
+
+def test_find_dataset_group_stops_at_the_first_match(project):
+    pages = [
+        {"DatasetGroups": [{"DatasetGroupName": "OTHER__x", "DatasetGroupArn": "a"}]},
+        {
+            "DatasetGroups": [
+                {"DatasetGroupName": project._dsg_name, "DatasetGroupArn": "b"}
+            ]
+        },
+        {"DatasetGroups": [{"DatasetGroupName": "never_listed"}]},
+    ]
+    consumed = []
+
+    def paginate():
+        for page in pages:
+            consumed.append(page)
+            yield page
+
+    project.aws_handler.forecast.get_paginator(
+        "list_dataset_groups"
+    ).paginate.side_effect = paginate
+
+    assert project._find_dataset_group() == "b"
+    assert consumed == pages[:2]
+
+
+def test_train_predictors_ranks_by_metric(project):
+    forecast = project.aws_handler.forecast
+
+    def create_predictor(**request):
+        if request["PredictorName"].endswith("prophet"):
+            raise ClientError(
+                {"Error": {"Code": "LimitExceededException", "Message": "Too many"}},
+                "CreatePredictor",
+            )
+        return {"PredictorArn": request["PredictorName"]}
+
+    forecast.create_predictor.side_effect = create_predictor
+    forecast.describe_predictor.side_effect = lambda PredictorArn: (
+        {"Status": "CREATE_FAILED", "Message": "Not enough data"}
+        if PredictorArn.endswith("npts")
+        else {"Status": "ACTIVE"}
+    )
+    losses = {"arima": 0.3, "ets": 0.1}
+    forecast.get_accuracy_metrics.side_effect = lambda PredictorArn: {
+        "PredictorEvaluationResults": [
+            {
+                "AlgorithmArn": "arn:aws:forecast:::algorithm/" + PredictorArn,
+                "TestWindows": [
+                    {
+                        "EvaluationType": "SUMMARY",
+                        "Metrics": {
+                            "AverageWeightedQuantileLoss": losses[
+                                PredictorArn.split("__")[-1]
+                            ],
+                            "WeightedQuantileLosses": [
+                                {"Quantile": 0.5, "LossValue": 0.2}
+                            ],
+                            "ErrorMetrics": [{"ForecastType": "mean", "WAPE": 0.4}],
+                        },
+                    }
+                ],
+            }
+        ]
+    }
+
+    leaderboard = project.train_predictors(
+        [
+            {"name": name, "algorithm": algorithm, "horizon": 30, "frequency": "D"}
+            for name, algorithm in [
+                ("npts", "NPTS"),
+                ("arima", "ARIMA"),
+                ("ets", "ETS"),
+                ("prophet", "Prophet"),
+                # There are no metrics for it, so they fail.
+                ("deepar", "Deep_AR_Plus"),
+            ]
+        ]
+    )
+
+    assert [entry["name"] for entry in leaderboard] == [
+        "ets",
+        "arima",
+        "npts",
+        "prophet",
+        "deepar",
+    ]
+    assert [entry["status"] for entry in leaderboard] == [
+        "ACTIVE",
+        "ACTIVE",
+        "CREATE_FAILED",
+        "CREATE_FAILED",
+        "METRICS_FAILED",
+    ]
+    assert "LimitExceededException" in leaderboard[3]["error"]
+    assert leaderboard[0]["metrics"] == {
+        "AverageWeightedQuantileLoss": 0.1,
+        "wQL[0.5]": 0.2,
+        "WAPE": 0.4,
+    }
+    assert forecast.create_predictor.call_count == 5
+
+
+def test_upload_dataset_skips_unchanged_file(tmp_path, project):
+    local_path = tmp_path / "dataset.csv"
+    local_path.write_bytes(b"a,2021-01-01,1\n")
+    sha256 = hashlib.sha256(local_path.read_bytes()).hexdigest()
+
+    ds_name = f"{project.aws_handler.team}__{project.name}__TTS"
+    project._datasets = {ds_name: "dataset_arn"}
+    project.imports = {"TTS__1_5": "import_arn"}
+    forecast = project.aws_handler.forecast
+    forecast.list_tags_for_resource.return_value = {
+        "Tags": [{"Key": "sha256", "Value": sha256}]
+    }
+
+    with patch("sibila.project.upload_file") as upload_file_mock:
+        dataset = project.upload_dataset(
+            local_path=str(local_path),
+            ds_type="TARGET_TIME_SERIES",
+            schema={},
+            frequency="D",
+            timestamp_format="yyyy-MM-dd",
+        )
+
+    assert dataset.import_arn == "import_arn"
+    forecast.list_tags_for_resource.assert_called_once_with(ResourceArn="import_arn")
+    upload_file_mock.assert_not_called()
+    forecast.create_dataset_import_job.assert_not_called()
+
+
+def test_upload_dataset_reimports_already_uploaded_file(tmp_path, project):
+    local_path = tmp_path / "dataset.csv"
+    local_path.write_bytes(b"a,2021-01-01,1\n")
+    sha256 = hashlib.sha256(local_path.read_bytes()).hexdigest()
+
+    ds_name = f"{project.aws_handler.team}__{project.name}__TTS"
+    project._datasets = {ds_name: "dataset_arn"}
+    project.aws_handler.s3_uri = "s3://bucket/project"
+    # The last import was created from another file, but this one was uploaded.
+    project.imports = {"TTS__1_5": "import_arn"}
+    project.aws_handler.forecast.list_tags_for_resource.return_value = {"Tags": []}
+    project.aws_handler.s3.get_object_tagging.return_value = {
+        "TagSet": [{"Key": "sha256", "Value": sha256}]
+    }
+
+    with patch("sibila.project.upload_file") as upload_file_mock:
+        project.upload_dataset(
+            local_path=str(local_path),
+            ds_type="TARGET_TIME_SERIES",
+            schema={},
+            frequency="D",
+            timestamp_format="yyyy-MM-dd",
+        )
+
+    upload_file_mock.assert_not_called()
+    tags = project.aws_handler.forecast.create_dataset_import_job.call_args[1]["Tags"]
+    assert {"Key": "sha256", "Value": sha256} in tags
+
+
+def test_upload_dataset_deletes_object_with_other_extension(tmp_path, project):
+    local_path = tmp_path / "dataset.csv"
+    local_path.write_bytes(b"a,2021-01-01,1\n")
+
+    ds_name = f"{project.aws_handler.team}__{project.name}__TTS"
+    project._datasets = {ds_name: "dataset_arn"}
+    project.aws_handler.s3_uri = "s3://bucket/project"
+    project.aws_handler.forecast.list_tags_for_resource.return_value = {"Tags": []}
+
+    with patch("sibila.project.upload_file"):
+        project.upload_dataset(
+            local_path=str(local_path),
+            ds_type="TARGET_TIME_SERIES",
+            schema={},
+            frequency="D",
+            timestamp_format="yyyy-MM-dd",
+            compress=True,
+        )
+
+    project.aws_handler.s3.delete_objects.assert_called_once_with(
+        Bucket="bucket",
+        Delete={
+            "Objects": [{"Key": "project/datasets/TARGET_TIME_SERIES.csv"}],
+            "Quiet": True,
+        },
+    )
+
+
+def test_upload_dataset_in_shards(tmp_path, project):
+    local_path = tmp_path / "dataset.csv"
+    local_path.write_bytes(b"".join(b"item_%d,2021-01-01,1\n" % i for i in range(4)))
+    project.aws_handler.s3_uri = "s3://bucket/project"
+    # A previous upload was split in more shards.
+    objects = {
+        f"project/datasets/TARGET_TIME_SERIES/part_{i:05}_of_00003.csv": b"old"
+        for i in range(3)
+    }
+    s3 = s3_with_objects(objects)
+    s3.put_object.side_effect = lambda Bucket, Key, Body, ContentMD5: objects.update(
+        {Key: Body}
+    )
+    project.aws_handler.s3 = s3
+
+    dataset = project.upload_dataset(
+        local_path=str(local_path),
+        ds_type="TARGET_TIME_SERIES",
+        schema={"Attributes": [{"AttributeName": "item_id"}]},
+        frequency="D",
+        timestamp_format="yyyy-MM-dd",
+        shards=2,
+    )
+
+    assert dataset.s3_uri == "s3://bucket/project/datasets/TARGET_TIME_SERIES/"
+    import_request = project.aws_handler.forecast.create_dataset_import_job.call_args[1]
+    assert import_request["DataSource"]["S3Config"]["Path"] == dataset.s3_uri
+    deleted = s3.delete_objects.call_args[1]["Delete"]["Objects"]
+    assert sorted(deleted, key=lambda s3_object: s3_object["Key"]) == [
+        {"Key": f"project/datasets/TARGET_TIME_SERIES/part_{i:05}_of_00003.csv"}
+        for i in range(3)
+    ]
+
+
+@patch("sibila.project.upload_file")
+def test_upload_dataset_incremental_uploads_new_rows(
+    upload_file_mock, tmp_path, project
+):
+    pytest.importorskip("pandas")
+    local_path = tmp_path / "dataset.csv"
+    local_path.write_bytes(
+        b"item_id,timestamp,target_value\n"
+        b"a,2021-01-01,1\n"
+        b"a,2021-01-02,2\n"
+        b"a,2021-01-03,3\n"
+    )
+    uploaded = {}
+    upload_file_mock.side_effect = lambda local_path, *args, **kwargs: uploaded.update(
+        {args[0]: open(local_path, "rb").read()}
+    )
+
+    ds_name = f"{project.aws_handler.team}__{project.name}__TTS"
+    project._datasets = {ds_name: "dataset_arn"}
+    project.aws_handler.s3_uri = "s3://bucket/project"
+    # A full import was followed by an incremental one, with rows up to the 2nd.
+    base_uri = "s3://bucket/project/datasets/TARGET_TIME_SERIES.csv"
+    increment_uri = (
+        "s3://bucket/project/datasets/TARGET_TIME_SERIES_increments/TTS__2_5.csv"
+    )
+    project.imports = {"TTS__1_5": "base_arn", "TTS__2_5": "increment_arn"}
+    sources = {"base_arn": base_uri, "increment_arn": increment_uri}
+    project.aws_handler.forecast.describe_dataset_import_job.side_effect = (
+        lambda DatasetImportJobArn: {
+            "Status": "ACTIVE",
+            "TimestampFormat": "yyyy-MM-dd",
+            "DataSource": {"S3Config": {"Path": sources[DatasetImportJobArn]}},
+        }
+    )
+    project.aws_handler.forecast.list_tags_for_resource.return_value = {
+        "Tags": [{"Key": "high_water_mark", "Value": "2021-01-02 00:00:00"}]
+    }
+
+    dataset = project.upload_dataset(
+        local_path=str(local_path),
+        ds_type="TARGET_TIME_SERIES",
+        schema={
+            "Attributes": [
+                {"AttributeName": "item_id", "AttributeType": "string"},
+                {"AttributeName": "timestamp", "AttributeType": "timestamp"},
+                {"AttributeName": "target_value", "AttributeType": "integer"},
+            ]
+        },
+        frequency="D",
+        timestamp_format="yyyy-MM-dd",
+        incremental=True,
+    )
+
+    # The dataset is still read from the full import, followed by every increment.
+    assert dataset.s3_uri == base_uri
+    assert dataset.increments[0] == increment_uri
+    assert dataset.increments[1].startswith(
+        "s3://bucket/project/datasets/TARGET_TIME_SERIES_increments/TTS__"
+    )
+    assert uploaded == {
+        dataset.increments[1]: b"item_id,timestamp,target_value\na,2021-01-03,3\n"
+    }
+    request = project.aws_handler.forecast.create_dataset_import_job.call_args[1]
+    assert request["ImportMode"] == "INCREMENTAL"
+    assert request["DataSource"]["S3Config"]["Path"] == dataset.increments[1]
+    assert {"Key": "high_water_mark", "Value": "2021-01-03 00:00:00"} in request["Tags"]
+
+    sources[dataset.import_arn] = dataset.increments[1]
+    retrieved = project.get_dataset("TARGET_TIME_SERIES")
+    assert (retrieved.s3_uri, retrieved.increments) == (base_uri, dataset.increments)
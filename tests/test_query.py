@@ -0,0 +1,126 @@
+from threading import Event
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from sibila.errors import PredictorError
+from sibila.query import ForecastQuery
+
+
+def query_forecast(ForecastArn, Filters, **dates):
+    return {
+        "Forecast": {
+            "Predictions": {
+                quantile: [
+                    {"Timestamp": "2021-01-02T00:00:00", "Value": value + 1},
+                    {"Timestamp": "2021-01-01T00:00:00", "Value": value},
+                ]
+                for quantile, value in [("p10", 1.0), ("p90", 3.0)]
+            }
+        }
+    }
+
+
+def test_forecast_query_caches_and_coalesces_lookups():
+    aws_handler = MagicMock()
+    release = Event()
+
+    def slow_query_forecast(**request):
+        release.wait(5)
+        return query_forecast(**request)
+
+    aws_handler.forecastquery.query_forecast.side_effect = slow_query_forecast
+
+    with ForecastQuery("forecast_arn", aws_handler, cache_size=1) as query:
+        # Both lookups of "a" are in flight at once and share one call.
+        first, second = query.submit("a", store="1"), query.submit("a", store="1")
+        release.set()
+        assert first.result() == second.result()
+        assert query.forecasts(["a", "b"], store="1") == {
+            "a": first.result(),
+            "b": query.forecast("b", store="1"),
+        }
+        # "b" evicted "a" from the cache.
+        query.forecast("a", store="1")
+
+    assert first.result() == [
+        {
+            "item_id": "a",
+            "store": "1",
+            "date": "2021-01-01T00:00:00",
+            "p10": 1.0,
+            "p90": 3.0,
+        },
+        {
+            "item_id": "a",
+            "store": "1",
+            "date": "2021-01-02T00:00:00",
+            "p10": 2.0,
+            "p90": 4.0,
+        },
+    ]
+    filters = [
+        call[1]["Filters"]
+        for call in aws_handler.forecastquery.query_forecast.call_args_list
+    ]
+    assert filters == [
+        {"item_id": "a", "store": "1"},
+        {"item_id": "b", "store": "1"},
+        {"item_id": "a", "store": "1"},
+    ]
+
+
+def test_forecast_query_retries_failed_lookups():
+    aws_handler = MagicMock()
+    aws_handler.forecastquery.query_forecast.side_effect = [
+        {"Forecast": {"Predictions": {}}},
+        query_forecast("forecast_arn", {}),
+    ]
+
+    with ForecastQuery("forecast_arn", aws_handler) as query:
+        with pytest.raises(PredictorError):
+            query.forecast("a", start="2021-01-01T00:00:00")
+        assert len(query.forecast("a", start="2021-01-01T00:00:00")) == 2
+
+    assert aws_handler.forecastquery.query_forecast.call_args[1] == {
+        "ForecastArn": "forecast_arn",
+        "Filters": {"item_id": "a"},
+        "StartDate": "2021-01-01T00:00:00",
+    }
+
+
+def test_forecast_query_pools_a_connection_per_worker():
+    aws_handler = MagicMock()
+    aws_handler.forecastquery.query_forecast.side_effect = query_forecast
+    aws_handler.client.return_value.query_forecast.side_effect = query_forecast
+
+    with ForecastQuery("forecast_arn", aws_handler, max_workers=4) as query:
+        query.forecast("a")
+    with ForecastQuery("forecast_arn", aws_handler, max_workers=64) as query:
+        query.forecast("a")
+
+    # The shared client only pools QUERY_WORKERS connections.
+    aws_handler.forecastquery.query_forecast.assert_called_once()
+    aws_handler.client.assert_called_once_with("forecastquery", max_pool_connections=64)
+    aws_handler.client.return_value.query_forecast.assert_called_once()
+
+
+def test_predictor_query(project):
+    predictor_name = f"{project.aws_handler.team}__test_predictor"
+    project._predictors = {predictor_name: "test_predictor_arn"}
+    project.aws_handler.forecast.create_forecast.return_value = {
+        "ForecastArn": "forecast_arn"
+    }
+    project.aws_handler.forecastquery.query_forecast.side_effect = query_forecast
+
+    predictor = project.get_predictor("test_predictor")
+    with patch("sibila.predictor.wait_for_resource"):
+        query = predictor.query()
+
+    # The forecast isn't exported nor deleted, it is kept to be queried.
+    assert query.forecast_arn == "forecast_arn"
+    assert len(query.forecast("a")) == 2
+    project.aws_handler.forecast.create_forecast_export_job.assert_not_called()
+    project.aws_handler.forecast.delete_forecast.assert_not_called()
+    with pytest.raises(PredictorError):
+        predictor.query(keep_forecasts=0)
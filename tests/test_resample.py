@@ -0,0 +1,124 @@
+import gzip
+
+import pytest
+
+from sibila.errors import DatasetError
+from sibila.resample import resample_csv, _uncompressed_size
+
+SCHEMA = {
+    "Attributes": [
+        {"AttributeName": "item_id", "AttributeType": "string"},
+        {"AttributeName": "timestamp", "AttributeType": "timestamp"},
+        {"AttributeName": "store", "AttributeType": "string"},
+        {"AttributeName": "target_value", "AttributeType": "integer"},
+        {"AttributeName": "price", "AttributeType": "float"},
+    ]
+}
+
+
+def test_resample_csv_aggregates_items_and_dimensions(tmp_path):
+    pytest.importorskip("pandas")
+    local_path = tmp_path / "hourly.csv"
+    local_path.write_bytes(
+        b"item_id,timestamp,store,target_value,price\n"
+        b"007,2021-01-01 10:00:00,a,1,1.0\n"
+        b"007,2021-01-01 11:00:00,b,2,2.0\n"
+        b"008,2021-01-01 10:00:00,a,3,3.0\n"
+        b"007,2021-01-01 12:00:00,a,4,5.0\n"
+        b"007,2021-01-02 00:00:00,a,,6.0\n"
+        b"008,2021-01-01 11:00:00,a,5,4.0\n"
+        # Rows don't need to be sorted for last to be the latest price.
+        b"007,2021-01-01 09:00:00,a,6,9.0\n"
+    )
+    destination = tmp_path / "daily.csv"
+
+    # Chunks of 2 rows hashed to 2 partitions, so groups are split across both.
+    written = resample_csv(
+        str(local_path),
+        str(destination),
+        "TARGET_TIME_SERIES",
+        SCHEMA,
+        "D",
+        "yyyy-MM-dd HH:mm:ss",
+        aggregations={"price": "last"},
+        chunk_rows=2,
+        partitions=2,
+    )
+
+    lines = destination.read_text().splitlines()
+    assert written == 4
+    assert lines[0] == "item_id,timestamp,store,target_value,price"
+    assert sorted(lines[1:]) == [
+        "007,2021-01-01 00:00:00,a,11,5.0",
+        "007,2021-01-01 00:00:00,b,2,2.0",
+        "007,2021-01-02 00:00:00,a,,6.0",
+        "008,2021-01-01 00:00:00,a,8,4.0",
+    ]
+
+
+def test_resample_csv_means_without_header(tmp_path):
+    pytest.importorskip("pandas")
+    local_path = tmp_path / "minutes.csv"
+    local_path.write_bytes(
+        b"a,2021-01-01 10:05:00,x,1,1.0\n"
+        b"a,2021-01-01 10:20:00,x,2,2.0\n"
+        b"a,2021-01-01 10:40:00,x,4,6.0\n"
+    )
+    destination = tmp_path / "resampled.csv"
+
+    resample_csv(
+        str(local_path),
+        str(destination),
+        "RELATED_TIME_SERIES",
+        SCHEMA,
+        "30min",
+        "yyyy-MM-dd HH:mm:ss",
+    )
+
+    # Means of integer attributes are rounded.
+    assert destination.read_text().splitlines() == [
+        "a,2021-01-01 10:00:00,x,2,1.5",
+        "a,2021-01-01 10:30:00,x,4,6.0",
+    ]
+
+
+def test_resample_csv_rejects_unknown_aggregation(tmp_path):
+    pytest.importorskip("pandas")
+    with pytest.raises(DatasetError):
+        resample_csv(
+            str(tmp_path / "dataset.csv"),
+            str(tmp_path / "resampled.csv"),
+            "TARGET_TIME_SERIES",
+            SCHEMA,
+            "D",
+            "yyyy-MM-dd",
+            aggregations={"item_id": "sum"},
+        )
+
+
+def test_resample_csv_rejects_schema_without_timestamp(tmp_path):
+    pytest.importorskip("pandas")
+    schema = {
+        "Attributes": [
+            attribute
+            for attribute in SCHEMA["Attributes"]
+            if attribute["AttributeType"] != "timestamp"
+        ]
+    }
+    with pytest.raises(DatasetError, match="no timestamp"):
+        resample_csv(
+            str(tmp_path / "dataset.csv"),
+            str(tmp_path / "resampled.csv"),
+            "TARGET_TIME_SERIES",
+            schema,
+            "D",
+            "yyyy-MM-dd",
+        )
+
+
+def test_uncompressed_size_of_gzipped_csv(tmp_path):
+    content = b"".join(b"item_%d,2021-01-01,%d\n" % (i, i) for i in range(100000))
+    local_path = tmp_path / "dataset.csv.gz"
+    local_path.write_bytes(gzip.compress(content))
+
+    assert _uncompressed_size(str(local_path)) == pytest.approx(len(content), rel=0.1)
@@ -0,0 +1,118 @@
+import gzip
+from unittest.mock import patch
+
+from sibila.schema import infer_schema
+
+
+@patch("sibila.schema.SCHEMA_SAMPLE_RANGE", 256)
+def test_infer_schema_with_header_from_samples(tmp_path):
+    rows = b"".join(
+        b"item_%d,2021-01-%02d %02d:00:00,%d.5,store_%d\n"
+        % (i % 7, i // 24 + 1, i % 24, i, i % 3)
+        for i in range(24 * 28)
+    )
+    local_path = tmp_path / "dataset.csv"
+    local_path.write_bytes(b"item_id,timestamp,target_value,store\n" + rows)
+
+    # The sample is much smaller than the file, the rest is read in random ranges.
+    inferred = infer_schema(
+        str(local_path), "TARGET_TIME_SERIES", sample_size=1024, samples=3
+    )
+
+    assert inferred.schema == {
+        "Attributes": [
+            {"AttributeName": "item_id", "AttributeType": "string"},
+            {"AttributeName": "timestamp", "AttributeType": "timestamp"},
+            {"AttributeName": "target_value", "AttributeType": "float"},
+            {"AttributeName": "store", "AttributeType": "string"},
+        ]
+    }
+    assert inferred.frequency == "H"
+    assert inferred.timestamp_format == "yyyy-MM-dd HH:mm:ss"
+
+
+def test_infer_schema_without_header(tmp_path):
+    local_path = tmp_path / "dataset.csv.gz"
+    local_path.write_bytes(
+        gzip.compress(
+            b"a,2021-01-01,1\n"
+            b"b,2021-01-01,\n"
+            b"a,2021-01-02,3\n"
+            b"b,2021-01-03,4\n"
+        )
+    )
+
+    inferred = infer_schema(str(local_path), "TARGET_TIME_SERIES")
+
+    assert inferred.schema == {
+        "Attributes": [
+            {"AttributeName": "item_id", "AttributeType": "string"},
+            {"AttributeName": "timestamp", "AttributeType": "timestamp"},
+            {"AttributeName": "target_value", "AttributeType": "integer"},
+        ]
+    }
+    assert inferred.frequency == "D"
+    assert inferred.timestamp_format == "yyyy-MM-dd"
+
+
+def test_infer_schema_from_gzip_members(tmp_path):
+    rows = b"item_id,target_value,timestamp\n" + b"".join(
+        b"item_%d,%d,2021-01-%02d 10:00:00\n" % (i % 3, i, i + 1) for i in range(28)
+    )
+    # Blocks compressed as independent members, the first ends within a timestamp.
+    cut = rows.index(b"2021-01-03") + len(b"2021-01-03 1")
+    local_path = tmp_path / "dataset.csv.gz"
+    local_path.write_bytes(gzip.compress(rows[:cut]) + gzip.compress(rows[cut:]))
+
+    inferred = infer_schema(str(local_path), "TARGET_TIME_SERIES", sample_size=512)
+
+    assert inferred.schema == {
+        "Attributes": [
+            {"AttributeName": "item_id", "AttributeType": "string"},
+            {"AttributeName": "target_value", "AttributeType": "integer"},
+            {"AttributeName": "timestamp", "AttributeType": "timestamp"},
+        ]
+    }
+    assert inferred.timestamp_format == "yyyy-MM-dd HH:mm:ss"
+
+
+def test_infer_schema_with_numeric_item_ids(tmp_path):
+    rows = b"".join(
+        b"%d,2021-01-%02d,%d,%d\n" % (1000 + i % 3, i // 3 + 1, i % 2, i)
+        for i in range(30)
+    )
+    local_path = tmp_path / "dataset.csv"
+    local_path.write_bytes(b"item_id,timestamp,store,target_value\n" + rows)
+
+    inferred = infer_schema(str(local_path), "TARGET_TIME_SERIES")
+
+    # Keys are strings even if they look like numbers.
+    assert inferred.schema == {
+        "Attributes": [
+            {"AttributeName": "item_id", "AttributeType": "string"},
+            {"AttributeName": "timestamp", "AttributeType": "timestamp"},
+            {"AttributeName": "store", "AttributeType": "string"},
+            {"AttributeName": "target_value", "AttributeType": "integer"},
+        ]
+    }
+    assert inferred.frequency == "D"
+
+
+def test_infer_schema_with_numeric_item_ids_without_header(tmp_path):
+    local_path = tmp_path / "dataset.csv"
+    local_path.write_bytes(
+        b"".join(
+            b"%d,2021-01-%02d,%d.5\n" % (1000 + i % 3, i // 3 + 1, i) for i in range(30)
+        )
+    )
+
+    inferred = infer_schema(str(local_path), "TARGET_TIME_SERIES")
+
+    assert inferred.schema == {
+        "Attributes": [
+            {"AttributeName": "item_id", "AttributeType": "string"},
+            {"AttributeName": "timestamp", "AttributeType": "timestamp"},
+            {"AttributeName": "target_value", "AttributeType": "float"},
+        ]
+    }
+    assert inferred.frequency == "D"
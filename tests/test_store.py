@@ -0,0 +1,45 @@
+import pytest
+
+from sibila.errors import PredictorError
+from sibila.store import ForecastStore
+
+
+@pytest.fixture()
+def store(tmp_path):
+    csv_path = tmp_path / "forecast.csv"
+    csv_path.write_text(
+        "item_id,store,date,p10,p50,p90\n"
+        "b,1,2021-01-02T00:00:00Z,1.0,2.0,3.0\n"
+        "a,2,2021-01-01T00:00:00Z,4.0,5.0,6.0\n"
+        "a,1,2021-01-02T00:00:00Z,7.0,8.0,\n"
+        "a,1,2021-01-01T00:00:00Z,0.5,1.5,2.5\n"
+        "a,1,2021-01-03T00:00:00Z,1.0,1.0,1.0\n"
+    )
+    with ForecastStore.from_csv(str(csv_path), str(tmp_path / "forecast.db")) as store:
+        yield store
+
+
+def test_forecast_store_looks_up_items_and_dimensions(store):
+    assert store.dimensions == ["store"]
+    assert [(row["store"], row["date"]) for row in store.forecast("a")] == [
+        ("1", "2021-01-01T00:00:00Z"),
+        ("1", "2021-01-02T00:00:00Z"),
+        ("1", "2021-01-03T00:00:00Z"),
+        ("2", "2021-01-01T00:00:00Z"),
+    ]
+    assert store.forecast("a", store="1", start="2021-01-02", end="2021-01-03") == [
+        {
+            "item_id": "a",
+            "store": "1",
+            "date": "2021-01-02T00:00:00Z",
+            "p10": 7.0,
+            "p50": 8.0,
+            "p90": None,
+        }
+    ]
+    assert store.forecast("c") == []
+
+
+def test_forecast_store_rejects_unknown_dimensions(store):
+    with pytest.raises(PredictorError):
+        store.forecast("a", region="south")
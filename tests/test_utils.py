@@ -0,0 +1,441 @@
+import io
+import gzip
+import base64
+import hashlib
+from threading import Event
+from datetime import datetime, timedelta
+from unittest.mock import MagicMock, call, patch
+
+import pytest
+
+from sibila.errors import ResourcesError, ResourceTimeoutError, WaitCancelledError
+from sibila.utils import (
+    PollingStrategy,
+    wait_for_resource,
+    wait_for_resources,
+    _merge_objects,
+    download_and_merge,
+    watch_and_merge,
+    download_objects,
+    list_objects,
+    upload_file,
+    upload_shards,
+)
+
+
+def s3_with_objects(objects, page_size=2):
+    """Returns a mocked s3 client that lists and serves ranged GETs over {key: bytes}.
+
+    Listings are split in pages of page_size entries, like list_objects_v2 does with 1000.
+    """
+
+    def get_object(Bucket, Key, Range):
+        start, end = Range.replace("bytes=", "").split("-")
+        return {"Body": io.BytesIO(objects[Key][int(start) : int(end) + 1])}
+
+    def paginate(Bucket, Prefix, Delimiter=None):
+        entries = []
+        for key in sorted(objects):
+            if not key.startswith(Prefix):
+                continue
+            rest = key[len(Prefix) :]
+            if Delimiter and Delimiter in rest:
+                common_prefix = Prefix + rest.split(Delimiter)[0] + Delimiter
+                if ("CommonPrefixes", common_prefix) not in entries:
+                    entries.append(("CommonPrefixes", common_prefix))
+            else:
+                entries.append(("Contents", key))
+
+        for i in range(0, len(entries), page_size):
+            page = {}
+            for kind, name in entries[i : i + page_size]:
+                if kind == "Contents":
+                    entry = {"Key": name, "Size": len(objects[name])}
+                else:
+                    entry = {"Prefix": name}
+                page.setdefault(kind, []).append(entry)
+            yield page
+
+    s3 = MagicMock()
+    s3.get_object.side_effect = get_object
+    s3.get_paginator.return_value.paginate.side_effect = paginate
+    return s3
+
+
+def test_list_objects_paginates_and_shards_sub_prefixes():
+    objects = {f"export/part{i:02}.csv": b"x" for i in range(5)}
+    objects.update(
+        {f"export/shard_{s}/part{i}.csv": b"x" for s in "ab" for i in range(3)}
+    )
+    objects["export/_SUCCESS"] = b""
+    objects["other/part0.csv"] = b"x"
+    aws_handler = MagicMock()
+    aws_handler.s3 = s3_with_objects(objects)
+
+    keys = [
+        s3_object["Key"]
+        for s3_object in list_objects(
+            "s3://bucket/export/", aws_handler, suffix=".csv", max_workers=2
+        )
+    ]
+
+    assert keys == sorted(
+        key for key in objects if key.startswith("export/") and key.endswith(".csv")
+    )
+
+
+def test_download_and_merge_empty_prefix(tmp_path):
+    aws_handler = MagicMock()
+    aws_handler.s3 = s3_with_objects({})
+    destination = tmp_path / "merged.csv"
+
+    download_and_merge("s3://bucket/export/", str(destination), aws_handler)
+
+    assert destination.read_bytes() == b""
+
+
+def test_merge_objects_keeps_only_first_header(tmp_path):
+    objects = {
+        "export/part0.csv": b"item_id,date,p50\na,2021-01-01,1\n",
+        "export/part1.csv": b"item_id,date,p50\nb,2021-01-01,2\nc,2021-01-01,3\n",
+        "export/part2.csv": b"",
+        "export/part3.csv": b"item_id,date,p50\nd,2021-01-01,4\n",
+    }
+    aws_handler = MagicMock()
+    aws_handler.s3 = s3_with_objects(objects)
+    destination = tmp_path / "merged.csv"
+
+    # A chunk smaller than the header forces it to span several ranges.
+    _merge_objects(
+        "bucket",
+        [{"Key": key, "Size": len(body)} for key, body in objects.items()],
+        str(destination),
+        aws_handler,
+        max_workers=3,
+        chunk_size=5,
+    )
+
+    assert destination.read_bytes() == (
+        b"item_id,date,p50\n"
+        b"a,2021-01-01,1\n"
+        b"b,2021-01-01,2\n"
+        b"c,2021-01-01,3\n"
+        b"d,2021-01-01,4\n"
+    )
+
+
+def test_download_objects_keeps_every_part(tmp_path):
+    objects = {
+        "export/part0.parquet": b"first part",
+        "export/shard_a/part0.parquet": b"nested part",
+        "export/_SUCCESS": b"",
+    }
+    aws_handler = MagicMock()
+    aws_handler.s3 = s3_with_objects(objects)
+
+    paths = download_objects(
+        "s3://bucket/export/", str(tmp_path), aws_handler, suffix=".parquet"
+    )
+
+    assert paths == [
+        str(tmp_path / "part0.parquet"),
+        str(tmp_path / "shard_a_part0.parquet"),
+    ]
+    assert (tmp_path / "part0.parquet").read_bytes() == b"first part"
+    assert (tmp_path / "shard_a_part0.parquet").read_bytes() == b"nested part"
+
+
+def test_polling_strategy_backs_off_from_learned_duration():
+    polling = PollingStrategy(min_delay=1, max_delay=300, jitter=False)
+    created = datetime(2021, 1, 1)
+    polling.record(
+        "dataset_import_job",
+        {
+            "CreationTime": created,
+            "LastModificationTime": created + timedelta(seconds=20),
+        },
+    )
+    # The learned duration is smoothed with the default one.
+    expected = 0.3 * 20 + 0.7 * PollingStrategy.DEFAULT_DURATIONS["dataset_import_job"]
+
+    delays = polling.delays("dataset_import_job", {"Status": "CREATE_IN_PROGRESS"})
+
+    assert [next(delays) for _ in range(6)] == [expected / 2, 1, 2, 4, 8, 16]
+
+
+def test_polling_strategy_caps_first_delay():
+    polling = PollingStrategy(min_delay=1, max_delay=5, jitter=False)
+
+    # Half of the expected 1800 seconds would oversleep a predictor that finishes early.
+    delays = polling.delays("predictor", {"Status": "CREATE_IN_PROGRESS"})
+
+    assert [next(delays) for _ in range(5)] == [5, 1, 2, 4, 5]
+
+
+@patch("sibila.utils.sleep")
+def test_wait_for_resource_times_out(sleep_mock):
+    aws_handler = MagicMock()
+    aws_handler.polling = PollingStrategy(timeout=0)
+    aws_handler.forecast.describe_predictor.return_value = {
+        "Status": "CREATE_IN_PROGRESS"
+    }
+
+    with pytest.raises(ResourceTimeoutError):
+        wait_for_resource("predictor", "arn", aws_handler)
+    aws_handler.forecast.describe_predictor.assert_called_once_with(PredictorArn="arn")
+    sleep_mock.assert_not_called()
+
+
+def test_wait_for_resource_can_be_cancelled():
+    aws_handler = MagicMock()
+    aws_handler.polling = PollingStrategy()
+    aws_handler.forecast.describe_forecast.return_value = {
+        "Status": "CREATE_IN_PROGRESS"
+    }
+    cancel_event = Event()
+    cancel_event.set()
+
+    with pytest.raises(WaitCancelledError):
+        wait_for_resource("forecast", "arn", aws_handler, cancel_event=cancel_event)
+
+
+def test_wait_for_resources_fails_fast_with_outcomes():
+    aws_handler = MagicMock()
+    aws_handler.polling = PollingStrategy(min_delay=0.01, max_delay=0.01)
+    aws_handler.forecast.describe_dataset.return_value = {"Status": "ACTIVE"}
+    aws_handler.forecast.describe_dataset_import_job.side_effect = lambda **kwargs: (
+        {"Status": "CREATE_FAILED", "Message": "Bad csv"}
+        if kwargs["DatasetImportJobArn"] == "failed_import"
+        else {"Status": "CREATE_IN_PROGRESS"}
+    )
+
+    with pytest.raises(ResourcesError) as error:
+        wait_for_resources(
+            [
+                ("dataset", "dataset"),
+                ("dataset_import_job", "failed_import"),
+                ("dataset_import_job", "slow_import"),
+            ],
+            aws_handler,
+        )
+
+    assert str(error.value) == "Bad csv"
+    assert error.value.failed_arn == "failed_import"
+    assert error.value.outcomes == {
+        "dataset": "ACTIVE",
+        "failed_import": "CREATE_FAILED",
+        "slow_import": "CANCELLED",
+    }
+
+
+def test_wait_for_resources_returns_outcomes():
+    aws_handler = MagicMock()
+    aws_handler.forecast.describe_dataset.return_value = {"Status": "ACTIVE"}
+    aws_handler.forecast.describe_predictor.return_value = {"Status": "ACTIVE"}
+
+    outcomes = wait_for_resources(
+        [("dataset", "dataset"), ("predictor", "predictor")], aws_handler
+    )
+
+    assert outcomes == {"dataset": "ACTIVE", "predictor": "ACTIVE"}
+
+
+def s3_with_multipart_uploads(uploads):
+    """Returns a mocked s3 client that keeps the parts of uploads in {id: {number: bytes}}."""
+
+    def upload_part(Bucket, Key, UploadId, PartNumber, Body, ContentMD5):
+        assert ContentMD5 == base64.b64encode(hashlib.md5(Body).digest()).decode()
+        uploads[UploadId][PartNumber] = Body
+        return {"ETag": f'"{hashlib.md5(Body).hexdigest()}"'}
+
+    def create_multipart_upload(Bucket, Key):
+        uploads["new"] = {}
+        return {"UploadId": "new"}
+
+    def paginate(Bucket, Key=None, Prefix=None, UploadId=None):
+        if UploadId is None:
+            yield {
+                "Uploads": [
+                    {"Key": Prefix, "UploadId": upload_id, "Initiated": i}
+                    for i, upload_id in enumerate(uploads)
+                ]
+            }
+        else:
+            yield {
+                "Parts": [
+                    {
+                        "PartNumber": number,
+                        "Size": len(body),
+                        "ETag": f'"{hashlib.md5(body).hexdigest()}"',
+                    }
+                    for number, body in uploads[UploadId].items()
+                ]
+            }
+
+    s3 = MagicMock()
+    s3.create_multipart_upload.side_effect = create_multipart_upload
+    s3.upload_part.side_effect = upload_part
+    s3.get_paginator.return_value.paginate.side_effect = paginate
+    return s3
+
+
+@patch("sibila.utils.MIN_PART_SIZE", 1)
+def test_upload_file_resumes_interrupted_upload(tmp_path):
+    content = b"0123456789" * 3
+    local_path = tmp_path / "dataset.csv"
+    local_path.write_bytes(content)
+    # Part 2 was uploaded and part 3 is from a different version of the file.
+    uploads = {"stale": {1: b"x"}, "interrupted": {2: content[10:20], 3: b"old"}}
+    aws_handler = MagicMock()
+    aws_handler.s3 = s3_with_multipart_uploads(uploads)
+    progress = []
+
+    upload_file(
+        str(local_path),
+        "s3://bucket/datasets/dataset.csv",
+        aws_handler,
+        part_size=10,
+        callback=lambda *args: progress.append(args),
+    )
+
+    aws_handler.s3.abort_multipart_upload.assert_called_once_with(
+        Bucket="bucket", Key="datasets/dataset.csv", UploadId="stale"
+    )
+    aws_handler.s3.create_multipart_upload.assert_not_called()
+    assert sorted(
+        call[1]["PartNumber"] for call in aws_handler.s3.upload_part.call_args_list
+    ) == [1, 3]
+    completed = aws_handler.s3.complete_multipart_upload.call_args[1]
+    assert completed["UploadId"] == "interrupted"
+    assert (
+        b"".join(
+            uploads["interrupted"][part["PartNumber"]]
+            for part in completed["MultipartUpload"]["Parts"]
+        )
+        == content
+    )
+    assert [transferred for transferred, total, _ in progress] == [10, 20, 30]
+    assert {total for _, total, _ in progress} == {30}
+
+
+def test_upload_shards_splits_on_lines_and_repeats_header(tmp_path):
+    header = b"item_id,timestamp,demand\n"
+    rows = [b"item_%d,2021-01-01,%d\n" % (i, i) for i in range(10)]
+    local_path = tmp_path / "dataset.csv"
+    local_path.write_bytes(header + b"".join(rows))
+    objects = {}
+    aws_handler = MagicMock()
+    aws_handler.s3.put_object.side_effect = lambda Bucket, Key, Body, ContentMD5: (
+        objects.update({Key: Body})
+    )
+
+    uploaded = upload_shards(
+        str(local_path),
+        [f"s3://bucket/datasets/part_{i}.csv" for i in range(3)],
+        aws_handler,
+        header=header,
+    )
+
+    assert uploaded == [f"s3://bucket/datasets/part_{i}.csv" for i in range(3)]
+    shards = [objects[f"datasets/part_{i}.csv"] for i in range(3)]
+    assert all(shard.startswith(header) for shard in shards)
+    assert all(shard.endswith(b"\n") for shard in shards)
+    assert b"".join(shard[len(header) :] for shard in shards) == b"".join(rows)
+
+
+def test_watch_and_merge_downloads_parts_while_exporting(tmp_path):
+    objects = {}
+    aws_handler = MagicMock()
+    # The status is described again 3 seconds later.
+    aws_handler.polling = PollingStrategy(min_delay=3, initial_fraction=0)
+    aws_handler.s3 = s3_with_objects(objects)
+
+    # Each describe finds one more part written, out of key order.
+    written = iter(
+        [
+            ("export/part1.csv", b"item_id,p50\nb,2.0\n", "CREATE_IN_PROGRESS"),
+            ("export/part0.csv", b"item_id,p50\na,1.0\n", "ACTIVE"),
+        ]
+    )
+
+    def describe_forecast_export_job(ForecastExportJobArn):
+        key, body, status = next(written)
+        objects[key] = body
+        return {"Status": status}
+
+    aws_handler.forecast.describe_forecast_export_job.side_effect = (
+        describe_forecast_export_job
+    )
+    destination = tmp_path / "forecast.csv"
+
+    with patch("sibila.utils.sleep") as sleep:
+        watch_and_merge(
+            "s3://bucket/export",
+            str(destination),
+            "forecast_export_job",
+            "export_arn",
+            aws_handler,
+            interval=1,
+        )
+
+    # The prefix is listed every second, but described on the polling schedule.
+    assert sleep.call_args_list == [call(1)] * 3
+    assert aws_handler.forecast.describe_forecast_export_job.call_count == 2
+    assert destination.read_bytes() == b"item_id,p50\nb,2.0\na,1.0\n"
+
+
+def test_merge_objects_decompresses_gzip_members(tmp_path):
+    # Compressed uploads are made of several gzip members.
+    objects = {
+        "datasets/part0.csv.gz": gzip.compress(b"item_id,date,demand\na,2021-01-01,1\n")
+        + gzip.compress(b"b,2021-01-01,2\n"),
+        "datasets/part1.csv": b"item_id,date,demand\nc,2021-01-01,3\n",
+    }
+    aws_handler = MagicMock()
+    aws_handler.s3 = s3_with_objects(objects)
+    destination = tmp_path / "merged.csv"
+
+    _merge_objects(
+        "bucket",
+        [{"Key": key, "Size": len(body)} for key, body in objects.items()],
+        str(destination),
+        aws_handler,
+        chunk_size=7,
+    )
+
+    assert destination.read_bytes() == (
+        b"item_id,date,demand\n"
+        b"a,2021-01-01,1\n"
+        b"b,2021-01-01,2\n"
+        b"c,2021-01-01,3\n"
+    )
+
+
+@patch("sibila.utils.MIN_PART_SIZE", 1)
+def test_upload_file_compresses_in_parts(tmp_path):
+    content = b"".join(b"item_%d,2021-01-01,%d\n" % (i, i) for i in range(100))
+    local_path = tmp_path / "dataset.csv"
+    local_path.write_bytes(content)
+    uploads = {}
+    aws_handler = MagicMock()
+    aws_handler.s3 = s3_with_multipart_uploads(uploads)
+    progress = []
+
+    upload_file(
+        str(local_path),
+        "s3://bucket/datasets/dataset.csv.gz",
+        aws_handler,
+        part_size=50,
+        callback=lambda *args: progress.append(args),
+        compress=True,
+    )
+
+    completed = aws_handler.s3.complete_multipart_upload.call_args[1]
+    parts = completed["MultipartUpload"]["Parts"]
+    assert len(parts) > 1
+    assert (
+        gzip.decompress(b"".join(uploads["new"][part["PartNumber"]] for part in parts))
+        == content
+    )
+    # Progress is measured on the local file.
+    assert progress[-1][:2] == (len(content), len(content))
@@ -0,0 +1,84 @@
+import gzip
+
+import pytest
+
+from sibila.errors import DatasetError
+from sibila.validation import validate_csv
+
+SCHEMA = {
+    "Attributes": [
+        {"AttributeName": "item_id", "AttributeType": "string"},
+        {"AttributeName": "timestamp", "AttributeType": "timestamp"},
+        {"AttributeName": "target_value", "AttributeType": "integer"},
+    ]
+}
+
+
+def validate(local_path, **kwargs):
+    return validate_csv(
+        str(local_path),
+        "TARGET_TIME_SERIES",
+        SCHEMA,
+        frequency="H",
+        timestamp_format="yyyy-MM-dd HH:mm:ss",
+        **kwargs,
+    )
+
+
+def test_validate_csv_in_parallel_blocks(tmp_path):
+    pytest.importorskip("pandas")
+    local_path = tmp_path / "dataset.csv"
+    local_path.write_bytes(
+        b"item_id,timestamp,target_value\n"
+        + b"".join(b"item_%d,2021-01-01 %02d:00:00,%d\n" % (i, i, i) for i in range(24))
+    )
+
+    # Blocks of 100 bytes are validated by two processes.
+    assert validate(local_path, max_workers=2, block_size=100) == 24
+
+
+def test_validate_csv_reports_lines_of_each_problem(tmp_path):
+    pytest.importorskip("pandas")
+    local_path = tmp_path / "dataset.csv"
+    local_path.write_bytes(
+        b"item_id,timestamp,target_value\n"
+        b"a,2021-01-01 00:00:00,1\n"
+        b"a,2021-01-01 01:00:00,1.5\n"
+        b"a,01/01/2021 02:00,3\n"
+        b"a,2021-01-01 03:30:00,4\n"
+        b"a,2021-01-01 04:00:00,\n"
+        b"a,2021-01-01 05:00:00,five\n"
+    )
+
+    with pytest.raises(DatasetError) as error:
+        validate(local_path, max_workers=1, block_size=60)
+
+    message = str(error.value)
+    assert "- target_value is not a valid integer: 2 rows, in lines 3, 7" in message
+    assert "- timestamp doesn't have the format" in message
+    assert ": 1 rows, in lines 4" in message
+    assert (
+        "- timestamp is not aligned with the frequency H: 1 rows, in lines 5" in message
+    )
+    assert "- target_value is empty: 1 rows, in lines 6" in message
+
+
+def test_validate_csv_checks_columns(tmp_path):
+    pytest.importorskip("pandas")
+    local_path = tmp_path / "dataset.csv.gz"
+    local_path.write_bytes(
+        gzip.compress(
+            b"item_id,target_value,timestamp\n"
+            b"a,2021-01-01 00:00:00,1\n"
+            b"a,2021-01-01 01:00:00,1,extra\n"
+        )
+    )
+
+    with pytest.raises(DatasetError) as error:
+        validate(local_path)
+
+    message = str(error.value)
+    assert (
+        "The header ['item_id', 'target_value', 'timestamp'] doesn't match" in message
+    )
+    assert "- Rows with more columns than the schema: 1 rows, in lines 3" in message